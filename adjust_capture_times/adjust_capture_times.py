@@ -1,202 +1,680 @@
 import os
+import re
+import sys
 import csv
+import json
+import mmap
+import struct
+import argparse
+import functools
 import logging
+import threading
 import time
 import sqlite3
-import subprocess
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from PIL import Image
-from PIL.ExifTags import TAGS
-
-# Define the _logs directory path
-logs_dir = os.path.join(os.path.dirname(__file__), '_logs')
-
-# Create the directory if it does not exist
-if not os.path.exists(logs_dir):
-    os.makedirs(logs_dir)
-
-# Generate a timestamped log filename inside _logs directory
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_filename = os.path.join(logs_dir, f'adjust_capture_times_{timestamp}.log')
-
-# Set up logging
-logging.basicConfig(filename=log_filename, level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
-# console = logging.StreamHandler()
-# console.setLevel(logging.INFO)
-# formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-# console.setFormatter(formatter)
-# logging.getLogger().addHandler(console)
-
-# Database setup
-db_filename = '_file_updates.db'
-
-def create_database():
-    """Create the database and table if they don't exist."""
-    with sqlite3.connect(db_filename) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS file_updates (
-                id INTEGER PRIMARY KEY,
-                file_name TEXT,
-                file_path TEXT,
-                original_time TEXT,
-                changed_time TEXT,
-                changed_at TIMESTAMP,
-                status TEXT
-            )
-        ''')
-        conn.commit()
-
-def log_file_update(file_name, file_path, original_time, changed_time, status='changed'):
-    """Log the file update information to the database."""
-    with sqlite3.connect(db_filename) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO file_updates (file_name, file_path, original_time, changed_time, changed_at, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (file_name, file_path, original_time, changed_time, datetime.now().isoformat(), status))
 
-        conn.commit()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from photo_common import catalog, exif_reader, exiftool_client, logs
+from photo_common.bulk_extract import batched
+from photo_common.metrics import Progress, ProgressLine, RunMetrics
+from photo_common.pipeline import DEFAULT_BATCH_SIZE, run_pipeline
+from photo_common.readahead import read_ahead
+from photo_common.walker import walk_files
+
+# Logs and run metrics go to timestamped files in the _logs directory
+DEFAULT_LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_logs')
+
+# Update journal and in-place patch undo log, relative to the working directory
+DEFAULT_DB_PATH = '_file_updates.db'
+DEFAULT_UNDO_PATH = '_patch_undo.jsonl'
+
+def setup_logging(logs_dir=DEFAULT_LOGS_DIR, verbosity=0):
+    """Log to a new timestamped file in logs_dir; returns the file name without the .log suffix.
+
+    Per-file detail is only logged with verbosity 1 or more.
+    """
+    os.makedirs(logs_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_base = os.path.join(logs_dir, f'adjust_capture_times_{timestamp}')
+    logs.setup_logging(verbosity, filename=log_base + '.log')
+    return log_base
+
+def create_database(conn):
+    """Create the tables if they don't exist."""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_updates (
+            id INTEGER PRIMARY KEY,
+            file_name TEXT,
+            file_path TEXT,
+            original_time TEXT,
+            changed_time TEXT,
+            changed_at TIMESTAMP,
+            status TEXT
+        )
+    ''')
+    # Journal of planned changes; status goes pending -> applying -> done/failed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_plan (
+            id INTEGER PRIMARY KEY,
+            file_path TEXT UNIQUE,
+            serial TEXT,
+            original_time TEXT,
+            new_time TEXT,
+            status TEXT DEFAULT 'pending',
+            planned_at TIMESTAMP,
+            applied_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS change_plan_status ON change_plan (status, id)')
+    conn.commit()
 
+@contextmanager
+def open_journal(db_path=DEFAULT_DB_PATH):
+    """Open the update journal, creating its tables, and close it again on exit.
 
-def get_unprocessed_files(folder_path):
+    The connection can be reused for any number of plan and apply runs; the
+    pipelines write to it from their writer thread.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        create_database(conn)
+        yield conn
+    finally:
+        conn.close()
+
+def get_unprocessed_files(conn, folder_path):
     """Retrieve files that need processing from the database."""
-    processed_files = set()
-    with sqlite3.connect(db_filename) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT file_path FROM file_updates WHERE status = "changed"')
-        rows = cursor.fetchall()
-        processed_files = set(row[0] for row in rows)
-    return processed_files
+    rows = conn.execute('SELECT file_path FROM file_updates WHERE status = "changed"').fetchall()
+    return set(row[0] for row in rows)
 
 
-def get_exif(image_path):
-    """Extract EXIF data from an image using exiftool for NEF files and PIL for others."""
-    exif = {}
+EXIF_TAGS = ('DateTimeOriginal', 'SerialNumber')
+# JPEG and TIFF-based files, which exif_reader reads and patch_in_place can patch
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'tiff', 'nef', 'dng', 'cr2')
 
-    # Handle NEF (RAW) files using exiftool
-    if image_path.lower().endswith('.nef'):
-        try:
-            result = subprocess.run(['exiftool', '-json', image_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            exif_data = result.stdout.decode('utf-8')
-            if exif_data:
-                import json
-                exif_json = json.loads(exif_data)[0]
-                exif['DateTimeOriginal'] = exif_json.get('DateTimeOriginal')
-                exif['SerialNumber'] = exif_json.get('SerialNumber')
-                logging.info(f"Extracted serial number {exif['SerialNumber']} from {image_path}")
-        except Exception as e:
-            logging.error(f"Error extracting EXIF data from {image_path} using exiftool: {e}")
+# Images per planning task; the catalog writes each batch in one transaction
+PLAN_BATCH_SIZE = 50
 
+def read_exif(image_path):
+    """Extract DateTimeOriginal and SerialNumber, natively where possible and via exiftool otherwise.
+
+    Returns (exif, ok); ok is False if exiftool failed, so the values may be incomplete.
+    """
+    # Fast path: read the tags straight from the JPEG/TIFF/NEF header
+    exif = exif_reader.read_tags(image_path, EXIF_TAGS)
+    if exif and 'DateTimeOriginal' in exif and exif.get('SerialNumber'):
+        logging.debug("Extracted serial number %s from %s", exif['SerialNumber'], image_path)
+        return exif, True
+
+    # Unknown format or a serial number only stored in the maker notes
+    exif = exif or {}
+    try:
+        exif_data = exiftool_client.execute_json('-DateTimeOriginal', '-SerialNumber', image_path)
+        if exif_data:
+            exif_json = exif_data[0]
+            for key in EXIF_TAGS:
+                if exif_json.get(key) is not None:
+                    exif[key] = exif_json[key]
+            logging.debug("Extracted serial number %s from %s using exiftool", exif.get('SerialNumber'), image_path)
+    except Exception as e:
+        logging.error("Error extracting EXIF data from %s using exiftool: %s", image_path, e)
+        return exif, False
+
+    return exif, True
+
+def get_exif_batch(image_paths, use_catalog=True):
+    """Return {path: exif} for image_paths; files seen before by any tool come straight from the shared catalog."""
+    incomplete = {}
+
+    def extract(misses):
+        for image_path in misses:
+            exif, ok = read_exif(image_path)
+            if ok:
+                yield dict(exif, SourceFile=image_path)
+            else:
+                incomplete[image_path] = exif  # Not cached, so the next run asks exiftool again
+
+    metadata_catalog = catalog.get_catalog() if use_catalog else None
+    if metadata_catalog is not None:
+        extracted = metadata_catalog.read_through(image_paths, EXIF_TAGS, extract)
     else:
-        # Handle other file types using Pillow
-        try:
-            img = Image.open(image_path)
-            info = img._getexif()
-            if info:
-                for tag, value in info.items():
-                    decoded = TAGS.get(tag, tag)
-                    exif[decoded] = value
-                exif['SerialNumber'] = str(info.get(42033, "")).strip()  # Correct tag and ensure serial number is treated as string
-                logging.info(f"Extracted serial number {exif['SerialNumber']} from {image_path}")
-        except Exception as e:
-            logging.error(f"Error extracting EXIF data from {image_path}: {e}")
-    
-    return exif
+        extracted = extract(image_paths)
+    results = {exif.pop('SourceFile'): exif for exif in extracted}
+    results.update(incomplete)
+    return results
+
+def get_exif(image_path, use_catalog=True):
+    """Extract DateTimeOriginal and SerialNumber for one image, through the shared catalog unless use_catalog is False."""
+    return get_exif_batch([image_path], use_catalog).get(image_path, {})
 
 def adjust_time(original_time, offset):
     """Adjust the capture time by the given offset."""
     return original_time + timedelta(seconds=offset)
 
+def parse_time(time_str):
+    """Parse an EXIF ("2024:07:20 22:19:09") or ISO ("2024-07-20 22:19:09") time, or return None."""
+    try:
+        return datetime.strptime(str(time_str)[:19].replace('-', ':'), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
 def update_exif_time(image_path, new_time_str):
-    """Update the EXIF DateTimeOriginal with the new time using exiftool."""
+    """Update the EXIF DateTimeOriginal with the new time using exiftool; returns True on success."""
     try:
-        # Use subprocess to call exiftool with -overwrite_original
-        subprocess.run(['exiftool', '-overwrite_original', f'-DateTimeOriginal={new_time_str}', f'-CreateDate={new_time_str}', f'-ModifyDate={new_time_str}', image_path], check=True)
-        logging.info(f"Updated EXIF DateTimeOriginal for {image_path} to {new_time_str}")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Failed to update EXIF data for {image_path}: {e}")
-
-def process_image(image_path, offset):
-    """Process a single image file."""
-    exif = get_exif(image_path)
-    
-    if 'DateTimeOriginal' in exif:
-        original_time_str = exif['DateTimeOriginal']
-        original_time = datetime.strptime(original_time_str, "%Y:%m:%d %H:%M:%S")
-        new_time = adjust_time(original_time, offset)
-        
-        logging.info(f"Original time: {original_time_str} | New time: {new_time} for image: {image_path}")
-
-        # Update EXIF data with the new time
-        new_time_str = new_time.isoformat(sep=' ', timespec='seconds')
-        update_exif_time(image_path, new_time_str)
-        log_file_update(os.path.basename(image_path), image_path, original_time_str, new_time_str)
-    else:
-        logging.warning(f"No DateTimeOriginal found in {image_path}")
-
-def process_folder(folder_path, offsets):
-    """Process all images in a folder and subfolders, skipping files in '_ignore' directories."""
-    # Calculate total number of image files
-    total_files = sum(
-        len([f for f in files if f.lower().endswith(('jpg', 'jpeg', 'tiff', 'nef'))])
-        for _, _, files in os.walk(folder_path)
-    )
-    
-    processed_files = 0
-    start_time = time.time()
-    
-    unprocessed_files = get_unprocessed_files(folder_path)
+        # Use the shared exiftool pool with -overwrite_original
+        _, stderr = exiftool_client.execute('-overwrite_original', f'-DateTimeOriginal={new_time_str}', f'-CreateDate={new_time_str}', f'-ModifyDate={new_time_str}', image_path)
+        if b'Error' in stderr:
+            raise exiftool_client.ExifToolError(stderr.decode(errors='replace').strip())
+        logging.debug("Updated EXIF DateTimeOriginal for %s to %s", image_path, new_time_str)
+        return True
+    except exiftool_client.ExifToolError as e:
+        logging.error("Failed to update EXIF data for %s: %s", image_path, e)
+        return False
+
+def list_images(folder_path, metrics=None, console=None):
+    """Return the (path, stat) of every image below folder_path in a stable order, skipping '_ignore' directories.
+
+    Skipped folders are reported through console, the ProgressLine of the
+    caller, if given.
+    """
+    console = console or ProgressLine()
+
+    def skip_folder(path):
+        console.print(f"Skipping folder: {path} (in _ignore folder)")
+        logging.info("Skipping folder: %s (in _ignore folder)", path)
+
+    return list(walk_files(folder_path, IMAGE_EXTENSIONS, on_ignore=skip_folder, metrics=metrics))
+
+def plan_batch(image_paths, offsets):
+    """Pipeline worker: return the (file_path, serial, original_time, new_time) changes for a batch of images and a Counter of those skipped."""
+    exifs = get_exif_batch(image_paths)
+    skipped = Counter()
+    changes = (plan_image(image_path, exifs.get(image_path, {}), offsets, skipped) for image_path in image_paths)
+    return [change for change in changes if change is not None], skipped
+
+def plan_image(image_path, exif, offsets, skipped=None):
+    """Return the (file_path, serial, original_time, new_time) change for one image from its tags, or None.
+
+    Images that can't be planned are logged at DEBUG and counted in skipped,
+    a Counter of (reason, serial), if given; see summarize_skipped.
+    """
+    skipped = Counter() if skipped is None else skipped
+    serial_number = exif.get('SerialNumber', None)
+
+    if serial_number is None:
+        logging.debug("No serial number found in EXIF for %s", image_path)
+        skipped['no serial', None] += 1
+        return None
+
+    serial_number = str(serial_number).strip()  # Convert to string and strip spaces
+    if serial_number not in offsets:
+        logging.debug("No offset provided for serial number %s in %s", serial_number, image_path)
+        skipped['no offset', serial_number] += 1
+        return None
+
+    original_time_str = exif.get('DateTimeOriginal')
+    original_time = parse_time(original_time_str)
+    if original_time is None:
+        logging.debug("No DateTimeOriginal found in %s", image_path)
+        skipped['no date', serial_number] += 1
+        return None
+
+    new_time_str = adjust_time(original_time, offsets[serial_number]).isoformat(sep=' ', timespec='seconds')
+    logging.debug("Original time: %s | New time: %s for image: %s", original_time_str, new_time_str, image_path)
+    return (image_path, serial_number, original_time_str, new_time_str)
+
+def summarize_skipped(skipped):
+    """Return a one-line summary of the images plan_image skipped, e.g. 'no offset for 3012346 (120 images)'."""
+    parts = []
+    for (reason, serial), count in sorted(skipped.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+        if reason == 'no offset':
+            parts.append(f"no offset for {serial} ({count} images)")
+        elif reason == 'no serial':
+            parts.append(f"no serial number ({count} images)")
+        else:
+            parts.append(f"no DateTimeOriginal from {serial} ({count} images)")
+    return ', '.join(parts)
+
+def plan_changes(conn, folder_path, offsets, workers=None, metrics=None):
+    """Read every image once and record the intended changes in the change_plan journal; touches no images.
+
+    Changes still pending from an earlier plan are planned again, so a plan
+    made with wrong offsets is corrected by planning with the right ones.
+    """
+    metrics = metrics or RunMetrics('adjust_capture_times')
+
+    # Files already changed by an earlier run or being applied are not read again
+    already_handled = get_unprocessed_files(conn, folder_path)
+    already_handled.update(row[0] for row in conn.execute("SELECT file_path FROM change_plan WHERE status != 'pending'"))
+    pending = dict(conn.execute("SELECT file_path, new_time FROM change_plan WHERE status = 'pending'"))
+
+    planned = 0
+    replaced = 0
+    dropped = 0
+    skipped_images = Counter()
+    console = ProgressLine()
+
+    # The folder is listed before anything is read, so the progress line
+    # knows how many files are left; skipped files don't count towards it
+    images = []
+    skipped = 0
+    for image_path, st in list_images(folder_path, metrics, console):
+        if image_path in already_handled:
+            logging.debug("Skipping file: %s (status: skipped)", image_path)
+            skipped += 1
+        else:
+            images.append((image_path, st))
+    metrics.count('files_skipped', skipped)
+    progress = Progress(len(images))
+    examined = 0
+
+    def count_examined(image_paths):
+        metrics.count('files_examined', len(image_paths))
+        return image_paths, plan_batch(image_paths, offsets)
+
+    def write_plan(results):
+        nonlocal planned, replaced, dropped, examined
+        rows = [row for _, (batch_rows, _) in results for row in batch_rows]
+        for _, (_, batch_skipped) in results:
+            skipped_images.update(batch_skipped)
+        # Pending changes that are no longer wanted, e.g. the camera was taken out of the offsets
+        planned_paths = {row[0] for row in rows}
+        stale = [(image_path,) for image_paths, _ in results for image_path in image_paths
+                 if image_path in pending and image_path not in planned_paths]
+        for row in rows:
+            if row[0] in pending and parse_time(pending[row[0]]) != parse_time(row[3]):
+                logging.debug("Replacing pending change for %s: %s instead of %s", row[0], row[3], pending[row[0]])
+                replaced += 1
+        planned_at = datetime.now().isoformat()
+        with metrics.time('db_write', len(rows) + len(stale)), conn:
+            conn.executemany("DELETE FROM change_plan WHERE file_path = ? AND status = 'pending'", stale)
+            conn.executemany('''
+                INSERT INTO change_plan (file_path, serial, original_time, new_time, status, planned_at)
+                VALUES (?, ?, ?, ?, 'pending', ?)
+                ON CONFLICT (file_path) DO UPDATE SET
+                    serial = excluded.serial, original_time = excluded.original_time,
+                    new_time = excluded.new_time, planned_at = excluded.planned_at
+                WHERE change_plan.status = 'pending'
+            ''', [row + (planned_at,) for row in rows])
+        planned += len(rows)
+        dropped += len(stale)
+        examined += sum(len(image_paths) for image_paths, _ in results)
+        # Throughput counts every file examined, not just the ones that need a change
+        console.update(f"Planned changes for {planned} files, {progress.format(examined)}")
+
+    # The headers of the next images are read ahead
+    image_paths = (image_path for image_path, _ in read_ahead(images, metrics=metrics))
+    run_pipeline(batched(image_paths, PLAN_BATCH_SIZE),
+                 metrics.wrap('extract', count_examined, len), write_plan, workers=workers,
+                 batch_size=max(1, DEFAULT_BATCH_SIZE // PLAN_BATCH_SIZE))
+    console.finish()
+    metrics.count('files_planned', planned)
+    print(f"Examined {examined} files, planned {planned} changes, skipped {skipped} already handled")
+    logging.info("Examined %s files, planned %s changes, skipped %s already handled", examined, planned, skipped)
+    if replaced or dropped:
+        # The offsets differ from those of the earlier plan; only the new ones will be applied
+        print(f"Replaced {replaced} and dropped {dropped} pending changes from an earlier plan with other offsets")
+        logging.warning("Replaced %s and dropped %s pending changes from an earlier plan with other offsets",
+                        replaced, dropped)
+    if skipped_images:
+        # One line instead of a warning per image; -v logs each image
+        summary = summarize_skipped(skipped_images)
+        print(f"Not planned: {summary}")
+        logging.warning("Not planned: %s", summary)
+    print_plan_summary(conn)
+    return planned
+
+def print_plan_summary(conn):
+    """Print the journal per camera and status, e.g. to check offsets before applying."""
+    rows = conn.execute('''
+        SELECT serial, status, COUNT(*), MIN(original_time), MIN(new_time), MAX(original_time), MAX(new_time)
+        FROM change_plan GROUP BY serial, status ORDER BY serial, status
+    ''').fetchall()
+    for serial, status, count, first_old, first_new, last_old, last_new in rows:
+        print(f"{serial}: {count} {status} | {first_old} -> {first_new} ... {last_old} -> {last_new}")
+
+def apply_change(row):
+    """Pipeline worker: write one planned change; returns the row plus whether it succeeded."""
+    plan_id, image_path, original_time_str, new_time_str = row
+    return row + (update_exif_time(image_path, new_time_str),)
+
+# Limits for one grouped exiftool call. Arguments travel over the stay_open
+# pipe, but the chunks are kept below common command-line limits so the same
+# argument list also works for a one-off `exiftool -@ argfile` call.
+MAX_FILES_PER_SHIFT = 250
+MAX_PATH_BYTES_PER_SHIFT = 96 * 1024
+# Rewriting a large RAW file can take a second or more, so a grouped call may
+# wait this long per file instead of the pool's default read timeout
+SHIFT_SECONDS_PER_FILE = 2
+
+def format_shift(offset_seconds):
+    """Return the exiftool shift operator and value, e.g. ('+=', '0:0:1 2:00:05')."""
+    operator = '+=' if offset_seconds >= 0 else '-='
+    days, remainder = divmod(abs(int(round(offset_seconds))), 86400)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return operator, f'0:0:{days} {hours}:{minutes:02d}:{seconds:02d}'
+
+def group_by_offset(rows):
+    """Group journal rows by time offset and split each group into exiftool-sized chunks."""
+    groups = {}
+    for row in rows:
+        offset = (parse_time(row[3]) - parse_time(row[2])).total_seconds()
+        groups.setdefault(offset, []).append(row)
 
-    for root, dirs, files in os.walk(folder_path):
-        # Skip processing if the '_ignore' folder is in the path
-        if '_ignore' in root.split(os.path.sep):
-            print(f"\nSkipping folder: {root} (in _ignore folder)")
-            logging.info(f"\nSkipping folder: {root} (in _ignore folder)")
+    for offset, group in groups.items():
+        chunk, chunk_bytes = [], 0
+        for row in group:
+            path_bytes = len(row[1].encode('utf-8')) + 1
+            if chunk and (len(chunk) >= MAX_FILES_PER_SHIFT or chunk_bytes + path_bytes > MAX_PATH_BYTES_PER_SHIFT):
+                yield offset, chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(row)
+            chunk_bytes += path_bytes
+        if chunk:
+            yield offset, chunk
+
+def failed_paths(stderr, image_paths):
+    """Return the paths exiftool reported an error for ("Error: <message> - <path>")."""
+    paths = set(image_paths)
+    failed = set()
+    for line in stderr.decode('utf-8', errors='replace').splitlines():
+        if not line.startswith('Error'):
             continue
-        
-        for file in files:
-            if file.lower().endswith(('jpg', 'jpeg', 'tiff', 'nef')):
-                image_path = os.path.join(root, file)
-                
-                # Determine if the file should be processed
-                if image_path in unprocessed_files:
-                    status = 'skipped'
-                else:
-                    status = 'to be processed'
-                
-                exif = get_exif(image_path)
-                
-                serial_number = exif.get('SerialNumber', None)
-                
-                if serial_number is not None:
-                    serial_number = str(serial_number).strip()  # Convert to string and strip spaces
-                    if serial_number in offsets:
-                        if status == 'to be processed':
-                            process_image(image_path, offsets[serial_number])
-                            processed_files += 1
-                            log_file_update(os.path.basename(image_path), image_path, exif.get('DateTimeOriginal', ''), adjust_time(datetime.strptime(exif.get('DateTimeOriginal', ''), "%Y:%m:%d %H:%M:%S"), offsets[serial_number]).isoformat(sep=' ', timespec='seconds'))
-                        else:
-                            print(f"\nSkipping file: {image_path} (status: {status})")
-                            logging.info(f"Skipping file: {image_path} (status: {status})")
-                    else:
-                        logging.warning(f"No offset provided for serial number {serial_number} in {image_path}")
-                else:
-                    logging.warning(f"No serial number found in EXIF for {image_path}")
+        for match in re.finditer(' - ', line):
+            candidate = line[match.end():].strip()
+            if candidate in paths:
+                failed.add(candidate)
+                logging.error("Failed to update EXIF data for %s: %s", candidate, line)
+                break
+    return failed
+
+# In-place patching of the three EXIF date tags. Each of them is a fixed
+# 20-byte ASCII value ("YYYY:MM:DD HH:MM:SS\0"), so shifting them never changes
+# the file layout and the rest of a 30-60 MB RAW file can stay untouched.
+DATE_TAGS = ('DateTimeOriginal', 'CreateDate', 'ModifyDate')
+DATE_VALUE_LENGTH = 20
+
+# Every patch is appended to the undo log once the old bytes are verified and
+# before the file is touched, so it can be undone
+undo_lock = threading.Lock()
+
+def plan_in_place_patch(image_path, offset_seconds):
+    """Return [(position, old_bytes, new_bytes)] for the date tags, or None if the file can't be patched safely."""
+    try:
+        with open(image_path, 'rb') as f:
+            size = f.seek(0, 2)
+            if size == 0:
+                return None
+            with mmap.mmap(f.fileno(), min(size, exif_reader.HEADER_BYTES), access=mmap.ACCESS_READ) as buf:
+                # exiftool would also shift XMP copies of these dates; leave such files to it
+                if exif_reader.has_xmp(buf):
+                    return None
+                found, _ = exif_reader.locate_tags(buf, DATE_TAGS)
+                if 'DateTimeOriginal' not in found:
+                    return None
+
+                patches = []
+                for name, (field_type, count, position) in found.items():
+                    if field_type != exif_reader.ASCII or count != DATE_VALUE_LENGTH:
+                        return None
+                    if position + DATE_VALUE_LENGTH > len(buf):
+                        return None
+                    old_bytes = bytes(buf[position:position + DATE_VALUE_LENGTH])
+                    old_time = parse_time(old_bytes[:-1].decode('ascii', errors='replace'))
+                    if old_time is None or old_bytes[-1:] != b'\x00':
+                        return None
+                    new_time = adjust_time(old_time, offset_seconds)
+                    new_bytes = new_time.strftime("%Y:%m:%d %H:%M:%S").encode('ascii') + b'\x00'
+                    patches.append((position, old_bytes, new_bytes))
+                return patches
+    except (OSError, ValueError, struct.error, exif_reader.ExifFormatError):
+        return None
+
+def record_undo(image_path, patches, undo_path=DEFAULT_UNDO_PATH):
+    """Durably append the byte-level undo record for one file."""
+    with undo_lock:
+        with open(undo_path, 'a', encoding='utf-8') as undo_file:
+            for position, old_bytes, new_bytes in patches:
+                undo_file.write(json.dumps({'file_path': image_path, 'position': position,
+                                            'old': old_bytes.decode('ascii'), 'new': new_bytes.decode('ascii')}) + '\n')
+            undo_file.flush()
+            os.fsync(undo_file.fileno())
+
+def write_patches(image_path, patches, expected_index=1, before_write=None):
+    """Write patches through a memory map if the bytes at each position still match; fsyncs the file.
+
+    before_write is called once the bytes have been checked, right before
+    anything is written.
+    """
+    with open(image_path, 'r+b') as f:
+        length = max(position for position, _, _ in patches) + DATE_VALUE_LENGTH
+        with mmap.mmap(f.fileno(), length) as buf:
+            for patch in patches:
+                position = patch[0]
+                if buf[position:position + DATE_VALUE_LENGTH] != patch[expected_index]:
+                    return False
+            if before_write is not None:
+                before_write()
+            for patch in patches:
+                position = patch[0]
+                buf[position:position + DATE_VALUE_LENGTH] = patch[3 - expected_index]
+            buf.flush()
+        os.fsync(f.fileno())
+    return True
+
+def patch_in_place(image_path, offset_seconds, undo_path=DEFAULT_UNDO_PATH):
+    """Shift the EXIF date tags of one file in place; returns False if the file has to go through exiftool."""
+    patches = plan_in_place_patch(image_path, offset_seconds)
+    if not patches:
+        return False
+    try:
+        # Only bytes that were verified get an undo record
+        return write_patches(image_path, patches,
+                             before_write=functools.partial(record_undo, image_path, patches, undo_path))
+    except (OSError, ValueError) as e:
+        logging.error("Failed to patch %s in place: %s", image_path, e)
+        return False
+
+def undo_in_place_patches(undo_path=DEFAULT_UNDO_PATH):
+    """Restore the original bytes of every patch in the undo record, newest first."""
+    with open(undo_path, 'r', encoding='utf-8') as undo_file:
+        records = [json.loads(line) for line in undo_file if line.strip()]
+
+    restored = 0
+    for record in reversed(records):
+        patch = (record['position'], record['old'].encode('ascii'), record['new'].encode('ascii'))
+        try:
+            # Only restore bytes that still hold the patched value
+            if write_patches(record['file_path'], [patch], expected_index=2):
+                restored += 1
+        except (OSError, ValueError) as e:
+            logging.error("Failed to undo patch in %s: %s", record['file_path'], e)
+    logging.info("Restored %s of %s patched date values from %s", restored, len(records), undo_path)
+    return restored
+
+def apply_shift_group(group, in_place=False, metrics=None, undo_path=DEFAULT_UNDO_PATH):
+    """Pipeline worker: shift AllDates for one chunk of same-offset files.
+
+    With in_place=True every file that can be patched safely is patched in
+    place; the rest go to a single exiftool call.
+    """
+    offset, rows = group
+    patched = []
+    if in_place:
+        remaining = []
+        for row in rows:
+            start = time.perf_counter()
+            done = patch_in_place(row[1], offset, undo_path)
+            if metrics is not None:
+                metrics.record('patch_write', time.perf_counter() - start)
+            if done:
+                logging.debug("Patched EXIF dates in place for %s to %s", row[1], row[3])
+                patched.append(row + (True,))
+            else:
+                remaining.append(row)
+        rows = remaining
+        if not rows:
+            return patched
+    start = time.perf_counter()
+    shifted = shift_with_exiftool(offset, rows)
+    if metrics is not None:
+        metrics.record('exiftool_write', time.perf_counter() - start, len(rows))
+    return patched + shifted
+
+def shift_with_exiftool(offset, rows):
+    """Shift AllDates for same-offset files with a single exiftool call; returns rows plus success flags."""
+    image_paths = [row[1] for row in rows]
+    operator, shift = format_shift(offset)
+    try:
+        stdout, stderr = exiftool_client.execute(
+            '-overwrite_original', f'-AllDates{operator}{shift}', *image_paths,
+            timeout=max(exiftool_client.DEFAULT_TIMEOUT, SHIFT_SECONDS_PER_FILE * len(rows)))
+    except exiftool_client.ExifToolError as e:
+        logging.error("Failed to shift %s files by %s seconds: %s", len(rows), offset, e)
+        # exiftool may have written part of the chunk before it failed or timed
+        # out; a relative shift must not be repeated on those files
+        return [row + (file_state(*row[1:]) == 'done',) for row in rows]
+
+    failed = failed_paths(stderr, image_paths)
+    updated = re.search(rb'(\d+) image files updated', stdout)
+    trusted = updated is not None and int(updated.group(1)) == len(image_paths) - len(failed)
 
-                # Calculate elapsed time and estimate remaining time based on image files
-                elapsed_time = time.time() - start_time
-                estimated_total_time = (elapsed_time / processed_files) * total_files if processed_files > 0 else 0
-                remaining_time = estimated_total_time - elapsed_time
-                remaining_time_str = str(timedelta(seconds=int(remaining_time))).split('.')[0]  # Format as HH:MM:SS
+    results = []
+    for row in rows:
+        if row[1] in failed:
+            ok = False
+        elif trusted:
+            ok = True
+        else:
+            # Counts don't add up (e.g. files left unchanged); check the file itself
+            ok = file_state(*row[1:]) == 'done'
+        if ok:
+            logging.debug("Updated EXIF DateTimeOriginal for %s to %s", row[1], row[3])
+        results.append(row + (ok,))
+    return results
 
-                # Print progress
-                print(f"\r[{str(timedelta(seconds=int(elapsed_time)))}] {processed_files}/{total_files} files processed - Estimated time remaining: {remaining_time_str}", end='')
+def mark_applied(conn, results):
+    """Mark journal rows done or failed and log them to file_updates as 'changed' or 'failed', in one transaction."""
+    applied_at = datetime.now().isoformat()
+    done = [result for result in results if result[4]]
+    failed = [result for result in results if not result[4]]
+    with conn:
+        conn.executemany("UPDATE change_plan SET status = 'done', applied_at = ? WHERE id = ?",
+                         [(applied_at, result[0]) for result in done])
+        conn.executemany("UPDATE change_plan SET status = 'failed', applied_at = ? WHERE id = ?",
+                         [(applied_at, result[0]) for result in failed])
+        conn.executemany('''
+            INSERT INTO file_updates (file_name, file_path, original_time, changed_time, changed_at, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(os.path.basename(path), path, original, new, applied_at, 'changed' if ok else 'failed')
+              for _, path, original, new, ok in results])
+
+    # Keep the shared catalog in step with the rewritten files
+    metadata_catalog = catalog.get_catalog()
+    if metadata_catalog is not None:
+        metadata_catalog.put_many([(path, {'DateTimeOriginal': parse_time(new).strftime("%Y:%m:%d %H:%M:%S")})
+                                   for _, path, _, new, _ in done], ['DateTimeOriginal'])
+
+def file_state(image_path, original_time_str, new_time_str):
+    """Return 'done' if the file holds the new time, 'pending' if it still holds the original one, else None."""
+    current_time = parse_time(get_exif(image_path, use_catalog=False).get('DateTimeOriginal', ''))
+    if current_time is not None and current_time == parse_time(new_time_str):
+        return 'done'
+    if current_time is not None and current_time == parse_time(original_time_str):
+        return 'pending'
+    logging.error("Unexpected capture time %s in %s, expected %s or %s", current_time, image_path, original_time_str, new_time_str)
+    return None
+
+def recover_interrupted(conn):
+    """Settle rows left in 'applying' by a crash or Ctrl-C, or 'failed' by an earlier run, by looking at each file's current time.
+
+    Only files that still hold their original time go back to 'pending';
+    files with an unexpected time stay 'failed' so they are never shifted twice.
+    """
+    rows = conn.execute("SELECT id, file_path, original_time, new_time, status FROM change_plan "
+                        "WHERE status IN ('applying', 'failed')").fetchall()
+    if not rows:
+        return
+    logging.info("Recovering %s changes interrupted or failed in an earlier run", len(rows))
+    results = []
+    for plan_id, image_path, original_time_str, new_time_str, status in rows:
+        state = file_state(image_path, original_time_str, new_time_str)
+        if state == 'pending':
+            with conn:
+                conn.execute("UPDATE change_plan SET status = 'pending' WHERE id = ?", (plan_id,))
+        elif status == 'applying' or state == 'done':
+            results.append((plan_id, image_path, original_time_str, new_time_str, state == 'done'))
+        # Otherwise the failure is already in file_updates and the row stays failed
+    mark_applied(conn, results)
+
+def apply_plan(conn, batch_size=500, workers=None, grouped=True, in_place=False, metrics=None,
+               undo_path=DEFAULT_UNDO_PATH):
+    """Execute the pending changes in the journal in batches; safe to rerun after a crash or Ctrl-C.
 
-    print()  # New line after progress completion
+    With grouped=True files sharing an offset are shifted together with
+    `-AllDates+=`, a few hundred per exiftool call; otherwise every file gets
+    its own call that sets the three date tags to the planned time.
+    in_place=True (grouped mode only) patches the date bytes directly where
+    that is safe and records an undo log in undo_path.
+    """
+    if in_place and not grouped:
+        raise ValueError("in_place needs grouped=True")
+    metrics = metrics or RunMetrics('adjust_capture_times')
+    recover_interrupted(conn)  # Also retries earlier failures whose files are untouched
 
+    total_files = conn.execute("SELECT COUNT(*) FROM change_plan WHERE status = 'pending'").fetchone()[0]
+    processed_files = 0
+    progress = Progress(total_files)
+    console = ProgressLine()
+
+    def write_results(results):
+        # Runs on the pipeline's single writer thread
+        nonlocal processed_files
+        if grouped:
+            results = [result for group_results in results for result in group_results]
+        with metrics.time('db_write', len(results)):
+            mark_applied(conn, results)
+        processed_files += len(results)
+        metrics.count('files_applied', sum(1 for result in results if result[4]))
+        metrics.count('files_failed', sum(1 for result in results if not result[4]))
+
+        # The ETA follows the recent throughput of applied files
+        console.update(progress.format(processed_files))
+
+    try:
+        while True:
+            # Ordered by camera so a batch holds few distinct offsets
+            rows = conn.execute(f'''
+                SELECT id, file_path, original_time, new_time FROM change_plan
+                WHERE status = 'pending' ORDER BY {'serial, id' if grouped else 'id'} LIMIT ?
+            ''', (batch_size,)).fetchall()
+            if not rows:
+                break
+            # Claim the batch before touching any file, so an interruption
+            # leaves a trail recover_interrupted can settle
+            with conn:
+                conn.executemany("UPDATE change_plan SET status = 'applying' WHERE id = ?", [(row[0],) for row in rows])
+            if grouped:
+                run_pipeline(group_by_offset(rows),
+                             functools.partial(apply_shift_group, in_place=in_place, metrics=metrics, undo_path=undo_path),
+                             write_results, workers=workers, batch_size=1)
+            else:
+                run_pipeline(rows, metrics.wrap('exiftool_write', apply_change), write_results, workers=workers, batch_size=50)
+    finally:
+        console.finish()  # Last state and a new line after progress completion
+    return processed_files
 
+def process_folder(conn, folder_path, offsets, workers=None, in_place=False, metrics=None,
+                   undo_path=DEFAULT_UNDO_PATH):
+    """Plan and apply the changes for all images in a folder and subfolders, skipping '_ignore' directories."""
+    metrics = metrics or RunMetrics('adjust_capture_times')
+    plan_changes(conn, folder_path, offsets, workers, metrics)
+    apply_plan(conn, workers=workers, in_place=in_place, metrics=metrics, undo_path=undo_path)
+    return metrics
 
 
 def parse_offsets(offset_file):
@@ -219,7 +697,7 @@ def parse_offsets(offset_file):
                     real_time = datetime.strptime(real_time_str, "%Y:%m:%d %H:%M:%S")
                 except ValueError as e:
                     print(f"Error parsing time for serial number {serial_number}: {e}")
-                    logging.error(f"Error parsing time for serial number {serial_number}: {e}")
+                    logging.error("Error parsing time for serial number %s: %s", serial_number, e)
                     continue
                 
                 exif = get_exif(image_path)
@@ -229,31 +707,81 @@ def parse_offsets(offset_file):
                         original_time = datetime.strptime(original_time_str, "%Y:%m:%d %H:%M:%S")
                     except ValueError as e:
                         print(f"Error parsing original time in EXIF for {image_path}: {e}")
-                        logging.error(f"Error parsing original time in EXIF for {image_path}: {e}")
+                        logging.error("Error parsing original time in EXIF for %s: %s", image_path, e)
                         continue
                     
                     offset = (real_time - original_time).total_seconds()
                     offsets[serial_number] = offset
                     print(f"Calculated offset for serial number {serial_number}: {offset} seconds")
-                    logging.info(f"Calculated offset for serial number {serial_number}: {offset} seconds")
+                    logging.info("Calculated offset for serial number %s: %s seconds", serial_number, offset)
                 else:
                     print(f"No DateTimeOriginal found in {image_path}")
-                    logging.warning(f"No DateTimeOriginal found in {image_path}")
+                    logging.warning("No DateTimeOriginal found in %s", image_path)
     
     return offsets
 
-def main():
-    create_database()
-    folder_to_process = input("Enter the folder path to process: ")
-    offset_file = input("Enter the path to the offset CSV/TXT file: ")
-    
-    logging.info(f"Starting processing for folder: {folder_to_process} with offset file: {offset_file}")
-    
-    offsets = parse_offsets(offset_file)
-    
-    process_folder(folder_to_process, offsets)
-    
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Shift EXIF capture times per camera body. Asks for anything not given on the command line.")
+    parser.add_argument('mode', nargs='?', choices=('plan', 'apply', 'run', 'undo'),
+                        help="plan (dry run), apply (execute the plan), run (both) or undo (revert in-place patches)")
+    parser.add_argument('folder', nargs='?', help="folder to process (plan and run)")
+    parser.add_argument('offsets', nargs='?', help="CSV/TXT file with the time offset per serial number")
+    parser.add_argument('--in-place', action='store_true',
+                        help="patch dates in place where possible instead of rewriting files")
+    parser.add_argument('--per-file', action='store_true',
+                        help="one exiftool call per file instead of grouped shifts")
+    parser.add_argument('--workers', type=int, help="parallel extraction and exiftool workers")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="update journal (default: %(default)s)")
+    parser.add_argument('--undo-log', default=DEFAULT_UNDO_PATH, help="in-place patch undo log (default: %(default)s)")
+    parser.add_argument('--logs-dir', default=DEFAULT_LOGS_DIR, help="directory for log and metrics files")
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help="also log every file examined and changed")
+    args = parser.parse_args(argv)
+    if args.in_place and args.per_file:
+        parser.error("--in-place patches grouped shifts and cannot be combined with --per-file")
+
+    log_base = setup_logging(args.logs_dir, args.verbose)
+    metrics = RunMetrics('adjust_capture_times')
+
+    mode = args.mode
+    in_place = args.in_place
+    if mode is None:
+        mode = input("Enter mode - plan (dry run), apply (execute the plan) or run (both) [run]: ").strip().lower() or 'run'
+        if mode not in ('plan', 'apply', 'run'):
+            print(f"Unknown mode: {mode}")
+            return
+        if mode in ('apply', 'run') and not args.per_file:
+            in_place = input("Patch dates in place where possible instead of rewriting files? (y/N): ").strip().lower() == 'y'
+
+    if mode == 'undo':
+        restored = undo_in_place_patches(args.undo_log)
+        print(f"Restored {restored} patched date values")
+        return
+
+    with open_journal(args.db) as conn:
+        if mode == 'apply':
+            logging.info("Applying planned changes")
+            apply_plan(conn, workers=args.workers, grouped=not args.per_file, in_place=in_place,
+                       metrics=metrics, undo_path=args.undo_log)
+            metrics.write_summary(log_base + '_metrics.json')
+            logging.info("Processing completed.")
+            return
+
+        folder_to_process = args.folder or input("Enter the folder path to process: ")
+        offset_file = args.offsets or input("Enter the path to the offset CSV/TXT file: ")
+
+        logging.info("Starting processing for folder: %s with offset file: %s", folder_to_process, offset_file)
+
+        offsets = parse_offsets(offset_file)
+
+        plan_changes(conn, folder_to_process, offsets, args.workers, metrics)
+        if mode == 'run':
+            apply_plan(conn, workers=args.workers, grouped=not args.per_file, in_place=in_place,
+                       metrics=metrics, undo_path=args.undo_log)
+    metrics.write_summary(log_base + '_metrics.json')
+
     logging.info("Processing completed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
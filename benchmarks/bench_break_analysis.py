@@ -0,0 +1,55 @@
+# Compare calculate_photographing_time, run once per break duration, with the
+# single streaming pass over many break durations in break_analysis.
+#
+# Usage: python bench_break_analysis.py [timestamps] [scalar_runs]
+
+import os
+import sys
+import time
+import random
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from photo_common import break_analysis
+
+
+def synthetic_timestamps(count, seed=42):
+    """Bursts of shots a few seconds apart with occasional longer pauses."""
+    rng = random.Random(seed)
+    current = datetime.datetime(2015, 1, 1, 9, 0, 0)
+    timestamps = []
+    for _ in range(count):
+        timestamps.append(current)
+        gap = rng.choice((1, 1, 2, 3, 5, 20)) if rng.random() < 0.97 else rng.randint(60, 7200)
+        current += datetime.timedelta(seconds=gap)
+    rng.shuffle(timestamps)
+    return timestamps
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    scalar_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    thresholds = break_analysis.DEFAULT_SWEEP_MINUTES
+    timestamps = synthetic_timestamps(count)
+    print(f"{count} timestamps")
+
+    start = time.perf_counter()
+    scalar = [break_analysis.calculate_photographing_time(list(timestamps), threshold)
+              for threshold in thresholds[:scalar_runs]]
+    per_threshold = (time.perf_counter() - start) / scalar_runs
+    print(f"calculate_photographing_time: {per_threshold:.2f} s per threshold, "
+          f"~{per_threshold * len(thresholds):.1f} s for {len(thresholds)} thresholds")
+
+    # The report streams epoch seconds from the database in this order
+    epoch_seconds = sorted((timestamp - break_analysis.EPOCH) // datetime.timedelta(seconds=1)
+                           for timestamp in timestamps)
+    start = time.perf_counter()
+    analysis = break_analysis.StreamingBreakAnalysis(thresholds[0], thresholds)
+    for chunk_start in range(0, len(epoch_seconds), 10000):
+        analysis.feed(epoch_seconds[chunk_start:chunk_start + 10000])
+    curve = analysis.sweep()
+    print(f"StreamingBreakAnalysis: {time.perf_counter() - start:.2f} s for {len(thresholds)} thresholds")
+
+    for (threshold, photographing_time, break_count), (_, expected_time, expected_breaks) in zip(curve, scalar):
+        assert photographing_time == expected_time and break_count == len(expected_breaks), threshold
+    print("Results match")
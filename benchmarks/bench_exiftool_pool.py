@@ -0,0 +1,64 @@
+# Compare reading metadata with one exiftool process per file against the
+# persistent exiftool pool used by the scripts.
+#
+# Usage: python bench_exiftool_pool.py /path/to/photos [max_files] [workers]
+
+import os
+import sys
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from photo_common import exiftool_client
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.dng', '.nef', '.cr2')
+
+
+def collect_files(folder_path, max_files):
+    """Return up to max_files photo paths below folder_path."""
+    files = []
+    for root, _, filenames in os.walk(folder_path):
+        for f in filenames:
+            if f.lower().endswith(EXTENSIONS):
+                files.append(os.path.join(root, f))
+                if len(files) >= max_files:
+                    return files
+    return files
+
+
+def run_per_file(files):
+    """Spawn a fresh exiftool for every file, as the scripts used to."""
+    for file_path in files:
+        subprocess.run([exiftool_client.DEFAULT_EXECUTABLE, '-j', file_path],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def run_pool(files, workers):
+    """Send every file to a persistent pool of exiftool processes."""
+    with exiftool_client.ExifToolPool(size=workers) as pool:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(pool.execute_json, files))
+
+
+def measure(label, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    files_per_sec = len(args[0]) / elapsed if elapsed else float('inf')
+    print(f"{label:<28} {elapsed:8.2f} s  {files_per_sec:8.1f} files/sec")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python bench_exiftool_pool.py /path/to/photos [max_files] [workers]")
+    folder = sys.argv[1]
+    max_files = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else min(4, os.cpu_count() or 1)
+
+    files = collect_files(folder, max_files)
+    print(f"Benchmarking {len(files)} files from {folder}")
+    measure("one exiftool per file", run_per_file, files)
+    measure("stay_open pool, 1 process", run_pool, files, 1)
+    if workers > 1:
+        measure(f"stay_open pool, {workers} processes", run_pool, files, workers)
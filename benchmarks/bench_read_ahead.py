@@ -0,0 +1,177 @@
+# Measure read-ahead on an artificially slow filesystem.
+#
+# A synthetic library is planned with adjust_capture_times.plan_changes (walk,
+# native EXIF reads, journal writes) with read-ahead off and on. Slow storage
+# is simulated inside the process: the first read of every library file costs
+# the given latency, as a cold read from a card reader or a NAS would, and at
+# most --depth such reads are served at once. Later reads of the same file are
+# free, like a page cache hit. Opening a file is free. A read is an os.read()
+# or memory-mapping the file, which is how exif_reader gets at the header, and
+# posix_fadvise(WILLNEED) starts the fetch in the background and returns at
+# once, like the kernel's readahead. So a hint only helps if it gets the data
+# moving before the extraction worker needs it.
+#
+# Read-ahead runs READ_AHEAD_THREADS hint threads next to the extraction
+# workers, so the run without hints is repeated with that many more workers,
+# to tell the hints apart from the extra concurrency.
+#
+# The shared catalog is disabled so every file is really read.
+#
+# Usage: python bench_read_ahead.py [--files 2000] [--latencies 0 0.005 0.02] [--depth 32] [--workers N]
+
+import io
+import os
+import sys
+import mmap
+import time
+import shutil
+import argparse
+import builtins
+import tempfile
+import functools
+import threading
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+os.environ['PHOTO_CATALOG_DB'] = 'off'
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, 'adjust_capture_times'))
+from synthetic_library import DEFAULT_SERIALS, generate_library
+import adjust_capture_times
+from photo_common import readahead
+from photo_common.metrics import RunMetrics
+from photo_common.pipeline import DEFAULT_WORKERS
+
+
+class ThrottledFS:
+    """Makes the first read of every file below root wait for a simulated device."""
+
+    def __init__(self, root, latency, depth):
+        self.root = os.path.abspath(root) + os.sep
+        self.latency = latency
+        self.slots = threading.Semaphore(depth)
+        self.fetched = {}
+        self.paths = {}  # fd -> path, for the open library files
+        self._lock = threading.Lock()
+        self._patched = []
+
+    def fetch(self, path, wait=True):
+        """Get a file from the device unless it already was; wait=False only starts the fetch."""
+        with self._lock:
+            done = self.fetched.get(path)
+            first = done is None
+            if first:
+                done = self.fetched[path] = threading.Event()
+        if first and not wait:
+            threading.Thread(target=self._load, args=(done,), daemon=True).start()
+        elif first:
+            self._load(done)
+        elif wait:
+            done.wait()
+
+    def _load(self, done):
+        with self.slots:
+            time.sleep(self.latency)
+        done.set()
+
+    def _remember(self, fd, path):
+        if isinstance(path, str) and os.path.abspath(path).startswith(self.root):
+            self.paths[fd] = path
+        else:
+            self.paths.pop(fd, None)
+
+    def install(self):
+        def wrap_open(original):
+            @functools.wraps(original)
+            def opened(path, *args, **kwargs):
+                f = original(path, *args, **kwargs)
+                self._remember(f if isinstance(f, int) else f.fileno(), path)
+                return f
+            return opened
+
+        def wrap_fd(original, before):
+            @functools.wraps(original)
+            def called(fd, *args, **kwargs):
+                before(fd, *args)
+                return original(fd, *args, **kwargs)
+            return called
+
+        def read(fd, *args):
+            if fd in self.paths:
+                self.fetch(self.paths[fd])
+
+        def fadvise(fd, offset, length, advice):
+            if fd in self.paths and advice == os.POSIX_FADV_WILLNEED:
+                self.fetch(self.paths[fd], wait=False)
+
+        def close(fd):
+            self.paths.pop(fd, None)
+
+        patches = [(builtins, 'open', wrap_open(builtins.open)), (io, 'open', wrap_open(io.open)),
+                   (os, 'open', wrap_open(os.open)), (os, 'read', wrap_fd(os.read, read)),
+                   (os, 'close', wrap_fd(os.close, close)), (mmap, 'mmap', wrap_fd(mmap.mmap, read))]
+        if hasattr(os, 'posix_fadvise'):
+            patches.append((os, 'posix_fadvise', wrap_fd(os.posix_fadvise, fadvise)))
+        for module, name, replacement in patches:
+            self._patched.append((module, name, getattr(module, name)))
+            setattr(module, name, replacement)
+
+    def uninstall(self):
+        for module, name, original in reversed(self._patched):
+            setattr(module, name, original)
+        self._patched.clear()
+
+
+def plan_once(library, offsets, latency, depth, mode, workers):
+    """Plan the library on a cold throttled filesystem; returns (seconds, metrics)."""
+    adjust_capture_times.read_ahead = functools.partial(readahead.read_ahead, mode=mode)
+    metrics = RunMetrics('bench_read_ahead')
+    throttle = ThrottledFS(library, latency, depth)
+    throttle.install()
+    try:
+        with adjust_capture_times.open_journal(':memory:') as conn, \
+                contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            adjust_capture_times.plan_changes(conn, library, offsets, workers, metrics)
+            return time.perf_counter() - start, metrics
+    finally:
+        throttle.uninstall()
+
+
+def run_benchmark(files, latencies, depth, workers):
+    base_dir = tempfile.mkdtemp(prefix='photo-bench-')
+    try:
+        library = os.path.join(base_dir, 'library')
+        generate_library(library, files)
+        offsets = {serial: 3600 for serial in DEFAULT_SERIALS}
+        workers = workers or DEFAULT_WORKERS
+        print(f"{files} files, device queue depth {depth}, {workers} extraction workers, "
+              f"{readahead.READ_AHEAD_THREADS} hint threads")
+        modes = [mode for mode in ('fadvise', 'read') if mode == 'read' or hasattr(os, 'posix_fadvise')]
+        runs = [('off', workers), ('off', workers + readahead.READ_AHEAD_THREADS)] + [(mode, workers) for mode in modes]
+        for latency in latencies:
+            for mode, run_workers in runs:
+                seconds, metrics = plan_once(library, offsets, latency, depth, mode, run_workers)
+                summary = metrics.summary()
+                hints = summary['stages'].get('read_ahead', {})
+                details = ''
+                if hints:
+                    details = (f"  hint p50 {hints['p50'] * 1000:.1f} ms, "
+                               f"{summary['counters'].get('read_ahead_late', 0)} files reached before their hint")
+                print(f"  {latency * 1000:5.1f} ms  read-ahead {mode:<8} {run_workers:3d} workers {seconds:7.2f} s "
+                      f"{files / seconds:8.0f} files/sec{details}")
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark read-ahead on a simulated slow filesystem.")
+    parser.add_argument('--files', type=int, default=2000, help="library size")
+    parser.add_argument('--latencies', type=float, nargs='+', default=[0.0, 0.005, 0.02],
+                        help="seconds the first read of a file takes")
+    parser.add_argument('--depth', type=int, default=32, help="reads the simulated device serves at once")
+    parser.add_argument('--workers', type=int, help="extraction workers (default: the pipeline's)")
+    args = parser.parse_args()
+    run_benchmark(args.files, args.latencies, args.depth, args.workers)
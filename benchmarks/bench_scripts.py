@@ -0,0 +1,170 @@
+# End-to-end benchmark of the three scripts on synthetic libraries.
+#
+# For every library size a synthetic library is generated with
+# synthetic_library.py and each script's command line is run on it, against
+# fake_exiftool.py so no real exiftool is needed and runs are
+# reproducible. Every script runs in its own Python process with a fresh
+# metadata catalog, which reports:
+#
+#   files/sec    library size divided by wall time
+#   peak RSS     maximum resident set size of that process (not of exiftool)
+#   writes       INSERT/UPDATE/DELETE statements and commits, per database
+#
+# adjust_capture_times runs last because it shifts the dates in the library.
+#
+# Usage: python bench_scripts.py [--sizes 1000 10000 100000] [--latency SECONDS] [--keep DIR]
+
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+FAKE_EXIFTOOL = os.path.join(BENCH_DIR, 'fake_exiftool.py')
+
+sys.path.insert(0, BENCH_DIR)
+from synthetic_library import DEFAULT_SERIALS, generate_library, write_offsets
+
+SCRIPTS = {
+    'count_silent_shutter': os.path.join(ROOT, 'count_silent_shutter', 'count_silent_shutter.py'),
+    'calculate_photo_time': os.path.join(ROOT, 'calculate_photo_time', 'calculate_photo_time.py'),
+    'adjust_capture_times': os.path.join(ROOT, 'adjust_capture_times', 'adjust_capture_times.py'),
+}
+
+
+def script_arguments(script, library, work_dir, offsets_path):
+    """Return the command line arguments for one script."""
+    return {
+        'count_silent_shutter': [library, DEFAULT_SERIALS[0]],
+        'calculate_photo_time': [library, '--break-minutes', '10', '--no-group'],
+        'adjust_capture_times': ['run', library, offsets_path, '--logs-dir', os.path.join(work_dir, '_logs')],
+    }[script]
+
+
+class WriteCounter:
+    """Counts write statements and commits on every SQLite connection opened after install()."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def install(self):
+        connect = sqlite3.connect
+        counter = self
+
+        def counting_connect(database, *args, **kwargs):
+            conn = connect(database, *args, **kwargs)
+            name = os.path.basename(str(database))
+            conn.set_trace_callback(lambda statement: counter.trace(name, statement))
+            return conn
+
+        sqlite3.connect = counting_connect
+
+    def trace(self, database, statement):
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        if keyword in ('INSERT', 'UPDATE', 'DELETE', 'REPLACE'):
+            kind = 'writes'
+        elif keyword in ('COMMIT', 'END'):
+            kind = 'commits'
+        else:
+            return
+        with self._lock:
+            self.counts[(database, kind)] += 1
+
+
+def run_script(script, library, work_dir, offsets_path):
+    """Child process: run one script's main() and print its measurements as JSON."""
+    os.chdir(work_dir)
+    sys.path.insert(0, os.path.dirname(SCRIPTS[script]))
+    counter = WriteCounter()
+    counter.install()
+    sys.argv = [SCRIPTS[script]] + script_arguments(script, library, work_dir, offsets_path)
+
+    # The scripts print progress; keep stdout for the result line
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    start = time.perf_counter()
+    try:
+        runpy.run_path(SCRIPTS[script], run_name='__main__')
+    finally:
+        elapsed = time.perf_counter() - start
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    peak_rss_kb = None
+    if resource is not None:
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak_rss_kb //= 1024  # Reported in bytes on macOS
+    writes = {}
+    for (database, kind), count in sorted(counter.counts.items()):
+        writes.setdefault(database, {})[kind] = count
+    print(json.dumps({'seconds': elapsed, 'peak_rss_kb': peak_rss_kb, 'writes': writes}))
+
+
+def measure(script, library, work_dir, offsets_path, env):
+    """Run one script in a fresh process and return its measurements."""
+    os.makedirs(work_dir, exist_ok=True)
+    env = dict(env, PHOTO_CATALOG_DB=os.path.join(work_dir, 'catalog.db'))
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', script,
+                             library, work_dir, offsets_path],
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+def format_writes(writes):
+    return ', '.join(f"{database}: {counts.get('writes', 0)} writes/{counts.get('commits', 0)} commits"
+                     for database, counts in writes.items())
+
+
+def run_benchmarks(sizes, latency, keep_dir=None):
+    base_dir = keep_dir or tempfile.mkdtemp(prefix='photo-bench-')
+    env = dict(os.environ, EXIFTOOL=FAKE_EXIFTOOL, FAKE_EXIFTOOL_LATENCY=str(latency))
+    try:
+        for size in sizes:
+            library = os.path.join(base_dir, f'library_{size}')
+            start = time.perf_counter()
+            generate_library(library, size)
+            print(f"\n{size} files (generated in {time.perf_counter() - start:.1f} s)")
+            offsets_path = os.path.join(base_dir, f'offsets_{size}.csv')
+            write_offsets(offsets_path, {serial: 3600 * (index + 1) for index, serial in enumerate(DEFAULT_SERIALS)})
+
+            for script in SCRIPTS:
+                work_dir = os.path.join(base_dir, f'work_{size}_{script}')
+                result = measure(script, library, work_dir, offsets_path, env)
+                rss = f"{result['peak_rss_kb'] / 1024:7.1f} MB" if result['peak_rss_kb'] else '      n/a'
+                print(f"  {script:<22} {result['seconds']:8.2f} s {size / result['seconds']:9.0f} files/sec"
+                      f"  peak RSS {rss}  {format_writes(result['writes'])}")
+    finally:
+        if keep_dir is None:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--child']:
+        run_script(*sys.argv[2:6])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description="Benchmark the scripts on synthetic photo libraries.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="library sizes to benchmark")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds the fake exiftool spends per file")
+    parser.add_argument('--keep', metavar='DIR',
+                        help="generate into DIR and keep the libraries and databases")
+    args = parser.parse_args()
+    run_benchmarks(args.sizes, args.latency, args.keep)
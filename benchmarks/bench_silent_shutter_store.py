@@ -0,0 +1,77 @@
+# Measure ingest throughput of the count_silent_shutter SQLite store.
+#
+# "dynamic" replays the old layout: one column per tag, PRAGMA table_info and
+# possibly ALTER TABLE before every row, and a commit after every row.
+# "fixed" uses the current fixed schema with WAL and batched transactions.
+#
+# Usage: python bench_silent_shutter_store.py [rows] [batch_size]
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def synthetic_exif(index):
+    """Return an exiftool-like dict with about 40 tags."""
+    exif_data = {
+        'SourceFile': f'/photos/shoot/DSC_{index:06d}.NEF',
+        'SerialNumber': 3000000 + index % 3,
+        'SilentPhotography': 'On' if index % 4 else 'Off',
+        'DateTimeOriginal': f'2024:07:20 {index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index % 60:02d}',
+    }
+    for tag in range(36):
+        exif_data[f'Tag{tag}'] = f'value {tag} for {index}'
+    return exif_data
+
+
+def ingest_dynamic(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    first = rows[0]
+    columns = ["file_path TEXT UNIQUE"] + [f'"{key}" TEXT' for key in first]
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS exif_data ({", ".join(columns)})')
+    conn.commit()
+    for exif_data in rows:
+        existing_columns = [col[1] for col in cursor.execute("PRAGMA table_info(exif_data)").fetchall()]
+        for key in exif_data:
+            if key not in existing_columns:
+                cursor.execute(f'ALTER TABLE exif_data ADD COLUMN "{key}" TEXT')
+                conn.commit()
+        columns = ["file_path"] + [f'"{key}"' for key in exif_data]
+        values = [exif_data['SourceFile']] + [str(value) for value in exif_data.values()]
+        placeholders = ", ".join("?" for _ in values)
+        cursor.execute(f'INSERT OR IGNORE INTO exif_data ({", ".join(columns)}) VALUES ({placeholders})', values)
+        conn.commit()
+    conn.close()
+
+
+def ingest_fixed(db_path, rows, batch_size):
+    sys.path.insert(0, os.path.join(ROOT, 'count_silent_shutter'))
+    import count_silent_shutter as store
+
+    with store.ExifDatabase(db_path, batch_size) as db:
+        for exif_data in rows:
+            db.insert_exif_data(exif_data['SourceFile'], exif_data)
+
+
+def measure(label, func, *args):
+    rows = args[1]
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed:8.2f} s  {len(rows) / elapsed:10.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rows = [synthetic_exif(index) for index in range(row_count)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print(f"Ingesting {row_count} synthetic rows")
+        measure("dynamic", ingest_dynamic, os.path.join(temp_dir, 'dynamic.db'), rows)
+        measure("fixed", ingest_fixed, os.path.join(temp_dir, 'fixed.db'), rows, batch_size)
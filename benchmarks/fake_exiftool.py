@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# A stand-in for exiftool, for benchmarks and test runs without the real one.
+#
+# Point the scripts at it with EXIFTOOL=/path/to/benchmarks/fake_exiftool.py.
+# It speaks the parts of exiftool's interface the scripts use:
+#
+#   -stay_open True -@ -     with -executeN and -echo4 ready markers
+#   -@ -                     arguments from stdin in one-shot mode
+#   -j, -s3, -r, -ext EXT    JSON or bare-value output, recursive folders
+#   -TAG                     restrict the output to these tags
+#   -TAG=VALUE, -AllDates+=  write dates (and shift them) in place
+#   -overwrite_original      accepted and ignored
+#
+# Tags are read from the standard EXIF IFDs with photo_common.exif_reader;
+# SilentPhotography comes from a "SilentPhotography=On" ImageDescription in
+# IFD0 as written by synthetic_library.py, decoded here since the reader has
+# no use for it. Only date tags can be written, by patching
+# the existing value in place.
+#
+# FAKE_EXIFTOOL_LATENCY adds that many seconds per file and
+# FAKE_EXIFTOOL_STARTUP that many seconds per process start, to imitate the
+# real exiftool or a slow network share.
+
+import os
+import sys
+import json
+import time
+import struct
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from photo_common import exif_reader
+
+LATENCY = float(os.environ.get('FAKE_EXIFTOOL_LATENCY', 0))
+STARTUP = float(os.environ.get('FAKE_EXIFTOOL_STARTUP', 0))
+
+READ_TAGS = ('Make', 'Model', 'ModifyDate', 'DateTimeOriginal', 'CreateDate', 'SerialNumber')
+DATE_TAGS = ('DateTimeOriginal', 'CreateDate', 'ModifyDate')
+DATE_FORMAT = '%Y:%m:%d %H:%M:%S'
+IMAGE_DESCRIPTION = 0x010E
+
+
+def read_description(path):
+    """Return the ImageDescription from IFD0, or '' if there is none."""
+    try:
+        with open(path, 'rb') as f:
+            buf = f.read(exif_reader.HEADER_BYTES)
+        base = exif_reader.find_tiff_header(buf)
+        if base is None:
+            return ''
+        endian = '<' if buf[base:base + 2] == b'II' else '>'
+        (ifd0_offset,) = struct.unpack(endian + 'I', buf[base + 4:base + 8])
+        for tag, field_type, count, value_position in exif_reader.iter_ifd_entries(buf, base, endian, ifd0_offset):
+            if tag == IMAGE_DESCRIPTION and field_type == exif_reader.ASCII:
+                return exif_reader.decode_value(buf, endian, field_type, count, value_position)
+    except (OSError, struct.error, exif_reader.ExifFormatError):
+        pass
+    return ''
+
+
+def read_file(path):
+    """Return exiftool-style {tag: value} for one file, or None if it can't be read."""
+    tags = exif_reader.read_tags(path, READ_TAGS)
+    if tags is None:
+        return None
+    description = read_description(path)
+    if description.startswith('SilentPhotography='):
+        tags['SilentPhotography'] = description.split('=', 1)[1]
+    # Like exiftool -j, numbers come out as JSON numbers
+    return {tag: int(value) if isinstance(value, str) and value.isdigit() else value
+            for tag, value in tags.items()}
+
+
+def parse_shift(value):
+    """Parse an exiftool date shift such as '0:0:1 2:00:05' or '1:30:00' into seconds."""
+    date_part, _, time_part = value.strip().rpartition(' ')
+    hours, minutes, seconds = (int(part) for part in (time_part.split(':') + ['0', '0'])[:3])
+    days = int(date_part.split(':')[-1]) if date_part else 0
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def write_file(path, assignments):
+    """Apply [(tag, operator, value)] date writes in place; return an error message or None."""
+    names = set()
+    for tag, _, _ in assignments:
+        names.update(DATE_TAGS if tag == 'AllDates' else (tag,))
+    try:
+        with open(path, 'r+b') as f:
+            buf = f.read(exif_reader.HEADER_BYTES)
+            found, endian = exif_reader.locate_tags(buf, names)
+            for tag, operator, value in assignments:
+                for name in (DATE_TAGS if tag == 'AllDates' else (tag,)):
+                    if name not in found:
+                        continue
+                    field_type, count, position = found[name]
+                    if operator == '=':
+                        new_value = value
+                    else:
+                        current = exif_reader.decode_value(buf, endian, field_type, count, position)
+                        shift = parse_shift(value) * (1 if operator == '+=' else -1)
+                        new_value = (datetime.datetime.strptime(current, DATE_FORMAT)
+                                     + datetime.timedelta(seconds=shift)).strftime(DATE_FORMAT)
+                    raw = new_value.encode('ascii')[:count - 1].ljust(count - 1, b'\x00') + b'\x00'
+                    f.seek(position)
+                    f.write(raw)
+                    buf = buf[:position] + raw + buf[position + len(raw):]
+    except (OSError, ValueError, exif_reader.ExifFormatError) as e:
+        return f"Error: {e} - {path}"
+    return None
+
+
+def expand_paths(targets, recursive, extensions):
+    for target in targets:
+        if not os.path.isdir(target):
+            yield target
+            continue
+        for root, dirs, files in os.walk(target):
+            dirs.sort()
+            for name in sorted(files):
+                if not extensions or name.rsplit('.', 1)[-1].lower() in extensions:
+                    yield os.path.join(root, name)
+            if not recursive:
+                break
+
+
+def run(args, stdin=None):
+    """Run one exiftool command; return (stdout, stderr) text."""
+    if '-@' in args and args[args.index('-@') + 1] == '-' and stdin is not None:
+        index = args.index('-@')
+        args = args[:index] + [line.rstrip('\n') for line in stdin if line.strip()] + args[index + 2:]
+
+    json_output = bare_values = recursive = False
+    extensions = set()
+    requested = []
+    assignments = []
+    targets = []
+    arguments = iter(args)
+    for arg in arguments:
+        if arg == '-j':
+            json_output = True
+        elif arg == '-s3':
+            bare_values = True
+        elif arg == '-r':
+            recursive = True
+        elif arg == '-ext':
+            extensions.add(next(arguments).lstrip('.').lower())
+        elif arg in ('-overwrite_original', '-q', '-fast', '-n'):
+            continue
+        elif arg.startswith('-') and '=' in arg:
+            tag, _, value = arg[1:].partition('=')
+            operator = '='
+            if tag and tag[-1] in '+-':
+                operator = tag[-1] + '='
+                tag = tag[:-1]
+            assignments.append((tag, operator, value))
+        elif arg.startswith('-'):
+            requested.append(arg[1:])
+        else:
+            targets.append(arg)
+
+    out = []
+    err = []
+    paths = list(expand_paths(targets, recursive, extensions))
+    if assignments:
+        updated = 0
+        for path in paths:
+            time.sleep(LATENCY)
+            error = write_file(path, assignments)
+            if error:
+                err.append(error)
+            else:
+                updated += 1
+        out.append(f"    {updated} image files updated")
+        if len(paths) > updated:
+            out.append(f"    {len(paths) - updated} files weren't updated due to errors")
+        return '\n'.join(out) + '\n', '\n'.join(err) + ('\n' if err else '')
+
+    results = []
+    for path in paths:
+        time.sleep(LATENCY)
+        tags = read_file(path)
+        if tags is None:
+            err.append(f"Error: File format error - {path}")
+            continue
+        if requested:
+            tags = {tag: tags[tag] for tag in requested if tag in tags}
+        results.append((path, tags))
+
+    if json_output:
+        if results:
+            out.append(json.dumps([dict(SourceFile=path, **tags) for path, tags in results], indent=1))
+    elif bare_values:
+        out.extend(str(value) for _, tags in results for value in tags.values())
+    else:
+        for path, tags in results:
+            if len(results) > 1:
+                out.append(f"======== {path}")
+            out.extend(f"{tag:<32}: {value}" for tag, value in tags.items())
+    return '\n'.join(out) + ('\n' if out else ''), '\n'.join(err) + ('\n' if err else '')
+
+
+def stay_open(stdin):
+    """Serve commands from stdin until -stay_open False, like exiftool -stay_open True -@ -."""
+    args = []
+    for line in stdin:
+        line = line.rstrip('\n')
+        if line.startswith('-execute'):
+            number = line[len('-execute'):]
+            echo = None
+            if '-echo4' in args:
+                index = args.index('-echo4')
+                echo = args[index + 1]
+                del args[index:index + 2]
+            stdout, stderr = run(args)
+            sys.stdout.write(stdout + f'{{ready{number}}}\n')
+            sys.stdout.flush()
+            sys.stderr.write(stderr + (echo + '\n' if echo else ''))
+            sys.stderr.flush()
+            args = []
+        elif args[-1:] == ['-stay_open'] and line == 'False':
+            return
+        elif line:
+            args.append(line)
+
+
+def main(argv):
+    time.sleep(STARTUP)
+    if argv[:2] == ['-stay_open', 'True']:
+        stay_open(sys.stdin)
+        return 0
+    stdout, stderr = run(argv, sys.stdin)
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return 1 if stderr and not stdout else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
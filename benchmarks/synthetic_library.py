@@ -0,0 +1,151 @@
+# Generate a synthetic photo library for the benchmarks.
+#
+# Every file is a small but well-formed JPEG or TIFF container (the .nef files
+# are TIFFs, like real NEFs) carrying Make, Model, DateTimeOriginal,
+# CreateDate, ModifyDate and the body serial number in the standard EXIF IFDs,
+# so photo_common.exif_reader and exiftool can both read them. The Nikon
+# SilentPhotography maker-note tag is stored as "SilentPhotography=On" in
+# ImageDescription, where fake_exiftool.py picks it up. The files are written
+# directly instead of with Pillow, so generating 100k files takes seconds and
+# needs nothing beyond the standard library.
+#
+# Photos are spread over shoot folders, one shoot per day. Within a shoot they
+# come in bursts a few seconds apart with longer pauses and the occasional
+# break, so calculate_photo_time has realistic gaps to work with. The same
+# seed always gives the same library.
+#
+# Usage: python synthetic_library.py DEST [count] [seed]
+
+import os
+import sys
+import random
+import struct
+import datetime
+
+DEFAULT_SERIALS = ('3012345', '3023456', '6034567')
+FORMATS = ('jpg', 'nef', 'tiff')
+PHOTOS_PER_SHOOT = 500
+FIRST_DAY = datetime.datetime(2024, 1, 6, 8, 0, 0)
+
+# TIFF tags written to IFD0 and the Exif IFD
+IMAGE_DESCRIPTION = 0x010E
+MAKE = 0x010F
+MODEL = 0x0110
+MODIFY_DATE = 0x0132
+EXIF_IFD_POINTER = 0x8769
+DATE_TIME_ORIGINAL = 0x9003
+CREATE_DATE = 0x9004
+BODY_SERIAL_NUMBER = 0xA431
+
+
+def build_tiff(ifd0_tags, exif_tags, endian='<'):
+    """Return a TIFF structure with ASCII tags in IFD0 and an Exif IFD.
+
+    ifd0_tags and exif_tags map tag ids to strings.
+    """
+    ifd0_tags = sorted(ifd0_tags.items()) + [(EXIF_IFD_POINTER, None)]
+    exif_tags = sorted(exif_tags.items())
+    ifd0_offset = 8
+    exif_offset = ifd0_offset + 2 + 12 * len(ifd0_tags) + 4
+    data_offset = exif_offset + 2 + 12 * len(exif_tags) + 4
+    data = bytearray()
+
+    def entries(tags):
+        packed = struct.pack(endian + 'H', len(tags))
+        for tag, value in tags:
+            if value is None:
+                packed += struct.pack(endian + 'HHII', tag, 4, 1, exif_offset)
+                continue
+            raw = value.encode('ascii') + b'\x00'
+            if len(raw) <= 4:
+                packed += struct.pack(endian + 'HHI', tag, 2, len(raw)) + raw.ljust(4, b'\x00')
+            else:
+                packed += struct.pack(endian + 'HHII', tag, 2, len(raw), data_offset + len(data))
+                data.extend(raw)
+                if len(data) % 2:
+                    data.append(0)  # Values start on word boundaries
+        return packed + struct.pack(endian + 'I', 0)
+
+    ifd0 = entries(ifd0_tags)
+    exif = entries(exif_tags)
+    header = (b'II*\x00' if endian == '<' else b'MM\x00*') + struct.pack(endian + 'I', ifd0_offset)
+    return header + ifd0 + exif + bytes(data)
+
+
+def build_jpeg(tiff):
+    """Wrap a TIFF structure in a minimal JPEG with an APP1 Exif segment."""
+    app1 = b'Exif\x00\x00' + tiff
+    return (b'\xff\xd8'
+            + b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+            + b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1
+            + b'\xff\xd9')
+
+
+def photo_bytes(file_format, serial, date_taken, silent, endian='<'):
+    """Return the contents of one synthetic photo."""
+    date_str = date_taken.strftime('%Y:%m:%d %H:%M:%S')
+    ifd0_tags = {
+        MAKE: 'NIKON CORPORATION',
+        MODEL: 'NIKON Z 8',
+        MODIFY_DATE: date_str,
+        IMAGE_DESCRIPTION: f"SilentPhotography={'On' if silent else 'Off'}",
+    }
+    exif_tags = {DATE_TIME_ORIGINAL: date_str, CREATE_DATE: date_str, BODY_SERIAL_NUMBER: serial}
+    tiff = build_tiff(ifd0_tags, exif_tags, endian)
+    return build_jpeg(tiff) if file_format == 'jpg' else tiff
+
+
+def next_gap(rng):
+    """Seconds until the next photo: mostly bursts, sometimes pauses and breaks."""
+    roll = rng.random()
+    if roll < 0.70:
+        return rng.randint(0, 3)
+    if roll < 0.97:
+        return rng.randint(10, 300)
+    return rng.randint(900, 5400)
+
+
+def generate_library(dest, count, seed=0, serials=DEFAULT_SERIALS, formats=FORMATS,
+                     silent_ratio=0.5, photos_per_shoot=PHOTOS_PER_SHOOT, pad_to=0):
+    """Write count synthetic photos below dest and return {serial: photos}.
+
+    pad_to pads every file with zero bytes up to that size, for benchmarks
+    where file size matters.
+    """
+    rng = random.Random(seed)
+    photos_by_serial = {serial: 0 for serial in serials}
+    for index in range(count):
+        shoot, number = divmod(index, photos_per_shoot)
+        if number == 0:
+            shoot_dir = os.path.join(dest, f'shoot_{shoot:04d}')
+            os.makedirs(shoot_dir, exist_ok=True)
+            date_taken = FIRST_DAY + datetime.timedelta(days=shoot)
+        else:
+            date_taken += datetime.timedelta(seconds=next_gap(rng))
+
+        serial = serials[shoot % len(serials)] if rng.random() < 0.8 else rng.choice(serials)
+        file_format = formats[index % len(formats)]
+        contents = photo_bytes(file_format, serial, date_taken, rng.random() < silent_ratio,
+                               endian='<' if file_format != 'tiff' else '>')
+        if len(contents) < pad_to:
+            contents += bytes(pad_to - len(contents))
+        with open(os.path.join(shoot_dir, f'DSC_{index:06d}.{file_format}'), 'wb') as f:
+            f.write(contents)
+        photos_by_serial[serial] += 1
+    return photos_by_serial
+
+
+def write_offsets(path, offsets):
+    """Write an adjust_capture_times offsets file with one 'serial,seconds' line per camera."""
+    with open(path, 'w') as f:
+        for serial, seconds in offsets.items():
+            f.write(f'{serial},{seconds}\n')
+
+
+if __name__ == "__main__":
+    dest = sys.argv[1]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    photos_by_serial = generate_library(dest, count, seed)
+    print(f"Wrote {count} photos to {dest}: "
+          + ", ".join(f"{serial}: {photos}" for serial, photos in photos_by_serial.items()))
@@ -9,96 +9,330 @@
 # though by writing the extracted metadata to a database, 
 # every subsequent run is much faster.
 
+# Run it on an archive root to get reports per day, shoot folder
+# (the top-level folder) or camera body for the whole archive.
+
+# The report is written in one pass over the timestamps in time order, so
+# memory use stays flat even for archives with millions of photos.
+
 
 import os
-import subprocess
+import sys
+import time
+import argparse
 import datetime
 import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from photo_common import catalog
+from photo_common.break_analysis import DEFAULT_SWEEP_MINUTES, EPOCH, StreamingBreakAnalysis, from_epoch_seconds
+from photo_common.bulk_extract import batched, iter_exif
+from photo_common.group_stats import (GROUPINGS, add_photo, group_report, initialize_group_tables,
+                                      rebuild_group_stats, remove_photo)
+from photo_common.metrics import Progress, ProgressLine, RunMetrics
+from photo_common.pipeline import run_pipeline
+from photo_common.readahead import read_ahead
+from photo_common.walker import walk_files
+from photo_common.watcher import FolderWatcher
+
+INSERT_BATCH_SIZE = 500
+
+IMAGE_EXTENSIONS = ('nef', 'jpg', 'jpeg', 'png')
 
-def get_exif_date_taken(file_path):
-    """Extract the date taken from an image's EXIF data using exiftool."""
-    result = subprocess.run(['exiftool', '-DateTimeOriginal', '-s3', file_path], stdout=subprocess.PIPE, text=True)
-    date_taken_str = result.stdout.strip()
-    if date_taken_str:
-        return datetime.datetime.strptime(date_taken_str, '%Y:%m:%d %H:%M:%S')
-    return None
-
-def initialize_database(db_path):
-    """Create a SQLite database to store image timestamps if it doesn't exist."""
-    conn = sqlite3.connect(db_path)
+EXTRACT_TAGS = ['DateTimeOriginal', 'SerialNumber']
+
+# Files handed to one exiftool call by each extraction worker
+EXTRACT_BATCH_SIZE = 100
+
+# Timestamps fetched from the database at a time while streaming the report
+STREAM_CHUNK_SIZE = 10000
+
+def parse_exif_date(date_taken_str):
+    """Parse an EXIF date string, returning None if it is missing or malformed."""
+    if not date_taken_str:
+        return None
+    try:
+        return datetime.datetime.strptime(str(date_taken_str).strip(), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+DB_FILENAME = '_image_timestamps.db'
+
+def initialize_database(conn):
+    """Create the image timestamp tables if they don't exist and migrate older databases."""
     cursor = conn.cursor()
     cursor.execute('''CREATE TABLE IF NOT EXISTS image_timestamps (
                         filename TEXT PRIMARY KEY,
-                        timestamp TEXT
+                        timestamp TEXT,
+                        epoch INTEGER,
+                        day TEXT,
+                        shoot TEXT,
+                        serial TEXT,
+                        size INTEGER,
+                        mtime_ns INTEGER,
+                        inode INTEGER
                       )''')
-    conn.commit()
-    conn.close()
 
-def populate_database(folder_path, db_path):
-    """Populate the database with image timestamps if not already present."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    files = []
-    for root, _, filenames in os.walk(folder_path):
-        if "_ignore" in root:
-            print(f"Ignoring images in folder: {root}")
-            continue  # Skip this directory
-        for f in filenames:
-            if f.lower().endswith(('nef', 'jpg', 'jpeg', 'png')):
-                files.append(os.path.join(root, f))
-    
-    total_files = len(files)
-    
-    for i, file_path in enumerate(files):
-        filename = os.path.relpath(file_path, folder_path)  # Store relative path to avoid conflicts
-        cursor.execute("SELECT timestamp FROM image_timestamps WHERE filename = ?", (filename,))
-        result = cursor.fetchone()
-        if result is None:
-            print(f"Processing image {i + 1} of {total_files}")
-            date_taken = get_exif_date_taken(file_path)
-            if date_taken:
-                cursor.execute("INSERT INTO image_timestamps (filename, timestamp) VALUES (?, ?)",
-                               (filename, date_taken.strftime('%Y-%m-%d %H:%M:%S')))
+    # Databases created by older versions only have filename and timestamp
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(image_timestamps)")}
+    for column in ('epoch', 'size', 'mtime_ns', 'inode'):
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE image_timestamps ADD COLUMN {column} INTEGER")
+    # Rows from before the group columns have serial NULL until populate_database fills them in
+    for column in ('day', 'shoot', 'serial'):
+        if column not in existing_columns:
+            cursor.execute(f"ALTER TABLE image_timestamps ADD COLUMN {column} TEXT")
+    if 'epoch' not in existing_columns:
+        # Timestamps are naive local times; like break_analysis.EPOCH, treat them as UTC
+        cursor.execute("UPDATE image_timestamps SET epoch = CAST(strftime('%s', timestamp) AS INTEGER) WHERE timestamp IS NOT NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS image_timestamps_epoch ON image_timestamps (epoch)")
+    initialize_group_tables(cursor)
     conn.commit()
-    conn.close()
 
-def load_timestamps_from_database(db_path):
-    """Load image timestamps from the database."""
-    conn = sqlite3.connect(db_path)
+@contextmanager
+def open_database(db_path):
+    """Open and initialize a timestamp database, and close it again on exit.
+
+    The connection can be shared by several populate and report calls; the
+    populate pipeline writes to it from its writer thread.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        initialize_database(conn)
+        yield conn
+    finally:
+        conn.close()
+
+def scan_files(folder_path, metrics=None):
+    """Return {relative path: stat} for every image below folder_path, with the stats taken by the walker."""
+    walk = walk_files(folder_path, IMAGE_EXTENSIONS, metrics=metrics,
+                      on_ignore=lambda path: print(f"Ignoring images in folder: {path}"))
+    return {os.path.relpath(file_path, folder_path): st for file_path, st in walk}
+
+def file_signature(st):
+    """Return the (size, mtime_ns, inode) stored with a row to tell whether the image changed."""
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+def delete_row(cursor, filename):
+    """Delete an image's row, if any, and remove it from the group aggregates; returns its epoch."""
+    old = cursor.execute("SELECT epoch, day, shoot, serial FROM image_timestamps WHERE filename = ?", (filename,)).fetchone()
+    if old is None:
+        return None
+    cursor.execute("DELETE FROM image_timestamps WHERE filename = ?", (filename,))
+    remove_photo(cursor, old[0], dict(zip(('day', 'shoot', 'serial'), old[1:])))
+    return old[0]
+
+def insert_row(cursor, row):
+    """Insert a row from extract_rows and count it in the group aggregates."""
+    add_photo(cursor, row[2], dict(zip(('day', 'shoot', 'serial'), row[3:6])))
+    cursor.execute("INSERT INTO image_timestamps (filename, timestamp, epoch, day, shoot, serial, size, mtime_ns, inode) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+def group_columns(filename, timestamp, serial):
+    """Return the (day, shoot, serial) group keys of an image; serial is '' when the image has none."""
+    day = timestamp[:10] if timestamp else None
+    shoot = filename.split(os.sep, 1)[0] if os.sep in filename else ''
+    return day, shoot, str(serial if serial is not None else '').strip()
+
+def extract_rows(folder_path, filenames, stats):
+    """Return image_timestamps rows for images given by path relative to folder_path.
+
+    stats maps each filename to its stat. Images without
+    a timestamp get a row too, so they aren't extracted again.
+    """
+    rows = []
+    paths = [os.path.join(folder_path, filename) for filename in filenames]
+    # Images the shared catalog already knows skip exiftool
+    extracted = catalog.read_through(paths, EXTRACT_TAGS,
+                                     lambda misses: iter_exif(misses, EXTRACT_TAGS, batch_size=len(misses)))
+    for exif in extracted:
+        filename = os.path.relpath(exif['SourceFile'], folder_path)  # Store relative path to avoid conflicts
+        if filename not in stats:
+            continue
+        date_taken = parse_exif_date(exif.get('DateTimeOriginal'))
+        timestamp = date_taken.strftime('%Y-%m-%d %H:%M:%S') if date_taken else None
+        epoch = (date_taken - EPOCH) // datetime.timedelta(seconds=1) if date_taken else None
+        rows.append((filename, timestamp, epoch) + group_columns(filename, timestamp, exif.get('SerialNumber'))
+                    + file_signature(stats[filename]))
+    return rows
+
+def backfill_group_columns(folder_path, cursor, timestamps):
+    """Fill in day, shoot and serial of rows stored before the group columns, without running exiftool.
+
+    timestamps maps each filename to its stored timestamp. The serial comes
+    from the shared catalog if it knows the image, else it is left ''. The
+    group aggregates are not updated; rebuild them afterwards.
+    """
+    paths = [os.path.join(folder_path, filename) for filename in timestamps]
+    serials = {os.path.relpath(metadata['SourceFile'], folder_path): metadata.get('SerialNumber')
+               for metadata in catalog.read_through(paths, ['SerialNumber'], lambda misses: [])}
+    cursor.executemany("UPDATE image_timestamps SET day = ?, shoot = ?, serial = ? WHERE filename = ?",
+                       [group_columns(filename, timestamp, serials.get(filename)) + (filename,)
+                        for filename, timestamp in timestamps.items()])
+
+def populate_database(folder_path, conn, metrics=None, workers=None):
+    """Bring the database in line with the folder: extract new or changed images and prune deleted ones.
+
+    An empty table is filled without touching the group aggregates, which
+    are rebuilt in bulk at the end; so is a table with rows from before the
+    group columns, whose group keys are filled in first.
+    """
+    metrics = metrics or RunMetrics('calculate_photo_time')
     cursor = conn.cursor()
-    cursor.execute("SELECT timestamp FROM image_timestamps")
-    rows = cursor.fetchall()
-    timestamps = [datetime.datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S') for row in rows]
-    conn.close()
-    return timestamps
-
-def calculate_photographing_time(timestamps, break_duration_minutes=10):
-    """Calculate the total photographing time excluding breaks and list all breaks."""
-    if not timestamps:
-        return "No valid images with EXIF timestamps found.", [], []
-    
-    # Sort the timestamps
-    timestamps.sort()
-    
-    total_duration = timestamps[-1] - timestamps[0]
-    total_photographing_time = datetime.timedelta()
-    previous_time = timestamps[0]
-    breaks = []
-
-    for current_time in timestamps[1:]:
-        duration = current_time - previous_time
-        if duration.total_seconds() > break_duration_minutes * 60:
-            breaks.append((previous_time, current_time))
-            previous_time = current_time
-        else:
-            total_photographing_time += duration
-            previous_time = current_time
-    
-    return total_duration, total_photographing_time, breaks
 
-def save_results_to_file(folder_path, num_photos, total_duration, break_duration, photographing_time, breaks, start_time, end_time):
-    """Save the results to a text file."""
+    current_files = scan_files(folder_path, metrics)
+
+    # One in-memory snapshot of the table to diff the folder against
+    cursor.execute("SELECT filename, size, mtime_ns, inode, serial, timestamp FROM image_timestamps")
+    snapshot = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    deleted = [filename for filename in snapshot if filename not in current_files]
+    changed = [filename for filename, st in current_files.items()
+               if filename not in snapshot or snapshot[filename][:3] != file_signature(st)]
+    # Unchanged rows without a serial predate the group columns
+    legacy = {filename: snapshot[filename][4] for filename, st in current_files.items()
+              if filename in snapshot and snapshot[filename][3] is None and snapshot[filename][:3] == file_signature(st)}
+
+    if deleted:
+        print(f"Removing {len(deleted)} images that no longer exist")
+        with metrics.time('db_write', len(deleted)):
+            for filename in deleted:
+                delete_row(cursor, filename)
+            conn.commit()
+    bulk = not snapshot or bool(legacy)
+    if bulk:
+        # Emptied aggregates tell initialize_group_tables to rebuild them if this run is interrupted
+        with metrics.time('db_write', len(legacy)):
+            cursor.execute("DELETE FROM group_totals")
+            cursor.execute("DELETE FROM group_gaps")
+            if legacy:
+                print(f"Filling in the day, folder and camera of {len(legacy)} images")
+                backfill_group_columns(folder_path, cursor, legacy)
+            conn.commit()
+    metrics.count('files_examined', len(current_files))
+    metrics.count('files_deleted', len(deleted))
+    metrics.count('files_extracted', len(changed))
+
+    total_files = len(current_files)
+    print(f"Extracting timestamps for {len(changed)} of {total_files} images")
+
+    # Several exiftool calls read DateTimeOriginal for batches of images in
+    # parallel; one writer thread inserts the rows in walk order.
+    def extract_batch(filenames):
+        return extract_rows(folder_path, filenames, current_files)
+
+    processed = 0
+    progress = Progress(len(changed))
+    console = ProgressLine()
+    def write_rows(results):
+        nonlocal processed
+        start = time.perf_counter()
+        for batch in results:
+            if bulk:
+                cursor.executemany("INSERT OR REPLACE INTO image_timestamps (filename, timestamp, epoch, day, shoot, "
+                                   "serial, size, mtime_ns, inode) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                continue
+            for row in batch:
+                # Row by row, so each photo's neighbours are up to date for the aggregates
+                delete_row(cursor, row[0])
+                insert_row(cursor, row)
+        conn.commit()
+        metrics.record('db_write', time.perf_counter() - start, sum(len(batch) for batch in results))
+        processed += sum(len(batch) for batch in results)
+        console.update(progress.format(processed))
+
+    # The headers of the next images are read ahead, in inode order, while earlier batches are extracted
+    paths = ((os.path.join(folder_path, filename), current_files[filename]) for filename in sorted(changed))
+    filenames = (os.path.relpath(file_path, folder_path) for file_path, _ in read_ahead(paths, metrics=metrics))
+    run_pipeline(batched(filenames, EXTRACT_BATCH_SIZE), metrics.wrap('extract', extract_batch, len), write_rows,
+                 workers=workers, batch_size=max(1, INSERT_BATCH_SIZE // EXTRACT_BATCH_SIZE))
+    console.finish()
+    if bulk:
+        with metrics.time('db_write'):
+            rebuild_group_stats(cursor)
+            conn.commit()
+
+def iter_epoch_chunks(conn, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield lists of at most chunk_size epoch seconds, in time order, straight from the epoch index."""
+    cursor = conn.execute("SELECT epoch FROM image_timestamps WHERE epoch IS NOT NULL ORDER BY epoch")
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield [row[0] for row in rows]
+
+# LAG() needs SQLite 3.25; older versions stream an ordered cursor instead
+WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25, 0)
+
+def _range_clause(start=None, end=None):
+    """Return the WHERE clause and parameters for an optional epoch range."""
+    clause = "epoch IS NOT NULL"
+    params = []
+    if start is not None:
+        clause += " AND epoch >= ?"
+        params.append(start)
+    if end is not None:
+        clause += " AND epoch <= ?"
+        params.append(end)
+    return clause, params
+
+def iter_gaps(conn, start=None, end=None):
+    """Yield (previous_epoch, epoch) for every pair of consecutive photos, in time order."""
+    where, params = _range_clause(start, end)
+    if WINDOW_FUNCTIONS:
+        yield from conn.execute(f'''SELECT previous, epoch FROM (
+                                       SELECT LAG(epoch) OVER (ORDER BY epoch) AS previous, epoch
+                                       FROM image_timestamps WHERE {where})
+                                   WHERE previous IS NOT NULL''', params)
+    else:
+        previous = None
+        for (epoch,) in conn.execute(f"SELECT epoch FROM image_timestamps WHERE {where} ORDER BY epoch", params):
+            if previous is not None:
+                yield previous, epoch
+            previous = epoch
+
+def summarize_timestamps(conn, break_duration_minutes, start=None, end=None):
+    """Return (num_photos, first_epoch, last_epoch, photographing_seconds) computed inside SQLite."""
+    where, params = _range_clause(start, end)
+    num_photos, first, last = conn.execute(
+        f"SELECT COUNT(*), MIN(epoch), MAX(epoch) FROM image_timestamps WHERE {where}", params).fetchone()
+    limit = break_duration_minutes * 60
+    if WINDOW_FUNCTIONS:
+        (photographing_seconds,) = conn.execute(f'''SELECT COALESCE(SUM(epoch - previous), 0) FROM (
+                                                       SELECT LAG(epoch) OVER (ORDER BY epoch) AS previous, epoch
+                                                       FROM image_timestamps WHERE {where})
+                                                   WHERE epoch - previous <= ?''', params + [limit]).fetchone()
+    else:
+        photographing_seconds = sum(epoch - previous for previous, epoch in iter_gaps(conn, start, end)
+                                    if epoch - previous <= limit)
+    return num_photos, first, last, photographing_seconds
+
+def photographing_delta(cursor, epoch, break_duration_minutes):
+    """Return how much a photo at epoch adds to the photographing seconds.
+
+    Call before inserting its row; after deleting a row the same call gives
+    what the photo contributed. Only the photo's two neighbours are looked
+    up, so live totals stay cheap however large the table is.
+    """
+    limit = break_duration_minutes * 60
+    (previous,) = cursor.execute("SELECT MAX(epoch) FROM image_timestamps WHERE epoch <= ?", (epoch,)).fetchone()
+    (following,) = cursor.execute("SELECT MIN(epoch) FROM image_timestamps WHERE epoch > ?", (epoch,)).fetchone()
+
+    def counted(gap):
+        return gap if gap <= limit else 0
+
+    delta = 0
+    if previous is not None and following is not None:
+        delta -= counted(following - previous)
+    if previous is not None:
+        delta += counted(epoch - previous)
+    if following is not None:
+        delta += counted(following - epoch)
+    return delta
+
+def save_results_to_file(folder_path, num_photos, total_duration, break_duration, photographing_time, breaks, start_time, end_time, threshold_curve=None):
+    """Save the results to a text file, optionally with the photographing time for a range of break durations."""
     main_folder_name = os.path.basename(folder_path.rstrip(os.sep))
     run_timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     result_file_path = os.path.join(folder_path, f"_photographing_time_report_{break_duration}min.txt")
@@ -115,78 +349,205 @@ def save_results_to_file(folder_path, num_photos, total_duration, break_duration
         file.write("\nList of breaks:\n")
         for start, end in breaks:
             file.write(f"Break from {start} to {end}, duration: {end - start}\n")
+        if threshold_curve:
+            file.write("\nPhotographing time by break duration:\n")
+            for threshold, threshold_time, break_count in threshold_curve:
+                file.write(f"{threshold:>4} minutes: {threshold_time} ({break_count} breaks)\n")
     print(f"Results saved to {result_file_path}")
 
-# Get the folder path from the user
-while True:
-    choice = input("Do you want to run the script on the current path or a custom path? (current/custom): ").strip().lower()
-    if choice in ['current', 'custom']:
-        break
-    else:
-        print("Invalid choice. Please enter 'current' or 'custom'.")
+def save_group_report_to_file(folder_path, grouping, break_duration, report):
+    """Save photographing time per day, folder or camera to a text file."""
+    result_file_path = os.path.join(folder_path, f"_photographing_time_by_{grouping}_{break_duration}min.txt")
+    with open(result_file_path, 'w') as file:
+        file.write(f"Folder processed: {folder_path}\n")
+        file.write(f"Photographing time by {grouping}, break duration: {break_duration} minutes\n\n")
+        for group_key, num_photos, first_epoch, last_epoch, photographing_seconds, break_count in report:
+            file.write(f"{group_key or '(none)'}: {num_photos} photos, "
+                       f"{from_epoch_seconds(first_epoch)} to {from_epoch_seconds(last_epoch)}, "
+                       f"photographing {datetime.timedelta(seconds=photographing_seconds)} ({break_count} breaks)\n")
+    print(f"Results saved to {result_file_path}")
+
+def stream_report(folder_path, conn, break_duration_minutes, chunk_size=STREAM_CHUNK_SIZE):
+    """Write the report of save_results_to_file in one pass over the timestamps and in constant memory.
+
+    Returns the photographing time. The breaks go to a temporary file as
+    they are found, because the totals above them in the report are only
+    known at the end.
+    """
+    analysis = StreamingBreakAnalysis(break_duration_minutes, DEFAULT_SWEEP_MINUTES)
+    with tempfile.TemporaryFile('w+') as spool:
+        for epochs in iter_epoch_chunks(conn, chunk_size):
+            for start, end in analysis.feed(epochs):
+                spool.write(f"{start.isoformat()} {end.isoformat()}\n")
+        spool.seek(0)
+        breaks = (tuple(map(datetime.datetime.fromisoformat, line.split())) for line in spool)
+
+        if not analysis.num_photos:
+            photographing_time = []
+            save_results_to_file(folder_path, 0, "No valid images with EXIF timestamps found.", break_duration_minutes,
+                                 photographing_time, breaks, "No valid timestamps", "No valid timestamps", [])
+            return photographing_time
+        photographing_time = datetime.timedelta(seconds=analysis.photographing_seconds)
+        save_results_to_file(folder_path, analysis.num_photos, analysis.total_duration(), break_duration_minutes,
+                             photographing_time, breaks, from_epoch_seconds(analysis.first),
+                             from_epoch_seconds(analysis.last), analysis.sweep())
+    return photographing_time
+
+def analyze_folder(folder_path, break_duration_minutes, groupings=(), conn=None, metrics=None, workers=None):
+    """Sync the folder's database, write the reports and return the photographing time.
+
+    Uses conn if given, else the folder's own _image_timestamps.db. Only new
+    or changed images are extracted, so an unchanged folder costs one
+    directory walk.
+    """
+    if conn is None:
+        with open_database(os.path.join(folder_path, DB_FILENAME)) as conn:
+            return analyze_folder(folder_path, break_duration_minutes, groupings, conn, metrics, workers)
 
-if choice == 'current':
-    folder_path = os.getcwd()
-else:
+    metrics = metrics or RunMetrics('calculate_photo_time')
+    populate_database(folder_path, conn, metrics, workers)
+    return write_reports(folder_path, break_duration_minutes, groupings, conn, metrics)
+
+def write_reports(folder_path, break_duration_minutes, groupings, conn, metrics=None):
+    """Write the overall and per-group reports from the database and return the photographing time."""
+    metrics = metrics or RunMetrics('calculate_photo_time')
+    # The photographing time, breaks and the same for 1-60 minute breaks,
+    # streamed so memory doesn't grow with the archive
+    with metrics.time('report'):
+        photographing_time = stream_report(folder_path, conn, break_duration_minutes)
+
+        # Per-group reports come from the precomputed aggregates
+        for grouping in groupings:
+            save_group_report_to_file(folder_path, grouping, break_duration_minutes,
+                                      group_report(conn.cursor(), grouping, break_duration_minutes))
+    return photographing_time
+
+def watch_folder(folder_path, break_duration_minutes, conn, watcher, stop=None):
+    """Store images as the watcher reports them; yields (num_photos, photographing_time) after each batch.
+
+    The totals are updated from each new photo's neighbours instead of being
+    recomputed, so the cost follows the number of new images, not the
+    archive size. Deleted images are pruned by the next normal run.
+    """
+    cursor = conn.cursor()
+    num_photos, _, _, photographing_seconds = summarize_timestamps(conn, break_duration_minutes)
+    for ready in watcher.batches(stop):
+        stats = {os.path.relpath(file_path, folder_path): st for file_path, st in ready}
+        changed = []
+        for filename, st in stats.items():
+            known = cursor.execute("SELECT size, mtime_ns, inode, serial FROM image_timestamps WHERE filename = ?",
+                                   (filename,)).fetchone()
+            if known is None or known[:3] != file_signature(st) or known[3] is None:
+                changed.append(filename)
+        if not changed:
+            continue
+        for filenames in batched(changed, EXTRACT_BATCH_SIZE):
+            for row in extract_rows(folder_path, filenames, stats):
+                old_epoch = delete_row(cursor, row[0])
+                if old_epoch is not None:
+                    num_photos -= 1
+                    photographing_seconds -= photographing_delta(cursor, old_epoch, break_duration_minutes)
+                if row[2] is not None:
+                    num_photos += 1
+                    photographing_seconds += photographing_delta(cursor, row[2], break_duration_minutes)
+                insert_row(cursor, row)
+        conn.commit()
+        print(f"Added {len(changed)} images")
+        yield num_photos, datetime.timedelta(seconds=photographing_seconds)
+
+def ask_folder_path():
+    """Ask the user whether to use the current folder or a custom path."""
+    while True:
+        choice = input("Do you want to run the script on the current path or a custom path? (current/custom): ").strip().lower()
+        if choice in ['current', 'custom']:
+            break
+        else:
+            print("Invalid choice. Please enter 'current' or 'custom'.")
+
+    if choice == 'current':
+        return os.getcwd()
     while True:
         folder_path = input("Please enter the custom path: ").strip()
         if os.path.isdir(folder_path):
-            break
+            return folder_path
         else:
             print("Invalid folder path. Please enter a valid path.")
 
-db_path = os.path.join(folder_path, '_image_timestamps.db')
+def ask_break_duration():
+    """Ask the user for the break duration in minutes."""
+    while True:
+        try:
+            break_duration_minutes = int(input("Enter the break duration in minutes: "))
+            if break_duration_minutes < 0:
+                print("Please enter a positive number.")
+            else:
+                return break_duration_minutes
+        except ValueError:
+            print("Invalid input. Please enter a number.")
 
-# Initialize and populate the database if necessary
-initialize_database(db_path)
+def ask_groupings():
+    """Ask which group reports to write besides the overall one."""
+    while True:
+        grouping_choice = input(f"Also report per {', '.join(GROUPINGS)}? (one of these, all, or none): ").strip().lower() or 'none'
+        if grouping_choice in GROUPINGS or grouping_choice in ('all', 'none'):
+            break
+        print("Invalid choice.")
+    return list(GROUPINGS) if grouping_choice == 'all' else [] if grouping_choice == 'none' else [grouping_choice]
 
-# Get the current number of files and the number of database entries
-current_files = []
-for root, _, filenames in os.walk(folder_path):
-    if "_ignore" in root:
-        print(f"Ignoring images in folder: {root}")
-        continue  # Skip this directory
-    for f in filenames:
-        if f.lower().endswith(('nef', 'jpg', 'jpeg', 'png')):
-            current_files.append(os.path.join(root, f))
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Calculate the time spent photographing, excluding breaks. Asks for anything not given.")
+    parser.add_argument('folder', nargs='?', help="folder with the photos, searched recursively")
+    parser.add_argument('--break-minutes', type=int, help="gaps longer than this count as breaks")
+    parser.add_argument('--group', action='append', choices=list(GROUPINGS) + ['all'],
+                        help="also report per day, folder or camera; repeat or use 'all'")
+    parser.add_argument('--no-group', action='store_true', help="only write the overall report")
+    parser.add_argument('--workers', type=int, help="parallel exiftool extraction workers")
+    parser.add_argument('--watch', action='store_true',
+                        help="after the report, keep adding new images as they arrive until Ctrl-C")
+    args = parser.parse_args(argv)
 
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-cursor.execute("SELECT COUNT(*) FROM image_timestamps")
-db_file_count = cursor.fetchone()[0]
-conn.close()
+    folder_path = args.folder or ask_folder_path()
+    if not os.path.isdir(folder_path):
+        parser.error(f"not a folder: {folder_path}")
 
-# Populate the database if new photos have been added
-if len(current_files) > db_file_count:
-    populate_database(folder_path, db_path)
+    break_duration_minutes = args.break_minutes if args.break_minutes is not None else ask_break_duration()
+    if break_duration_minutes < 0:
+        parser.error("the break duration must not be negative")
 
-# Load timestamps from the database
-timestamps = load_timestamps_from_database(db_path)
+    if args.group:
+        groupings = list(GROUPINGS) if 'all' in args.group else list(dict.fromkeys(args.group))
+    elif args.no_group or args.folder:
+        groupings = []
+    else:
+        groupings = ask_groupings()
 
-# Ask the user for the break duration in minutes
-while True:
-    try:
-        break_duration_minutes = int(input("Enter the break duration in minutes: "))
-        if break_duration_minutes < 0:
-            print("Please enter a positive number.")
-        else:
-            break
-    except ValueError:
-        print("Invalid input. Please enter a number.")
+    metrics = RunMetrics('calculate_photo_time')
+    with open_database(os.path.join(folder_path, DB_FILENAME)) as conn:
+        # Started before the first scan so images copied in the meantime aren't missed
+        watcher = FolderWatcher(folder_path, IMAGE_EXTENSIONS) if args.watch else None
+        try:
+            photographing_time = analyze_folder(folder_path, break_duration_minutes, groupings, conn,
+                                                metrics=metrics, workers=args.workers)
 
-# Calculate the photographing time and breaks
-total_duration, photographing_time, breaks = calculate_photographing_time(timestamps, break_duration_minutes)
-num_photos = len(timestamps)
+            # Print the total photographing time excluding breaks
+            print(f"Total time spent photographing (excluding breaks): {photographing_time}")
 
-# Get the start and end times
-if timestamps:
-    start_time = timestamps[0]
-    end_time = timestamps[-1]
-else:
-    start_time = end_time = "No valid timestamps"
+            if watcher is not None:
+                print(f"Watching {folder_path} for new images ({watcher.backend}), press Ctrl-C to stop")
+                try:
+                    for num_photos, photographing_time in watch_folder(folder_path, break_duration_minutes, conn, watcher):
+                        print(f"{num_photos} photos, photographing time: {photographing_time}")
+                except KeyboardInterrupt:
+                    pass
+                # Bring the report files up to date with the images added while watching
+                write_reports(folder_path, break_duration_minutes, groupings, conn, metrics)
+        finally:
+            if watcher is not None:
+                watcher.close()
 
-# Save results to a text file
-save_results_to_file(folder_path, num_photos, total_duration, break_duration_minutes, photographing_time, breaks, start_time, end_time)
+    # Stage timings and counters of this run
+    metrics.write_summary(os.path.join(folder_path, '_photographing_time_metrics.json'))
 
-# Print the total photographing time excluding breaks
-print(f"Total time spent photographing (excluding breaks): {photographing_time}")
+if __name__ == "__main__":
+    main()
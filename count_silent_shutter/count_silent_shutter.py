@@ -1,126 +1,346 @@
 import os
-import sqlite3
-import subprocess
+import sys
 import json
+import sqlite3
+import argparse
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Database setup
-db_name = "exif_data.db"
-conn = sqlite3.connect(db_name)
-cursor = conn.cursor()
-
-def create_table_with_columns(exif_data):
-    # Create table if it doesn't exist with dynamic columns
-    columns = ["file_path TEXT UNIQUE"]
-    for key in exif_data.keys():
-        column_name = key.replace(" ", "_").replace("-", "_")  # Replace spaces and hyphens to avoid SQL syntax issues
-        columns.append(f'"{column_name}" TEXT')  # Store all EXIF data as TEXT
-    
-    columns_str = ", ".join(columns)
-    cursor.execute(f'CREATE TABLE IF NOT EXISTS exif_data ({columns_str})')
-    conn.commit()
-    logging.debug("Created database table with columns: %s", columns_str)
-
-def add_columns_if_not_exist(exif_data):
-    # Add any missing columns dynamically
-    existing_columns = [col[1] for col in cursor.execute("PRAGMA table_info(exif_data)").fetchall()]
-    for key in exif_data.keys():
-        column_name = key.replace(" ", "_").replace("-", "_")
-        if column_name not in existing_columns:
-            cursor.execute(f'ALTER TABLE exif_data ADD COLUMN "{column_name}" TEXT')
-            conn.commit()
-            logging.debug("Added new column to database: %s", column_name)
-
-def insert_exif_data(file_path, exif_data):
-    # Prepare data for insertion
-    columns = ["file_path"]
-    values = [file_path]
-    
-    for key, value in exif_data.items():
-        column_name = key.replace(" ", "_").replace("-", "_")
-        columns.append(f'"{column_name}"')
-        values.append(str(value))  # Convert value to string for uniformity
-
-    columns_str = ", ".join(columns)
-    placeholders = ", ".join("?" for _ in values)
-    
-    cursor.execute(f'INSERT OR IGNORE INTO exif_data ({columns_str}) VALUES ({placeholders})', values)
-    conn.commit()
-    logging.debug("Inserted EXIF data into database for file: %s", file_path)
-
-def get_exif_data(file_path):
-    # Use exiftool to get the exif data
-    result = subprocess.run(["exiftool", "-j", file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if result.returncode != 0:
-        logging.error("Error reading EXIF data from %s: %s", file_path, result.stderr.decode())
-        return None
-    exif_data = json.loads(result.stdout.decode())
-    logging.debug("Extracted EXIF data from file: %s", file_path)
-    return exif_data[0] if exif_data else None
-
-def process_photo(file_path, serial_number_to_check):
-    logging.info("Processing photo: %s", file_path)
-    exif_data = get_exif_data(file_path)
-    if exif_data is None:
-        logging.warning("No EXIF data found for file: %s", file_path)
-        return
-    
-    serial_number = exif_data.get('SerialNumber')
-    
-    # Ensure both are strings before comparison
-    if str(serial_number) == str(serial_number_to_check):
-        logging.info("Serial number matches: %s", serial_number)
-        add_columns_if_not_exist(exif_data)  # Ensure all columns exist
-        insert_exif_data(file_path, exif_data)  # Insert EXIF data into the database
-    else:
-        logging.info("Serial number does not match for file: %s (found: %s, expected: %s)", file_path, serial_number, serial_number_to_check)
-
-
-def scan_folder(folder_path, serial_number_to_check):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from photo_common import catalog, logs
+from photo_common.bulk_extract import batched, iter_exif
+from photo_common.metrics import Progress, ProgressLine, RunMetrics
+from photo_common.pipeline import run_pipeline
+from photo_common.readahead import read_ahead
+from photo_common.walker import walk_files
+from photo_common.watcher import FolderWatcher
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.dng', '.nef', '.cr2')
+
+# Tags extracted in bulk mode; everything else exiftool knows is skipped
+BULK_TAGS = ('DateTimeOriginal', 'SerialNumber', 'SilentPhotography')
+
+# Rows are written in transactions of this many rows
+INSERT_BATCH_SIZE = int(os.environ.get('EXIF_DB_BATCH_SIZE', 500))
+
+# Files handed to one exiftool call by each extraction worker
+EXTRACT_BATCH_SIZE = 100
+
+# Database and the stage timings and counters of the last scan, relative to the working directory
+DEFAULT_DB_PATH = "exif_data.db"
+METRICS_FILE = "exif_data_metrics.json"
+
+
+class ExifDatabase:
+    """The exif_data store; use it as a context manager to flush and close it.
+
+    Every scanned file gets a row, whichever camera took it, so no file is
+    extracted twice. Files exiftool can't read are stored with readable = 0
+    and their size and mtime, and are tried again once either changes.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, batch_size=INSERT_BATCH_SIZE):
+        # The scan pipeline writes from its own writer thread
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.batch_size = batch_size
+        # Rows waiting for the next batched transaction
+        self.pending_rows = []
+        self.create_table()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.flush_pending()
+        self.conn.close()
+
+    def create_table(self):
+        """Create the fixed-schema exif_data table, migrating the old dynamic-column layout."""
+        # WAL lets readers run alongside the writer and makes commits much cheaper
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
+
+        existing_columns = [col[1] for col in self.cursor.execute("PRAGMA table_info(exif_data)").fetchall()]
+        if existing_columns and 'tags' not in existing_columns:
+            self.migrate_dynamic_table(existing_columns)
+
+        # Hot columns are typed; the full tag set is kept as JSON in "tags"
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS exif_data (
+                                 file_path TEXT PRIMARY KEY,
+                                 serial TEXT,
+                                 SilentPhotography TEXT,
+                                 DateTimeOriginal TEXT,
+                                 tags TEXT,
+                                 readable INTEGER NOT NULL DEFAULT 1,
+                                 size INTEGER,
+                                 mtime_ns INTEGER
+                               )''')
+        # Databases from before every file was recorded, or before unreadable files were retried
+        if 'tags' in existing_columns and 'readable' not in existing_columns:
+            self.cursor.execute('ALTER TABLE exif_data ADD COLUMN readable INTEGER NOT NULL DEFAULT 1')
+        if 'tags' in existing_columns and 'size' not in existing_columns:
+            self.cursor.execute('ALTER TABLE exif_data ADD COLUMN size INTEGER')
+            self.cursor.execute('ALTER TABLE exif_data ADD COLUMN mtime_ns INTEGER')
+        # Lets the per-body counts be answered from the index alone
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS exif_data_serial ON exif_data (serial, SilentPhotography)')
+        self.conn.commit()
+
+    def migrate_dynamic_table(self, existing_columns):
+        """Move rows from the old one-column-per-tag table into the fixed schema.
+
+        Every old column with a value ends up in the row's tags JSON, keyed by
+        the column name, like a fresh extraction would store it.
+        """
+        logging.info("Migrating exif_data to the fixed schema (%d old columns)", len(existing_columns))
+        self.cursor.execute('ALTER TABLE exif_data RENAME TO exif_data_dynamic')
+        self.create_table()
+
+        columns = [name for name in existing_columns if name != 'file_path']
+        selected = ''.join(f', "{name}"' for name in columns)
+        old_rows = self.conn.execute(f'SELECT file_path{selected} FROM exif_data_dynamic')
+        self.cursor.executemany('''INSERT OR IGNORE INTO exif_data (file_path, serial, SilentPhotography, DateTimeOriginal, tags, readable, size, mtime_ns)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                                (exif_row(file_path, {name: value for name, value in zip(columns, values) if value is not None})
+                                 for file_path, *values in old_rows))
+        self.cursor.execute('DROP TABLE exif_data_dynamic')
+        self.conn.commit()
+
+    def flush_pending(self):
+        """Write all pending rows in a single transaction."""
+        if not self.pending_rows:
+            return
+        # A row is only replaced if it recorded an unreadable file
+        with self.conn:
+            self.conn.executemany('''INSERT INTO exif_data (file_path, serial, SilentPhotography, DateTimeOriginal, tags, readable, size, mtime_ns)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                     ON CONFLICT (file_path) DO UPDATE SET
+                                         serial = excluded.serial, SilentPhotography = excluded.SilentPhotography,
+                                         DateTimeOriginal = excluded.DateTimeOriginal, tags = excluded.tags,
+                                         readable = excluded.readable, size = excluded.size, mtime_ns = excluded.mtime_ns
+                                     WHERE NOT exif_data.readable''', self.pending_rows)
+        logging.debug("Inserted EXIF data into database for %d files", len(self.pending_rows))
+        self.pending_rows.clear()
+
+    def insert_exif_data(self, file_path, exif_data, st=None):
+        """Queue one file's EXIF data (None if unreadable) and its stat from before the extraction.
+
+        The queue is written every batch_size rows.
+        """
+        self.pending_rows.append(exif_row(file_path, exif_data, st))
+        if len(self.pending_rows) >= self.batch_size:
+            self.flush_pending()
+
+    def insert_exif_batch(self, exif_rows, stats=None):
+        """Queue a batch of bulk-extracted rows (exiftool dicts with SourceFile), with their stats if known."""
+        for exif_data, st in zip(exif_rows, stats or [None] * len(exif_rows)):
+            self.insert_exif_data(exif_data['SourceFile'], exif_data, st)
+
+    def known_files(self):
+        """Return {file path: None} for readable files and {file path: (size, mtime_ns)} for unreadable ones."""
+        return {file_path: None if readable else (size, mtime_ns)
+                for file_path, readable, size, mtime_ns
+                in self.conn.execute('SELECT file_path, readable, size, mtime_ns FROM exif_data')}
+
+    def analyze_data(self, per_day=False, serial=None):
+        """Return [(serial, photos, silent on, silent off)] for every camera body, or just one.
+
+        With per_day, return [(serial, day, photos, silent on, silent off)]
+        instead, day as YYYY-MM-DD. Either way it is one GROUP BY query.
+        """
+        self.flush_pending()
+        where = "readable AND serial IS NOT NULL"
+        params = []
+        if serial is not None:
+            where += " AND serial = ?"
+            params.append(str(serial))
+        counts = ("COUNT(*), COALESCE(SUM(SilentPhotography = 'On'), 0), "
+                  "COALESCE(SUM(SilentPhotography = 'Off'), 0)")
+        if per_day:
+            return self.conn.execute(f'''SELECT serial, REPLACE(SUBSTR(DateTimeOriginal, 1, 10), ':', '-') AS day, {counts}
+                                         FROM exif_data WHERE {where}
+                                         GROUP BY serial, day ORDER BY serial, day''', params).fetchall()
+        return self.conn.execute(f'''SELECT serial, {counts} FROM exif_data WHERE {where}
+                                     GROUP BY serial ORDER BY serial''', params).fetchall()
+
+
+def is_readable(exif_data):
+    """Return whether exiftool found any tags in a file, as opposed to only an error."""
+    return exif_data is not None and any(key not in ('SourceFile', 'Error') for key in exif_data)
+
+def exif_row(file_path, exif_data, st=None):
+    """Turn an exiftool dict into a row for the fixed schema; None records an unreadable file."""
+    signature = (st.st_size, st.st_mtime_ns) if st is not None else (None, None)
+    if not is_readable(exif_data):
+        return (file_path, None, None, None, None, 0) + signature
+    tags = {key: value for key, value in exif_data.items() if key != 'SourceFile'}
+
+    def text(key):
+        return str(tags[key]) if tags.get(key) is not None else None
+
+    return (file_path, text('SerialNumber'), text('SilentPhotography'), text('DateTimeOriginal'),
+            json.dumps(tags, ensure_ascii=False, default=str), 1) + signature
+
+def needs_extraction(known_files, file_path, st):
+    """Return whether a file is new to known_files (see known_files()), or was unreadable and has changed since."""
+    if file_path not in known_files:
+        return True
+    signature = known_files[file_path]
+    return signature is not None and signature != (st.st_size, st.st_mtime_ns)
+
+def extract_batch(file_paths):
+    """Extract BULK_TAGS for a batch of files; files the shared catalog knows skip exiftool.
+
+    Returns one dict per file, in order; files exiftool reported nothing for
+    get a dict with only SourceFile.
+    """
+    extracted = catalog.read_through(file_paths, BULK_TAGS,
+                                     lambda misses: iter_exif(misses, BULK_TAGS, batch_size=len(misses)))
+    by_path = {exif_data['SourceFile']: exif_data for exif_data in extracted}
+    return [by_path.get(file_path, {'SourceFile': file_path}) for file_path in file_paths]
+
+def scan_folder(db, folder_path, workers=None, metrics_path=METRICS_FILE):
+    """Extract and store every new photo below folder_path; returns the run metrics."""
     logging.info("Scanning folder: %s", folder_path)
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.lower().endswith(('.jpg', '.jpeg', '.png', '.tiff', '.dng', '.nef', '.cr2')):
-                file_path = os.path.join(root, file)
-                cursor.execute('SELECT COUNT(*) FROM exif_data WHERE file_path = ?', (file_path,))
-                if cursor.fetchone()[0] == 0:  # If the file is not already in the database
-                    process_photo(file_path, serial_number_to_check)
-                else:
-                    logging.debug("File already in database, skipping: %s", file_path)
-
-def analyze_data():
-    cursor.execute('SELECT COUNT(*) FROM exif_data WHERE SilentPhotography = "On"')
-    silent_on = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM exif_data WHERE SilentPhotography = "Off"')
-    silent_off = cursor.fetchone()[0]
-    
-    return silent_on, silent_off
+    metrics = RunMetrics('count_silent_shutter')
+
+    # One lookup for every file already in the database instead of one per file
+    known_files = db.known_files()
+
+    # The folder is listed before anything is extracted, so the progress line
+    # knows how many files are left; files already stored don't count towards it
+    new_files = []
+    for file_path, st in walk_files(folder_path, PHOTO_EXTENSIONS, metrics=metrics):
+        metrics.count('files_examined')
+        if needs_extraction(known_files, file_path, st):
+            new_files.append((file_path, st))
+
+    def extract_with_stats(items):
+        # The walker's stats are stored with the rows, so a file that changes
+        # after it was read is retried if it turned out unreadable
+        return extract_batch([file_path for file_path, _ in items]), [st for _, st in items]
+
+    progress = Progress(len(new_files))
+    # Progress goes to stderr with the log, away from the counts on stdout
+    console = ProgressLine(sys.stderr)
+    extracted = 0
+
+    def write_results(results):
+        # Runs on the pipeline's writer thread, the only one using the connection
+        nonlocal extracted
+        with metrics.time('db_write', sum(len(exif_rows) for exif_rows, _ in results)):
+            for exif_rows, stats in results:
+                metrics.count('files_extracted', len(exif_rows))
+                metrics.count('files_unreadable', sum(not is_readable(exif_data) for exif_data in exif_rows))
+                db.insert_exif_batch(exif_rows, stats)
+                extracted += len(exif_rows)
+        console.update(f"Extracted {progress.format(extracted)}")
+
+    # Several exiftool calls run in parallel, each on a batch of paths with
+    # only the tags we need; results are written back in walk order.
+    # Only new files are read ahead, so a rerun doesn't open every file
+    run_pipeline(batched(read_ahead(new_files, metrics=metrics), EXTRACT_BATCH_SIZE),
+                 metrics.wrap('extract', extract_with_stats, len), write_results, workers=workers, batch_size=max(1, db.batch_size // EXTRACT_BATCH_SIZE))
+    console.finish()
+    logging.info("Extracted %d new files", extracted)
+    with metrics.time('db_write', len(db.pending_rows)):
+        db.flush_pending()
+    if metrics_path:
+        metrics.write_summary(metrics_path)
+    return metrics
+
+def watch_folder(db, watcher, stop=None):
+    """Store photos as the watcher reports them; yields the updated analyze_data() rows after each batch.
+
+    Only the new files are extracted and counted, so each update costs time
+    proportional to the files that arrived, not to the database size.
+    """
+    known_files = db.known_files()
+    counts = {serial: list(row) for serial, *row in db.analyze_data()}
+    for ready in watcher.batches(stop):
+        new_files = [(file_path, st) for file_path, st in ready if needs_extraction(known_files, file_path, st)]
+        if not new_files:
+            continue
+        for items in batched(new_files, EXTRACT_BATCH_SIZE):
+            paths = [file_path for file_path, _ in items]
+            stats = [st for _, st in items]
+            exif_rows = extract_batch(paths)
+            db.insert_exif_batch(exif_rows, stats)
+            for row in map(exif_row, paths, exif_rows, stats):
+                known_files[row[0]] = None if row[5] else row[6:]
+                serial, silent = row[1], row[2]
+                if row[5] and serial is not None:
+                    body = counts.setdefault(serial, [0, 0, 0])
+                    body[0] += 1
+                    body[1] += silent == 'On'
+                    body[2] += silent == 'Off'
+        db.flush_pending()
+        logging.info("Ingested %d new photos", len(new_files))
+        yield [(serial,) + tuple(body) for serial, body in sorted(counts.items())]
+
+def print_counts(rows):
+    """Print analyze_data() rows, per body or per body and day."""
+    for row in rows:
+        print(f"{' '.join(map(str, row[:-3]))}: {row[-3]} photos, "
+              f"silent photography ON: {row[-2]}, OFF: {row[-1]}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Count photos taken with and without silent shutter per camera body. "
+                    "Asks for the folder and serial number if they are not given.")
+    parser.add_argument('folder', nargs='?', help="folder containing the photos")
+    parser.add_argument('serial', nargs='?', help="only report this camera body")
+    parser.add_argument('--all', action='store_true', help="report every camera body without asking for a serial")
+    parser.add_argument('--per-day', action='store_true', help="also report the counts per day")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument('--workers', type=int, help="parallel exiftool extraction workers")
+    parser.add_argument('--metrics', default=METRICS_FILE, help="JSON run summary (default: %(default)s)")
+    parser.add_argument('--watch', action='store_true',
+                        help="after the scan, keep ingesting new photos as they arrive until Ctrl-C")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="also log every file processed")
+    args = parser.parse_args(argv)
+
+    # Per-file messages are DEBUG and stay off the hot path unless --verbose
+    logs.setup_logging(args.verbose, console=True)
+
+    input_folder = args.folder or input("Enter the path to the folder containing your photos: ")
+    serial_number_to_check = args.serial
+    if serial_number_to_check is None and not args.all and args.folder is None:
+        serial_number_to_check = input("Enter the serial number of the camera (empty for every body): ").strip()
+    serial_number_to_check = serial_number_to_check or None
+
+    with ExifDatabase(args.db) as db:
+        # Started before the scan so photos copied in the meantime aren't missed
+        watcher = FolderWatcher(input_folder, PHOTO_EXTENSIONS) if args.watch else None
+        try:
+            # Step 1: Scan folder and record every new photo in bulk
+            scan_folder(db, input_folder, args.workers, args.metrics)
+
+            # Step 2: Analyze the data
+            if serial_number_to_check is not None:
+                rows = db.analyze_data(serial=serial_number_to_check)
+                silent_on_count, silent_off_count = rows[0][2:] if rows else (0, 0)
+                print(f"Photos with silent photography ON: {silent_on_count}")
+                print(f"Photos with silent photography OFF: {silent_off_count}")
+            else:
+                print_counts(db.analyze_data())
+            if args.per_day:
+                print_counts(db.analyze_data(per_day=True, serial=serial_number_to_check))
+
+            # Step 3: Keep the counts up to date while cards are offloaded
+            if watcher is not None:
+                print(f"Watching {input_folder} for new photos ({watcher.backend}), press Ctrl-C to stop")
+                try:
+                    for rows in watch_folder(db, watcher):
+                        print_counts([row for row in rows
+                                      if serial_number_to_check is None or row[0] == serial_number_to_check])
+                except KeyboardInterrupt:
+                    pass
+        finally:
+            if watcher is not None:
+                watcher.close()
 
 if __name__ == "__main__":
-    input_folder = input("Enter the path to the folder containing your photos: ")
-    serial_number_to_check = input("Enter the serial number of the camera: ")
-
-    # Step 1: Scan folder and process photos
-    first_file = True
-    for root, dirs, files in os.walk(input_folder):
-        for file in files:
-            if file.lower().endswith(('.jpg', '.jpeg', '.png', '.tiff', '.dng', '.nef', '.cr2')):
-                file_path = os.path.join(root, file)
-                exif_data = get_exif_data(file_path)
-                if exif_data and first_file:
-                    create_table_with_columns(exif_data)
-                    first_file = False
-                process_photo(file_path, serial_number_to_check)
-
-    # Step 2: Analyze the data
-    silent_on_count, silent_off_count = analyze_data()
-
-    print(f"Photos with silent photography ON: {silent_on_count}")
-    print(f"Photos with silent photography OFF: {silent_off_count}")
-
-# Clean up
-conn.close()
+    main()
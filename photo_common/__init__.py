@@ -0,0 +1,4 @@
+# Shared helpers used by the scripts in this repository.
+#
+# The scripts live in their own folders and are run directly, so each of them
+# adds the repository root to sys.path before importing from here.
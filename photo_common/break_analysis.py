@@ -0,0 +1,105 @@
+# Break analysis for calculate_photo_time.
+#
+# calculate_photographing_time walks the sorted timestamps once for a single
+# break duration. To compare many break durations without holding every
+# timestamp in memory, StreamingBreakAnalysis takes the epoch seconds in time
+# order, chunk by chunk, hands out the breaks as it finds them and keeps only
+# running totals: one sum and one count of the gaps up to each sweep
+# threshold, whatever the number of photos. For whole-second timestamps, as
+# stored in the database, it gives exactly the same results as
+# calculate_photographing_time for every threshold.
+
+import bisect
+import datetime
+import itertools
+
+EPOCH = datetime.datetime(1970, 1, 1)
+DEFAULT_SWEEP_MINUTES = tuple(range(1, 61))
+
+
+def calculate_photographing_time(timestamps, break_duration_minutes=10):
+    """Calculate the total photographing time excluding breaks and list all breaks."""
+    if not timestamps:
+        return "No valid images with EXIF timestamps found.", [], []
+
+    # Sort the timestamps
+    timestamps.sort()
+
+    total_duration = timestamps[-1] - timestamps[0]
+    total_photographing_time = datetime.timedelta()
+    previous_time = timestamps[0]
+    breaks = []
+
+    for current_time in timestamps[1:]:
+        duration = current_time - previous_time
+        if duration.total_seconds() > break_duration_minutes * 60:
+            breaks.append((previous_time, current_time))
+            previous_time = current_time
+        else:
+            total_photographing_time += duration
+            previous_time = current_time
+
+    return total_duration, total_photographing_time, breaks
+
+
+def from_epoch_seconds(seconds):
+    """Convert epoch seconds back to a naive datetime."""
+    return EPOCH + datetime.timedelta(seconds=int(seconds))
+
+
+class StreamingBreakAnalysis:
+    """Photographing time, breaks and the threshold sweep over epoch seconds fed in time order."""
+
+    def __init__(self, break_duration_minutes=10, thresholds_minutes=DEFAULT_SWEEP_MINUTES):
+        self.limit = break_duration_minutes * 60
+        self.thresholds_minutes = list(thresholds_minutes)
+        self.limits = sorted(threshold * 60 for threshold in self.thresholds_minutes)
+        self.num_photos = 0
+        self.first = None
+        self.last = None
+        self.photographing_seconds = 0
+        self.total_gaps = 0
+        # Gaps counted for limits[i] and up land in bucket i; longer ones in the last bucket
+        self.bucket_seconds = [0] * (len(self.limits) + 1)
+        self.bucket_counts = [0] * (len(self.limits) + 1)
+
+    def feed(self, epoch_seconds):
+        """Consume a chunk of epoch seconds, sorted and later than the previous chunk.
+
+        Returns the (start, end) datetimes of the breaks in the chunk.
+        """
+        breaks = []
+        previous = self.last
+        limit = self.limit
+        limits = self.limits
+        for epoch in epoch_seconds:
+            if previous is not None:
+                gap = epoch - previous
+                if gap > limit:
+                    breaks.append((from_epoch_seconds(previous), from_epoch_seconds(epoch)))
+                else:
+                    self.photographing_seconds += gap
+                index = bisect.bisect_left(limits, gap)
+                self.bucket_seconds[index] += gap
+                self.bucket_counts[index] += 1
+                self.total_gaps += 1
+            elif self.first is None:
+                self.first = epoch
+            previous = epoch
+            self.num_photos += 1
+        self.last = previous
+        return breaks
+
+    def total_duration(self):
+        return datetime.timedelta(seconds=int(self.last - self.first)) if self.num_photos else None
+
+    def sweep(self):
+        """Return [(threshold, photographing_time, break_count)] for every sweep threshold in minutes."""
+        cumulative_seconds = list(itertools.accumulate(self.bucket_seconds))
+        cumulative_counts = list(itertools.accumulate(self.bucket_counts))
+        curve = []
+        for threshold in self.thresholds_minutes:
+            index = bisect.bisect_left(self.limits, threshold * 60)
+            curve.append((threshold, datetime.timedelta(seconds=int(cumulative_seconds[index])),
+                          self.total_gaps - cumulative_counts[index]))
+        return curve
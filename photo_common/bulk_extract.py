@@ -0,0 +1,49 @@
+# Bulk metadata extraction.
+#
+# Instead of asking exiftool about one file at a time, hand it a whole batch of
+# paths and read its -j output for all of them at once. The batches go to the
+# shared stay_open pool in exiftool_client, so Perl starts once per pool
+# process rather than once per batch. Only the requested tags are extracted,
+# and memory is bounded by the batch size no matter how many files there are.
+
+import logging
+
+from photo_common import exiftool_client
+
+DEFAULT_BATCH_SIZE = 1000
+# Timeout per file for a batch, on top of exiftool_client.DEFAULT_TIMEOUT as a floor
+SECONDS_PER_FILE = 1
+
+
+def batched(iterable, batch_size=DEFAULT_BATCH_SIZE):
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _tag_args(tags):
+    return [f'-{tag}' for tag in tags]
+
+
+def iter_exif(paths, tags, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield exiftool's per-file dicts for paths, one request to the shared exiftool pool per batch.
+
+    A batch that fails is tried once more on a fresh process before the
+    ExifToolError is raised.
+    """
+    for batch in batched(paths, batch_size):
+        args = _tag_args(tags) + list(batch)
+        timeout = max(exiftool_client.DEFAULT_TIMEOUT, SECONDS_PER_FILE * len(batch))
+        try:
+            results = exiftool_client.execute_json(*args, timeout=timeout)
+        except exiftool_client.ExifToolError as e:
+            # The pool has already replaced the process that failed
+            logging.warning("exiftool failed on a batch of %d files, retrying: %s", len(batch), e)
+            results = exiftool_client.execute_json(*args, timeout=timeout)
+        yield from results
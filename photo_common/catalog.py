@@ -0,0 +1,236 @@
+# Shared metadata catalog.
+#
+# All scripts read metadata through one SQLite catalog keyed by a content
+# fingerprint (file size plus hashes of the first and last 64 KB) instead of
+# by path, so a photo extracted by one tool is not extracted again by another,
+# and moving or renaming folders doesn't force re-extraction. A second table
+# remembers each path's fingerprint together with its size, mtime and inode so
+# unchanged files are not even hashed again, and an in-memory LRU sits in
+# front of both. The rows of one read_through() or put_many() call are written
+# in a single transaction, so a batch of files costs one commit, not two per
+# file.
+#
+# Set PHOTO_CATALOG_DB to use a different catalog file, or to "off" to disable
+# the catalog entirely.
+
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'photo-toolbox', 'catalog.db')
+FINGERPRINT_BLOCK = 64 * 1024
+DEFAULT_CACHE_SIZE = 20000
+
+
+def is_complete(metadata):
+    """Return whether an exiftool dict holds tags rather than an error or nothing at all."""
+    return 'Error' not in metadata and any(key != 'SourceFile' for key in metadata)
+
+
+def fingerprint_file(file_path, size=None):
+    """Return size plus BLAKE2 hashes of the first and last 64 KB as a hex string."""
+    if size is None:
+        size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(size.to_bytes(8, 'little'))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BLOCK))
+        if size > FINGERPRINT_BLOCK:
+            f.seek(max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK))
+            digest.update(f.read(FINGERPRINT_BLOCK))
+    return f'{size:x}-{digest.hexdigest()}'
+
+
+class LRUCache:
+    """A small thread-safe least-recently-used mapping."""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class MetadataCatalog:
+    """Content-keyed metadata store shared by all tools."""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, cache_size=DEFAULT_CACHE_SIZE):
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Several tools may use the catalog at once; wait for their writes
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        self._metadata_cache = LRUCache(cache_size)
+        self._fingerprint_cache = LRUCache(cache_size)
+        with self._lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            # tags: known tag values; covered: every tag name ever requested,
+            # so a tag the file doesn't have is known to be missing
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS metadata (
+                                    fingerprint TEXT PRIMARY KEY,
+                                    tags TEXT,
+                                    covered TEXT
+                                 )''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS paths (
+                                    file_path TEXT PRIMARY KEY,
+                                    size INTEGER,
+                                    mtime_ns INTEGER,
+                                    inode INTEGER,
+                                    fingerprint TEXT
+                                 )''')
+
+    def fingerprint(self, file_path, new_paths=None):
+        """Return the file's fingerprint, hashing it only if it changed since it was last seen.
+
+        If new_paths is a list, the updated paths row is appended to it for the
+        caller to write later instead of being written now.
+        """
+        file_path = os.path.abspath(file_path)
+        st = os.stat(file_path)
+        stat_key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        cached = self._fingerprint_cache.get(file_path)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+
+        with self._lock:
+            row = self.conn.execute('SELECT size, mtime_ns, inode, fingerprint FROM paths WHERE file_path = ?',
+                                    (file_path,)).fetchone()
+        if row is not None and tuple(row[:3]) == stat_key:
+            fingerprint = row[3]
+        else:
+            fingerprint = fingerprint_file(file_path, st.st_size)
+            path_row = (file_path, *stat_key, fingerprint)
+            if new_paths is None:
+                self._write([path_row], [])
+            else:
+                new_paths.append(path_row)
+        self._fingerprint_cache.put(file_path, (stat_key, fingerprint))
+        return fingerprint
+
+    def _write(self, path_rows, metadata_rows):
+        """Write paths and metadata rows in one transaction."""
+        if not path_rows and not metadata_rows:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO paths (file_path, size, mtime_ns, inode, fingerprint) '
+                                  'VALUES (?, ?, ?, ?, ?)', path_rows)
+            self.conn.executemany('INSERT OR REPLACE INTO metadata (fingerprint, tags, covered) VALUES (?, ?, ?)',
+                                  metadata_rows)
+
+    def _load(self, fingerprint):
+        entry = self._metadata_cache.get(fingerprint)
+        if entry is None:
+            with self._lock:
+                row = self.conn.execute('SELECT tags, covered FROM metadata WHERE fingerprint = ?',
+                                        (fingerprint,)).fetchone()
+            if row is None:
+                return None
+            entry = (json.loads(row[0]), set(json.loads(row[1])))
+            self._metadata_cache.put(fingerprint, entry)
+        return entry
+
+    def get(self, file_path, tags, new_paths=None):
+        """Return {tag: value} for the requested tags if the catalog knows all of them, else None."""
+        try:
+            entry = self._load(self.fingerprint(file_path, new_paths))
+        except OSError:
+            return None
+        if entry is None or not set(tags) <= entry[1]:
+            return None
+        known_tags, _ = entry
+        return {tag: known_tags[tag] for tag in tags if tag in known_tags}
+
+    def put(self, file_path, metadata, tags):
+        """Store the extracted values of tags for a file, merging with what is already known."""
+        self.put_many([(file_path, metadata)], tags)
+
+    def put_many(self, entries, tags, new_paths=None):
+        """Store the extracted values of tags for (file_path, metadata) pairs, in one transaction.
+
+        Rows the caller collected in new_paths (see fingerprint) are written
+        in the same transaction.
+        """
+        new_paths = [] if new_paths is None else new_paths
+        entries_by_fingerprint = {}
+        for file_path, metadata in entries:
+            try:
+                fingerprint = self.fingerprint(file_path, new_paths)
+            except OSError:
+                continue
+            known_tags, covered = entries_by_fingerprint.get(fingerprint) or self._load(fingerprint) or ({}, set())
+            known_tags = dict(known_tags)
+            known_tags.update({tag: metadata[tag] for tag in tags if tag in metadata})
+            entries_by_fingerprint[fingerprint] = (known_tags, covered | set(tags))
+        self._write(new_paths, [(fingerprint, json.dumps(known_tags, default=str), json.dumps(sorted(covered)))
+                                for fingerprint, (known_tags, covered) in entries_by_fingerprint.items()])
+        for fingerprint, entry in entries_by_fingerprint.items():
+            self._metadata_cache.put(fingerprint, entry)
+
+    def read_through(self, file_paths, tags, extract):
+        """Return exiftool-style dicts (with SourceFile) for file_paths, calling extract only for misses.
+
+        extract(paths) must return an iterable of dicts with a SourceFile key.
+        Results with an Error or without any tag are returned but not stored,
+        so a file that failed, e.g. because exiftool timed out, is read again
+        next time.
+        """
+        results = {}
+        misses = []
+        new_paths = []
+        for file_path in file_paths:
+            metadata = self.get(file_path, tags, new_paths)
+            if metadata is None:
+                misses.append(file_path)
+            else:
+                results[file_path] = dict(metadata, SourceFile=file_path)
+        extracted = list(extract(misses)) if misses else []
+        for metadata in extracted:
+            results[metadata['SourceFile']] = metadata
+        self.put_many([(metadata['SourceFile'], metadata) for metadata in extracted if is_complete(metadata)],
+                      tags, new_paths)
+        return [results[file_path] for file_path in file_paths if file_path in results]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the shared catalog, or None if it is disabled with PHOTO_CATALOG_DB=off."""
+    global _default_catalog
+    db_path = os.environ.get('PHOTO_CATALOG_DB', DEFAULT_DB_PATH)
+    if db_path.lower() == 'off':
+        return None
+    with _default_catalog_lock:
+        if _default_catalog is None:
+            _default_catalog = MetadataCatalog(db_path)
+        return _default_catalog
+
+
+def read_through(file_paths, tags, extract):
+    """Read metadata through the shared catalog, or straight from extract if it is disabled."""
+    catalog = get_catalog()
+    if catalog is None:
+        return list(extract(file_paths))
+    return catalog.read_through(file_paths, tags, extract)
@@ -0,0 +1,188 @@
+# Minimal pure-Python EXIF reader.
+#
+# Reading DateTimeOriginal and the body serial number does not need exiftool:
+# both live in the standard EXIF IFDs near the start of the file. This module
+# memory-maps just the first few hundred KB of a JPEG or a TIFF-based file
+# (TIFF, NEF, DNG, CR2), walks IFD0 -> ExifIFD and returns the requested tags.
+# Anything it cannot find (maker-note tags such as SilentPhotography, unknown
+# formats, offsets beyond the mapped header) is left for exiftool. has_xmp()
+# tells whether a file also carries an XMP packet, which would hold its own
+# copy of the dates.
+
+import mmap
+import struct
+
+HEADER_BYTES = 512 * 1024
+
+EXIF_IFD_POINTER = 0x8769
+XMP_TAG = 0x02BC
+XMP_SIGNATURE = b'http://ns.adobe.com/xap/1.0/\x00'
+
+# Tag name -> (IFD the tag lives in, tag id)
+TAGS = {
+    'Make': ('IFD0', 0x010F),
+    'Model': ('IFD0', 0x0110),
+    'ModifyDate': ('IFD0', 0x0132),
+    'DateTimeOriginal': ('ExifIFD', 0x9003),
+    'CreateDate': ('ExifIFD', 0x9004),
+    'SubSecTimeOriginal': ('ExifIFD', 0x9291),
+    'SerialNumber': ('ExifIFD', 0xA431),  # BodySerialNumber
+}
+
+# TIFF field type -> size of one value in bytes
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+ASCII = 2
+
+
+class ExifFormatError(Exception):
+    """Raised when a file's EXIF structure cannot be parsed."""
+
+
+def iter_jpeg_segments(buf):
+    """Yield (marker, payload_start) for each JPEG metadata segment, up to the image data."""
+    position = 2
+    while True:
+        if position + 4 > len(buf):
+            raise ExifFormatError("JPEG segments run past the mapped header")
+        if buf[position] != 0xFF:
+            raise ExifFormatError(f"No JPEG marker at {position}")
+        marker = buf[position + 1]
+        if marker == 0xFF:  # Fill byte
+            position += 1
+            continue
+        if marker == 0xDA:  # Start of scan, no more metadata segments
+            return
+        yield marker, position + 4
+        position += 2 + struct.unpack('>H', buf[position + 2:position + 4])[0]
+
+
+def find_tiff_header(buf):
+    """Return the offset of the TIFF header in a JPEG or TIFF-based file, or None."""
+    if buf[:4] in (b'II*\x00', b'MM\x00*'):
+        return 0
+    if buf[:2] != b'\xff\xd8':
+        return None
+    try:
+        for marker, start in iter_jpeg_segments(buf):
+            if marker == 0xE1 and buf[start:start + 6] == b'Exif\x00\x00':
+                return start + 6
+    except ExifFormatError:
+        pass
+    return None
+
+
+def read_tiff_header(buf):
+    """Return (base, endian, ifd0_offset) of the TIFF structure in buf."""
+    base = find_tiff_header(buf)
+    if base is None:
+        raise ExifFormatError("Not a JPEG or TIFF-based file")
+    byte_order = buf[base:base + 2]
+    if byte_order == b'II':
+        endian = '<'
+    elif byte_order == b'MM':
+        endian = '>'
+    else:
+        raise ExifFormatError(f"Unknown TIFF byte order {byte_order!r}")
+    (ifd0_offset,) = struct.unpack(endian + 'I', buf[base + 4:base + 8])
+    return base, endian, ifd0_offset
+
+
+def iter_ifd_entries(buf, base, endian, ifd_offset):
+    """Yield (tag, type, count, value_position) for each entry of one IFD.
+
+    value_position is the absolute offset of the value bytes in buf, whether
+    they are stored inline in the entry or elsewhere in the file.
+    """
+    start = base + ifd_offset
+    if start + 2 > len(buf):
+        raise ExifFormatError(f"IFD at {start} lies outside the mapped header")
+    (entry_count,) = struct.unpack(endian + 'H', buf[start:start + 2])
+    for index in range(entry_count):
+        entry = start + 2 + index * 12
+        if entry + 12 > len(buf):
+            raise ExifFormatError(f"IFD entry at {entry} lies outside the mapped header")
+        tag, field_type, count = struct.unpack(endian + 'HHI', buf[entry:entry + 8])
+        size = TYPE_SIZES.get(field_type, 1) * count
+        if size <= 4:
+            value_position = entry + 8
+        else:
+            value_position = base + struct.unpack(endian + 'I', buf[entry + 8:entry + 12])[0]
+        yield tag, field_type, count, value_position
+
+
+def locate_tags(buf, names):
+    """Return ({name: (type, count, value_position)}, endian) for the requested tags found in buf."""
+    base, endian, ifd0_offset = read_tiff_header(buf)
+
+    wanted = {}
+    for name in names:
+        if name in TAGS:
+            ifd, tag = TAGS[name]
+            wanted[(ifd, tag)] = name
+
+    found = {}
+    exif_ifd_offset = None
+    for tag, field_type, count, value_position in iter_ifd_entries(buf, base, endian, ifd0_offset):
+        if tag == EXIF_IFD_POINTER:
+            (exif_ifd_offset,) = struct.unpack(endian + 'I', buf[value_position:value_position + 4])
+        elif ('IFD0', tag) in wanted:
+            found[wanted[('IFD0', tag)]] = (field_type, count, value_position)
+
+    if exif_ifd_offset is not None and any(ifd == 'ExifIFD' for ifd, _ in wanted):
+        for tag, field_type, count, value_position in iter_ifd_entries(buf, base, endian, exif_ifd_offset):
+            if ('ExifIFD', tag) in wanted:
+                found[wanted[('ExifIFD', tag)]] = (field_type, count, value_position)
+    return found, endian
+
+
+def has_xmp(buf):
+    """Return True if the file carries XMP: an APP1 XMP segment in a JPEG, or tag 0x02BC in IFD0.
+
+    Raises ExifFormatError if the structure can't be followed far enough to tell.
+    """
+    if buf[:2] == b'\xff\xd8':
+        for marker, start in iter_jpeg_segments(buf):
+            if marker == 0xE1 and buf[start:start + len(XMP_SIGNATURE)] == XMP_SIGNATURE:
+                return True
+    base, endian, ifd0_offset = read_tiff_header(buf)
+    return any(tag == XMP_TAG for tag, _, _, _ in iter_ifd_entries(buf, base, endian, ifd0_offset))
+
+
+def decode_value(buf, endian, field_type, count, value_position):
+    """Decode an ASCII, SHORT or LONG value; other types are returned as raw bytes."""
+    size = TYPE_SIZES.get(field_type, 1) * count
+    if value_position + size > len(buf):
+        raise ExifFormatError(f"Value at {value_position} lies outside the mapped header")
+    raw = bytes(buf[value_position:value_position + size])
+    if field_type == ASCII:
+        return raw.split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+    if field_type == 3:
+        values = struct.unpack(f'{endian}{count}H', raw)
+        return values[0] if count == 1 else list(values)
+    if field_type == 4:
+        values = struct.unpack(f'{endian}{count}I', raw)
+        return values[0] if count == 1 else list(values)
+    return raw
+
+
+def read_tags_from_buffer(buf, names):
+    """Return {name: value} for the requested tags present in an in-memory header."""
+    found, endian = locate_tags(buf, names)
+    return {name: decode_value(buf, endian, *location) for name, location in found.items()}
+
+
+def read_tags(path, names=('DateTimeOriginal', 'SerialNumber'), header_bytes=HEADER_BYTES):
+    """Return {name: value} for the requested tags, or None if the file can't be parsed natively.
+
+    Tags that are not in the standard IFDs are simply missing from the result,
+    so callers can fall back to exiftool for them.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = f.seek(0, 2)
+            if size == 0:
+                return None
+            with mmap.mmap(f.fileno(), min(size, header_bytes), access=mmap.ACCESS_READ) as buf:
+                return read_tags_from_buffer(buf, names)
+    except (OSError, ValueError, struct.error, ExifFormatError):
+        return None
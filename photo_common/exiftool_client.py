@@ -0,0 +1,183 @@
+# Persistent exiftool client.
+#
+# Starting exiftool means starting Perl and loading the whole Image::ExifTool
+# library, which costs far more than reading a few tags from one photo.
+# exiftool can instead be kept running with `-stay_open True -@ -`: it then
+# reads arguments from stdin, one per line, and runs them whenever it sees
+# `-execute`. This module keeps a small pool of such processes around and
+# hands requests to whichever one is idle.
+
+import os
+import json
+import queue
+import atexit
+import select
+import logging
+import threading
+import subprocess
+
+DEFAULT_EXECUTABLE = os.environ.get('EXIFTOOL', 'exiftool')
+DEFAULT_TIMEOUT = 60
+
+
+class ExifToolError(Exception):
+    """Raised when exiftool reports an error for a request."""
+
+
+class ExifToolTimeout(ExifToolError):
+    """Raised when exiftool does not answer a request in time."""
+
+
+class ExifToolProcess:
+    """A single long-lived `exiftool -stay_open True -@ -` process."""
+
+    def __init__(self, executable=DEFAULT_EXECUTABLE, timeout=DEFAULT_TIMEOUT):
+        self.executable = executable
+        self.timeout = timeout
+        self.process = None
+        self._sequence = 0
+
+    def start(self):
+        """Start the exiftool process if it is not already running."""
+        if self.running:
+            return
+        self.process = subprocess.Popen(
+            [self.executable, '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        logging.debug("Started exiftool process %s", self.process.pid)
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def execute(self, *args, timeout=None):
+        """Run one exiftool command and return its (stdout, stderr) as bytes.
+
+        timeout overrides the process's read timeout for this command, e.g. for
+        a write covering hundreds of files.
+        """
+        self.start()
+        self._sequence += 1
+        ready = f'{{ready{self._sequence}}}'.encode()
+
+        # -echo4 prints the marker to stderr once the command is done, so both
+        # pipes can be read up to a known end marker.
+        lines = [str(arg) for arg in args] + ['-echo4', ready.decode(), f'-execute{self._sequence}']
+        try:
+            self.process.stdin.write(('\n'.join(lines) + '\n').encode('utf-8'))
+            self.process.stdin.flush()
+            stdout, stderr = self._read_until_ready(ready, timeout or self.timeout)
+        except ExifToolTimeout:
+            self.restart()
+            raise
+        except (BrokenPipeError, OSError) as e:
+            self.restart()
+            raise ExifToolError(f"exiftool process died: {e}") from e
+        return stdout, stderr
+
+    def _read_until_ready(self, ready, timeout):
+        """Read stdout and stderr until both end with the ready marker."""
+        buffers = {self.process.stdout.fileno(): b'', self.process.stderr.fileno(): b''}
+        pending = set(buffers)
+        while pending:
+            readable, _, _ = select.select(list(pending), [], [], timeout)
+            if not readable:
+                raise ExifToolTimeout(f"exiftool did not answer within {timeout} seconds")
+            for fd in readable:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise ExifToolError("exiftool closed its output unexpectedly")
+                buffers[fd] += chunk
+                # exiftool prints "{readyN}" on stdout by itself; -echo4 adds
+                # the same marker to stderr.
+                if buffers[fd].rstrip(b'\r\n').endswith(ready):
+                    pending.discard(fd)
+
+        stdout = buffers[self.process.stdout.fileno()]
+        stderr = buffers[self.process.stderr.fileno()]
+        return stdout[:stdout.rfind(ready)], stderr[:stderr.rfind(ready)]
+
+    def restart(self):
+        """Kill the process; the next request starts a fresh one."""
+        if self.process is not None:
+            logging.warning("Restarting exiftool process %s", self.process.pid)
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def close(self):
+        """Ask exiftool to exit and wait for it."""
+        if not self.running:
+            self.process = None
+            return
+        try:
+            self.process.stdin.write(b'-stay_open\nFalse\n')
+            self.process.stdin.flush()
+            self.process.communicate(timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+class ExifToolPool:
+    """A fixed number of exiftool processes shared between threads."""
+
+    def __init__(self, size=None, executable=DEFAULT_EXECUTABLE, timeout=DEFAULT_TIMEOUT):
+        self.size = size or int(os.environ.get('EXIFTOOL_WORKERS', 0)) or min(4, os.cpu_count() or 1)
+        self._idle = queue.Queue()
+        self._processes = [ExifToolProcess(executable, timeout) for _ in range(self.size)]
+        for process in self._processes:
+            self._idle.put(process)
+
+    def execute(self, *args, timeout=None):
+        """Run one exiftool command on an idle process and return (stdout, stderr)."""
+        process = self._idle.get()
+        try:
+            return process.execute(*args, timeout=timeout)
+        finally:
+            self._idle.put(process)
+
+    def execute_json(self, *args, timeout=None):
+        """Run exiftool with -j and return the parsed list of per-file dicts."""
+        stdout, stderr = self.execute('-j', *args, timeout=timeout)
+        if stderr.strip():
+            logging.debug("exiftool stderr: %s", stderr.decode(errors='replace').strip())
+        if not stdout.strip():
+            return []
+        return json.loads(stdout.decode('utf-8'))
+
+    def close(self):
+        """Shut down every process in the pool."""
+        for process in self._processes:
+            process.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ExifToolPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def execute(*args, timeout=None):
+    """Run one exiftool command on the shared pool."""
+    return get_pool().execute(*args, timeout=timeout)
+
+
+def execute_json(*args, timeout=None):
+    """Run one exiftool -j command on the shared pool and parse the result."""
+    return get_pool().execute_json(*args, timeout=timeout)
@@ -0,0 +1,185 @@
+# Per-day, per-folder and per-camera photographing time for calculate_photo_time.
+#
+# Run on an archive root, the image_timestamps table covers every shoot below
+# it. Next to each timestamp it stores the day, the top-level shoot folder and
+# the camera serial, and two aggregate tables are kept up to date as photos
+# are added and removed:
+#
+#   group_totals  number of photos, first and last epoch per group
+#   group_gaps    how often each gap between consecutive photos of a group occurs
+#
+# Adding a photo only touches its two neighbours within each group (found via
+# the (column, epoch) indexes), so keeping the aggregates current costs a few
+# indexed lookups per photo. Loading many photos at once is cheaper without
+# them: insert the rows, then rebuild_group_stats() recomputes the aggregates
+# with one INSERT ... SELECT ... GROUP BY per table and grouping. A report for
+# any break duration is then one GROUP BY over the aggregates instead of a
+# pass over every photo. Gaps that cross midnight belong to no day, so per-day
+# times add up to at most the overall time.
+
+import sqlite3
+
+# Report name -> column of image_timestamps
+GROUPINGS = {'day': 'day', 'folder': 'shoot', 'camera': 'serial'}
+
+# LAG() needs SQLite 3.25; older versions count the gaps in one ordered pass instead
+WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25, 0)
+
+
+def initialize_group_tables(cursor):
+    """Create the group tables and indexes; rebuild the aggregates if they are new or missing.
+
+    The aggregates are missing when there are photos but no totals, e.g.
+    after a bulk load that was interrupted before its rebuild.
+    """
+    existing_tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    cursor.execute('''CREATE TABLE IF NOT EXISTS group_totals (
+                        grouping TEXT,
+                        group_key TEXT,
+                        photos INTEGER,
+                        first_epoch INTEGER,
+                        last_epoch INTEGER,
+                        PRIMARY KEY (grouping, group_key)
+                      )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS group_gaps (
+                        grouping TEXT,
+                        group_key TEXT,
+                        gap INTEGER,
+                        photos INTEGER,
+                        PRIMARY KEY (grouping, group_key, gap)
+                      )''')
+    for column in GROUPINGS.values():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS image_timestamps_{column} ON image_timestamps ({column}, epoch)")
+    if 'group_totals' not in existing_tables or 'group_gaps' not in existing_tables:
+        rebuild_group_stats(cursor)
+    elif cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM group_totals) AND EXISTS "
+                        "(SELECT 1 FROM image_timestamps WHERE epoch IS NOT NULL)").fetchone()[0]:
+        rebuild_group_stats(cursor)
+
+
+def rebuild_group_stats(cursor):
+    """Recompute all aggregates from image_timestamps with one INSERT ... SELECT per table and grouping."""
+    cursor.execute("DELETE FROM group_totals")
+    cursor.execute("DELETE FROM group_gaps")
+    for grouping, column in GROUPINGS.items():
+        where = f"epoch IS NOT NULL AND {column} IS NOT NULL"
+        cursor.execute(f"INSERT INTO group_totals (grouping, group_key, photos, first_epoch, last_epoch) "
+                       f"SELECT ?, {column}, COUNT(*), MIN(epoch), MAX(epoch) FROM image_timestamps "
+                       f"WHERE {where} GROUP BY {column}", (grouping,))
+        if WINDOW_FUNCTIONS:
+            cursor.execute(f'''INSERT INTO group_gaps (grouping, group_key, gap, photos)
+                               SELECT ?, group_key, gap, COUNT(*) FROM (
+                                   SELECT {column} AS group_key,
+                                          epoch - LAG(epoch) OVER (PARTITION BY {column} ORDER BY epoch) AS gap
+                                   FROM image_timestamps WHERE {where})
+                               WHERE gap IS NOT NULL GROUP BY group_key, gap''', (grouping,))
+            continue
+        gaps = {}
+        previous_key = previous_epoch = None
+        for key, epoch in cursor.connection.execute(
+                f"SELECT {column}, epoch FROM image_timestamps WHERE {where} ORDER BY {column}, epoch"):
+            if key == previous_key:
+                gaps[(key, epoch - previous_epoch)] = gaps.get((key, epoch - previous_epoch), 0) + 1
+            previous_key, previous_epoch = key, epoch
+        cursor.executemany("INSERT INTO group_gaps (grouping, group_key, gap, photos) VALUES (?, ?, ?, ?)",
+                           [(grouping, key, gap, photos) for (key, gap), photos in gaps.items()])
+
+
+def _neighbours(cursor, column, key, epoch):
+    """Return the epochs of the photos just before (or at) and just after epoch in a group."""
+    (previous,) = cursor.execute(f"SELECT MAX(epoch) FROM image_timestamps WHERE {column} = ? AND epoch <= ?",
+                                 (key, epoch)).fetchone()
+    (following,) = cursor.execute(f"SELECT MIN(epoch) FROM image_timestamps WHERE {column} = ? AND epoch > ?",
+                                  (key, epoch)).fetchone()
+    return previous, following
+
+
+def _count_gap(cursor, grouping, key, gap, delta):
+    cursor.execute("UPDATE group_gaps SET photos = photos + ? WHERE grouping = ? AND group_key = ? AND gap = ?",
+                   (delta, grouping, key, gap))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO group_gaps (grouping, group_key, gap, photos) VALUES (?, ?, ?, ?)",
+                       (grouping, key, gap, delta))
+    elif delta < 0:
+        cursor.execute("DELETE FROM group_gaps WHERE grouping = ? AND group_key = ? AND gap = ? AND photos <= 0",
+                       (grouping, key, gap))
+
+
+def add_photo(cursor, epoch, keys):
+    """Count a photo in the aggregates. Call before inserting its row.
+
+    keys maps each column in GROUPINGS to the photo's value; groupings whose
+    value is None are skipped.
+    """
+    if epoch is None:
+        return
+    for grouping, column in GROUPINGS.items():
+        key = keys.get(column)
+        if key is None:
+            continue
+        previous, following = _neighbours(cursor, column, key, epoch)
+        if previous is not None and following is not None:
+            _count_gap(cursor, grouping, key, following - previous, -1)
+        if previous is not None:
+            _count_gap(cursor, grouping, key, epoch - previous, 1)
+        if following is not None:
+            _count_gap(cursor, grouping, key, following - epoch, 1)
+
+        cursor.execute("UPDATE group_totals SET photos = photos + 1, first_epoch = MIN(first_epoch, ?), "
+                       "last_epoch = MAX(last_epoch, ?) WHERE grouping = ? AND group_key = ?",
+                       (epoch, epoch, grouping, key))
+        if cursor.rowcount == 0:
+            cursor.execute("INSERT INTO group_totals (grouping, group_key, photos, first_epoch, last_epoch) "
+                           "VALUES (?, ?, 1, ?, ?)", (grouping, key, epoch, epoch))
+
+
+def remove_photo(cursor, epoch, keys):
+    """Remove a photo from the aggregates. Call after deleting its row."""
+    if epoch is None:
+        return
+    for grouping, column in GROUPINGS.items():
+        key = keys.get(column)
+        if key is None:
+            continue
+        previous, following = _neighbours(cursor, column, key, epoch)
+        if previous is not None:
+            _count_gap(cursor, grouping, key, epoch - previous, -1)
+        if following is not None:
+            _count_gap(cursor, grouping, key, following - epoch, -1)
+        if previous is not None and following is not None:
+            _count_gap(cursor, grouping, key, following - previous, 1)
+
+        if previous is None and following is None:
+            cursor.execute("DELETE FROM group_totals WHERE grouping = ? AND group_key = ?", (grouping, key))
+        else:
+            (first_epoch, last_epoch) = cursor.execute(
+                f"SELECT MIN(epoch), MAX(epoch) FROM image_timestamps WHERE {column} = ? AND epoch IS NOT NULL",
+                (key,)).fetchone()
+            cursor.execute("UPDATE group_totals SET photos = photos - 1, first_epoch = ?, last_epoch = ? "
+                           "WHERE grouping = ? AND group_key = ?", (first_epoch, last_epoch, grouping, key))
+
+
+def group_report(cursor, grouping, break_duration_minutes, first_key=None, last_key=None):
+    """Return [(group_key, photos, first_epoch, last_epoch, photographing_seconds, break_count)].
+
+    first_key and last_key optionally limit the report to a range of group
+    keys, e.g. '2024-01-01' to '2024-12-31' for one year of days.
+    """
+    if grouping not in GROUPINGS:
+        raise ValueError(f"Unknown grouping {grouping!r}, expected one of {', '.join(GROUPINGS)}")
+    where = "t.grouping = ?"
+    params = [grouping]
+    if first_key is not None:
+        where += " AND t.group_key >= ?"
+        params.append(first_key)
+    if last_key is not None:
+        where += " AND t.group_key <= ?"
+        params.append(last_key)
+    limit = break_duration_minutes * 60
+    return cursor.execute(f'''SELECT t.group_key, t.photos, t.first_epoch, t.last_epoch,
+                                     COALESCE(SUM(CASE WHEN g.gap <= ? THEN g.gap * g.photos END), 0),
+                                     COALESCE(SUM(CASE WHEN g.gap > ? THEN g.photos END), 0)
+                              FROM group_totals t
+                              LEFT JOIN group_gaps g ON g.grouping = t.grouping AND g.group_key = t.group_key
+                              WHERE {where}
+                              GROUP BY t.group_key ORDER BY t.group_key''', [limit, limit] + params).fetchall()
@@ -0,0 +1,70 @@
+# Background logging.
+#
+# setup_logging() routes every log record through a queue to a listener
+# thread, which formats it and writes it to the log file and/or the console.
+# The threads scanning and extracting files only pay for putting a record on
+# the queue; unlike the stock QueueHandler, the message is not even formatted
+# before it is queued. Per-file detail is logged at DEBUG, so without
+# --verbose it is dropped by the level check before any formatting happens.
+# Pass arguments lazily, logging.debug("Read %s", path), rather than as an
+# f-string, so that check is all a disabled message costs.
+
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queues records as they are; the listener thread formats them."""
+
+    def prepare(self, record):
+        # The scripts log strings and numbers, which are safe to format later
+        return record
+
+
+def setup_logging(verbosity=0, filename=None, console=False, fmt=DEFAULT_FORMAT):
+    """Send all logging through a background thread to filename and/or the console (stderr).
+
+    verbosity 0 logs INFO and up, 1 or more adds the per-file DEBUG detail.
+    Calling it again replaces the previous setup.
+    """
+    global _listener
+    stop_logging()
+
+    formatter = logging.Formatter(fmt)
+    handlers = []
+    if filename:
+        handlers.append(logging.FileHandler(filename, encoding='utf-8'))
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(logging.DEBUG if verbosity > 0 else logging.INFO)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Write out everything still queued and stop the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
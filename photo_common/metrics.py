@@ -0,0 +1,239 @@
+# Lightweight run metrics.
+#
+# A RunMetrics object collects, per stage (walk, stat, extract, db_write,
+# exiftool_write, ...), how many calls and items went through it and a
+# latency histogram with power-of-two buckets, plus free-form counters. It is
+# thread-safe, so pipeline workers and the writer thread can share one, and
+# cheap enough to time every stat call. At the end of a run the summary is
+# written as JSON, which shows where the time goes, e.g. listing directories
+# on a NAS versus exiftool on a local SSD.
+#
+# Progress turns "done of total" into a throughput-based ETA. The rate is
+# measured over a sliding window of recent updates, so it follows the real
+# speed after a fast start (cached files, skipped files) or a slowdown.
+# ProgressLine shows such messages on the console at a fixed refresh rate,
+# however often they are updated.
+
+import sys
+import json
+import math
+import time
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Bucket i counts durations up to 2**i microseconds; the last one is open-ended
+HISTOGRAM_BUCKETS = 32
+
+
+class Histogram:
+    """Latency histogram with power-of-two microsecond buckets."""
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.calls = 0
+        self.items = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds, items=1):
+        microseconds = max(seconds * 1e6, 1.0)
+        self.buckets[min(HISTOGRAM_BUCKETS - 1, math.ceil(math.log2(microseconds)))] += 1
+        self.calls += 1
+        self.items += items
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket holding the given fraction of calls, in seconds."""
+        threshold = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return min(2 ** index / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'items': self.items,
+            'seconds': round(self.total, 6),
+            'items_per_second': round(self.items / self.total, 1) if self.total else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            # Upper bound in microseconds -> calls, for the non-empty buckets
+            'histogram_us': {str(2 ** index): count for index, count in enumerate(self.buckets) if count},
+        }
+
+
+class RunMetrics:
+    """Stage timings and counters for one run of a script."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.stages = {}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, items=1):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.add(seconds, items)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def time(self, stage, items=1):
+        """Time the body of a with block as one call of stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, items)
+
+    def wrap(self, stage, func, items=None):
+        """Return func timed as stage; items(arg) gives the item count of a call, 1 by default."""
+        def timed(arg, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(arg, *args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start, items(arg) if items else 1)
+        return timed
+
+    def summary(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'wall_seconds': round(time.perf_counter() - self._start, 3),
+                'stages': {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+                'counters': dict(self.counters),
+            }
+
+    def write_summary(self, path):
+        """Write the summary as JSON to path and return it."""
+        summary = self.summary()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+            f.write('\n')
+        return summary
+
+
+class Progress:
+    """Throughput and ETA over a sliding window of progress updates."""
+
+    def __init__(self, total=None, window=30.0):
+        self.total = total
+        self.window = window
+        self._samples = deque([(time.perf_counter(), 0)])
+        self._start = self._samples[0][0]
+
+    def update(self, done):
+        """Record progress; return (items per second, seconds remaining or None)."""
+        now = time.perf_counter()
+        self._samples.append((now, done))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+        oldest_time, oldest_done = self._samples[0]
+        rate = (done - oldest_done) / (now - oldest_time) if now > oldest_time else 0.0
+        remaining = None
+        if self.total is not None and rate > 0:
+            remaining = max(self.total - done, 0) / rate
+        return rate, remaining
+
+    def format(self, done):
+        """Return a one-line progress message such as '[0:01:05] 120/500 files, 4.1 files/sec, 0:01:32 left'."""
+        rate, remaining = self.update(done)
+        elapsed = _format_seconds(time.perf_counter() - self._start)
+        message = f"[{elapsed}] {done}/{self.total} files" if self.total is not None else f"[{elapsed}] {done} files"
+        message += f", {rate:.1f} files/sec"
+        if remaining is not None:
+            message += f", {_format_seconds(remaining)} left"
+        return message
+
+
+class ProgressLine:
+    """A console progress line redrawn at most every interval seconds.
+
+    On a terminal the line is rewritten in place; otherwise, e.g. when the
+    output goes to a file, a new line is written every non_tty_interval
+    seconds. stream defaults to whatever sys.stdout is at the time.
+    """
+
+    def __init__(self, stream=None, interval=0.2, non_tty_interval=5.0):
+        self.stream = stream
+        self.interval = interval
+        self.non_tty_interval = non_tty_interval
+        self._last = 0.0
+        self._pending = None
+        self._width = 0
+        self._lock = threading.Lock()
+
+    def _out(self):
+        return self.stream or sys.stdout
+
+    def _is_tty(self, stream):
+        try:
+            return stream.isatty()
+        except (AttributeError, ValueError):
+            return False
+
+    def _draw(self, message):
+        stream = self._out()
+        if self._is_tty(stream):
+            stream.write('\r' + message.ljust(self._width))
+            self._width = len(message)
+        else:
+            stream.write(message + '\n')
+        stream.flush()
+        self._last = time.perf_counter()
+        self._pending = None
+
+    def update(self, message):
+        """Show message now if the last refresh is long enough ago, else at the next refresh."""
+        with self._lock:
+            interval = self.interval if self._is_tty(self._out()) else self.non_tty_interval
+            if time.perf_counter() - self._last >= interval:
+                self._draw(message)
+            else:
+                self._pending = message
+
+    def print(self, text):
+        """Print a line of text without mangling the progress line."""
+        with self._lock:
+            stream = self._out()
+            if self._width:
+                stream.write('\r' + ' ' * self._width + '\r')
+                self._width = 0
+            stream.write(text + '\n')
+            stream.flush()
+
+    def finish(self, message=None):
+        """Show the final state (message, or the last update not shown yet) and end the line."""
+        with self._lock:
+            message = message or self._pending
+            if message is not None:
+                self._draw(message)
+            if self._width:
+                self._out().write('\n')
+                self._out().flush()
+                self._width = 0
+
+
+def _format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,143 @@
+# Parallel scan pipeline.
+#
+#   walker thread -> bounded queue -> extraction pool -> in-order results
+#                                                     -> writer thread
+#
+# The walker runs ahead of the extraction workers only as far as the queue
+# allows, at most max_pending extractions are in flight, and the writer
+# receives results in the order the walker produced them, in batches. Every
+# stage blocks when the next one falls behind, so memory stays bounded no
+# matter how large the tree is. Only the writer thread touches the database.
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+DEFAULT_WORKERS = int(os.environ.get('PIPELINE_WORKERS', 0)) or min(8, os.cpu_count() or 1)
+DEFAULT_BATCH_SIZE = 500
+
+_DONE = object()
+
+
+class _Stage(threading.Thread):
+    """A daemon thread that remembers the exception it died with."""
+
+    def __init__(self, target, *args):
+        super().__init__(daemon=True)
+        self._target_func = target
+        self._target_args = args
+        self.error = None
+
+    def run(self):
+        try:
+            self._target_func(*self._target_args)
+        except BaseException as e:  # Re-raised on the calling thread
+            self.error = e
+
+
+def _walk(items, item_queue, stop):
+    try:
+        for item in items:
+            while not stop.is_set():
+                try:
+                    item_queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+    finally:
+        if not stop.is_set():
+            item_queue.put(_DONE)
+
+
+def _write(write_queue, write_batch):
+    while True:
+        batch = write_queue.get()
+        if batch is _DONE:
+            return
+        write_batch(batch)
+
+
+def run_pipeline(items, extract, write_batch, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                 max_pending=None, use_processes=False):
+    """Run extract(item) for every item on a pool and pass the results to write_batch.
+
+    items is consumed lazily on a walker thread, so it can be a generator that
+    walks a directory tree. write_batch is called on a single writer thread
+    with lists of up to batch_size results, in the same order as items.
+    Results that are None are dropped. Returns the number of items processed.
+
+    With use_processes=True, extract and the items must be picklable.
+    """
+    workers = workers or DEFAULT_WORKERS
+    max_pending = max_pending or workers * 4
+
+    stop = threading.Event()
+    item_queue = queue.Queue(maxsize=max_pending)
+    write_queue = queue.Queue(maxsize=2)
+    walker = _Stage(_walk, items, item_queue, stop)
+    writer = _Stage(_write, write_queue, write_batch)
+    walker.start()
+    writer.start()
+
+    def put_batch(batch):
+        # Block while the writer is busy, but notice if it has died
+        while True:
+            if writer.error is not None:
+                raise writer.error
+            try:
+                write_queue.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    processed = 0
+    batch = []
+    try:
+        with executor_class(max_workers=workers) as executor:
+            pending = deque()
+            walking = True
+            while walking or pending:
+                # Keep the pool busy up to max_pending extractions
+                while walking and len(pending) < max_pending:
+                    item = item_queue.get()
+                    if item is _DONE:
+                        walking = False
+                        break
+                    pending.append(executor.submit(extract, item))
+                if not pending:
+                    break
+
+                # Collect the oldest result so the output order matches the input order
+                result = pending.popleft().result()
+                processed += 1
+                if result is not None:
+                    batch.append(result)
+                if len(batch) >= batch_size:
+                    put_batch(batch)
+                    batch = []
+        if batch:
+            put_batch(batch)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        # Let the writer finish whatever it already has, then stop it
+        while writer.is_alive():
+            try:
+                write_queue.put(_DONE, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        writer.join()
+        walker.join(timeout=1)
+
+    if walker.error is not None:
+        raise walker.error
+    if writer.error is not None:
+        raise writer.error
+    return processed
@@ -0,0 +1,149 @@
+# Read-ahead for slow storage.
+#
+# Straight off a USB card reader or an SMB/NFS share, every file costs a
+# round trip before its header arrives, and the extraction workers only ask
+# for a file once they get to it. read_ahead() sits between the walker and
+# the extraction stage: while the caller works on one file, a few threads
+# already open the next ones and ask the kernel to fetch their first and last
+# block (posix_fadvise WILLNEED, or a plain read where that isn't available),
+# which is what the EXIF reader, exiftool and the catalog fingerprint touch.
+# Files in each newly admitted chunk are hinted in inode order, which roughly
+# follows their placement on disk.
+#
+# The window (how many files ahead) tunes itself by Little's law: it is the
+# measured hint latency divided by the time the caller spends per file, with
+# some headroom, so a fast local SSD gets a small window and a NAS with 20 ms
+# round trips a large one.
+#
+# Set READ_AHEAD to "read" to always read the blocks, or to "off" to disable
+# read-ahead. READ_AHEAD_BYTES sets the block size and READ_AHEAD_THREADS the
+# number of hint threads.
+
+import os
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MODE = os.environ.get('READ_AHEAD') or ('fadvise' if hasattr(os, 'posix_fadvise') else 'read')
+READ_AHEAD_BYTES = int(os.environ.get('READ_AHEAD_BYTES', 64 * 1024))
+READ_AHEAD_THREADS = int(os.environ.get('READ_AHEAD_THREADS', 16))
+
+MIN_WINDOW = 4
+MAX_WINDOW = 512
+# Window = HEADROOM * hint latency / time per file
+HEADROOM = 2.0
+# Weight of the newest sample in the moving averages
+SMOOTHING = 0.1
+
+
+def hint_file(path, mode=DEFAULT_MODE, nbytes=READ_AHEAD_BYTES):
+    """Get the first and last nbytes of a file into the page cache; returns the seconds it took."""
+    start = time.perf_counter()
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    except OSError:
+        return time.perf_counter() - start  # The extraction stage will report it
+    try:
+        size = os.fstat(fd).st_size
+        ranges = [(0, min(nbytes, size))]
+        if size > nbytes:
+            ranges.append((max(size - nbytes, nbytes), size - max(size - nbytes, nbytes)))
+        for offset, length in ranges:
+            if length <= 0:
+                continue
+            if mode == 'fadvise':
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+            else:
+                os.lseek(fd, offset, os.SEEK_SET)
+                os.read(fd, length)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+    return time.perf_counter() - start
+
+
+class _Window:
+    """Read-ahead window sized from moving averages of hint latency and time per item."""
+
+    def __init__(self, size=None, min_size=MIN_WINDOW, max_size=MAX_WINDOW):
+        self.fixed = size is not None
+        self.size = size or min_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.latency = None
+        self.interval = None
+        self._lock = threading.Lock()
+
+    def _average(self, current, sample):
+        return sample if current is None else current + SMOOTHING * (sample - current)
+
+    def hinted(self, seconds):
+        with self._lock:
+            self.latency = self._average(self.latency, seconds)
+
+    def consumed(self, seconds):
+        with self._lock:
+            self.interval = self._average(self.interval, seconds)
+            if self.fixed or self.latency is None:
+                return
+            wanted = HEADROOM * self.latency / max(self.interval, 1e-6)
+            self.size = max(self.min_size, min(self.max_size, math.ceil(wanted)))
+
+
+def read_ahead(items, window=None, mode=DEFAULT_MODE, metrics=None, skip=None, threads=READ_AHEAD_THREADS):
+    """Yield the (path, stat) pairs of items unchanged, prefetching the files of the next ones.
+
+    stat may be None; it is only used to hint files in inode order. Files for
+    which skip(path) is true are passed through without a hint, e.g. files
+    the caller already knows. window fixes the number of files to read ahead
+    instead of tuning it. Pass a photo_common.metrics.RunMetrics to time the
+    hints as the "read_ahead" stage and count files the caller reached
+    before their hint finished.
+    """
+    if mode == 'off':
+        yield from items
+        return
+
+    tuner = _Window(window)
+    items = iter(items)
+    exhausted = False
+    ahead = deque()  # (item, future) in the order the caller gets them
+
+    def hint(path):
+        seconds = hint_file(path, mode)
+        tuner.hinted(seconds)
+        if metrics is not None:
+            metrics.record('read_ahead', seconds)
+
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='read-ahead')
+    try:
+        while True:
+            # Top the window up, hinting the newly admitted files in inode order
+            admitted = []
+            while not exhausted and len(ahead) + len(admitted) < tuner.size:
+                try:
+                    admitted.append(next(items))
+                except StopIteration:
+                    exhausted = True
+            futures = {}
+            for item in sorted(admitted, key=lambda item: (item[1].st_dev, item[1].st_ino) if item[1] else (0, 0)):
+                if skip is None or not skip(item[0]):
+                    futures[id(item)] = executor.submit(hint, item[0])
+            ahead.extend((item, futures.get(id(item))) for item in admitted)
+            if not ahead:
+                return
+
+            item, future = ahead.popleft()
+            if metrics is not None and future is not None and not future.done():
+                metrics.count('read_ahead_late')
+            start = time.perf_counter()
+            yield item
+            tuner.consumed(time.perf_counter() - start)
+    finally:
+        for _, future in ahead:
+            if future is not None:
+                future.cancel()
+        executor.shutdown(wait=False)
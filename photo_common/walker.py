@@ -0,0 +1,141 @@
+# Shared directory walker.
+#
+# Built on os.scandir: directories named _ignore are pruned before they are
+# entered, and the stat of every file is taken from its DirEntry (free on
+# Windows, one call per file elsewhere) and handed to the caller, so nobody
+# needs to stat the file again. Files and directories are visited in sorted
+# order, files of a directory before its subdirectories, like a sorted
+# os.walk.
+#
+# On network shares most of the time goes into waiting for directory
+# listings. With workers > 1 the top-level subdirectories are walked by that
+# many threads at once, each into its own bounded queue, while the results
+# are still yielded in the same order as a single-threaded walk. Set
+# WALK_WORKERS to change the default.
+#
+# Pass a photo_common.metrics.RunMetrics to time directory listings as the
+# "walk" stage and file stats as the "stat" stage.
+
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+IGNORED_DIRS = ('_ignore',)
+DEFAULT_WORKERS = int(os.environ.get('WALK_WORKERS', 1))
+
+# Entries a fan-out thread may walk ahead of the consumer
+QUEUE_SIZE = 1000
+
+_DONE = object()
+
+
+def _log_ignored(path):
+    logging.info("Skipping folder: %s (_ignore folder)", path)
+
+
+def list_dir(path, extensions=None, ignored_dirs=IGNORED_DIRS, on_ignore=_log_ignored, metrics=None):
+    """Return ([(path, stat)] of matching files, [subdirectory paths]) for one directory, both sorted."""
+    start = time.perf_counter()
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        logging.warning("Cannot list %s: %s", path, e)
+        return [], []
+    if metrics is not None:
+        metrics.record('walk', time.perf_counter() - start, len(entries))
+
+    files = []
+    subdirs = []
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                if entry.name in ignored_dirs:
+                    on_ignore(entry.path)
+                elif not entry.is_symlink():  # Like os.walk, don't follow directory links
+                    subdirs.append(entry.path)
+            elif extensions is None or entry.name.lower().endswith(extensions):
+                if metrics is None:
+                    files.append((entry.path, entry.stat()))
+                else:
+                    start = time.perf_counter()
+                    files.append((entry.path, entry.stat()))
+                    metrics.record('stat', time.perf_counter() - start)
+        except OSError:
+            continue  # Deleted while scanning
+    return files, subdirs
+
+
+def _walk_tree(path, extensions, ignored_dirs, on_ignore, metrics):
+    files, subdirs = list_dir(path, extensions, ignored_dirs, on_ignore, metrics)
+    yield from files
+    for subdir in subdirs:
+        yield from _walk_tree(subdir, extensions, ignored_dirs, on_ignore, metrics)
+
+
+def _fill(path, results, stop, extensions, ignored_dirs, on_ignore, metrics):
+    """Fan-out thread: walk one subtree into its own queue."""
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for item in _walk_tree(path, extensions, ignored_dirs, on_ignore, metrics):
+            if not put(item):
+                return
+    except BaseException as e:  # Re-raised on the consuming thread
+        put(e)
+    put(_DONE)
+
+
+def walk_files(folder_path, extensions=None, workers=None, ignored_dirs=IGNORED_DIRS, on_ignore=_log_ignored,
+               metrics=None):
+    """Yield (path, stat) for every file below folder_path, pruning ignored directories.
+
+    extensions is a tuple of lower-case name endings to keep, or None for all
+    files. on_ignore is called with the path of every pruned directory.
+    """
+    workers = workers or DEFAULT_WORKERS
+    if workers <= 1:
+        yield from _walk_tree(folder_path, extensions, ignored_dirs, on_ignore, metrics)
+        return
+
+    files, subdirs = list_dir(folder_path, extensions, ignored_dirs, on_ignore, metrics)
+    yield from files
+
+    stop = threading.Event()
+    remaining = iter(subdirs)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def start_next():
+            subdir = next(remaining, None)
+            if subdir is not None:
+                results = queue.Queue(maxsize=QUEUE_SIZE)
+                executor.submit(_fill, subdir, results, stop, extensions, ignored_dirs, on_ignore, metrics)
+                pending.append(results)
+
+        try:
+            for _ in range(workers):
+                start_next()
+            # Drain the subtrees in order; later ones keep walking meanwhile
+            while pending:
+                results = pending.popleft()
+                while True:
+                    item = results.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    yield item
+                start_next()
+        finally:
+            stop.set()  # Also unblocks the threads if the caller stops early
@@ -0,0 +1,284 @@
+# Folder watcher for live ingestion.
+#
+# FolderWatcher reports photos as they land below a folder, for example while
+# cards are being offloaded during an event. On Linux it uses inotify (through
+# ctypes, no extra package): one watch per directory, and a file is only
+# considered once its writer closed it or it was renamed into place, so the
+# work done is proportional to the number of new files, not to the size of the
+# archive. Elsewhere, on network shares where inotify sees no remote changes,
+# or when the inotify watch limit is reached, it falls back to polling: every
+# poll interval each directory is stat'ed and only directories whose mtime
+# changed are listed again.
+#
+# Either way a file is debounced: it is handed out only after its size and
+# mtime stayed the same for the settle time, so half-copied files are never
+# extracted. Directories named _ignore are pruned like in walker.py.
+#
+# Set WATCH_BACKEND to "poll" to force polling, and WATCH_SETTLE_SECONDS and
+# WATCH_POLL_INTERVAL to tune the timing.
+
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import logging
+import threading
+
+from photo_common.walker import IGNORED_DIRS, list_dir, walk_files
+
+DEFAULT_BACKEND = os.environ.get('WATCH_BACKEND')
+SETTLE_SECONDS = float(os.environ.get('WATCH_SETTLE_SECONDS', 2.0))
+POLL_INTERVAL = float(os.environ.get('WATCH_POLL_INTERVAL', 2.0))
+
+# How often files waiting to settle are stat'ed again
+TICK_SECONDS = 0.25
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _ignore_silently(path):
+    pass
+
+
+def _load_libc():
+    """Return libc with the inotify functions, or None where inotify isn't available."""
+    if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class InotifySource:
+    """Candidate files from inotify events."""
+
+    def __init__(self, folder_path, extensions, ignored_dirs):
+        self.libc = _load_libc()
+        if self.libc is None:
+            raise OSError("inotify is not available on this system")
+        self.extensions = extensions
+        self.ignored_dirs = ignored_dirs
+        self.started = time.time()
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folder_path = folder_path
+        self.directories = {}  # watch descriptor -> directory path
+        try:
+            self._watch_tree(folder_path)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, path, found=None):
+        """Watch path and every directory below it; append files already there to found."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if path != self.folder_path and not os.path.isdir(path):
+                return  # Removed again before we got to it
+            raise OSError(error, f"Cannot watch {path} (raise fs.inotify.max_user_watches?)")
+        self.directories[wd] = path
+        # Everything is listed after the watch exists, so nothing falls in between
+        files, subdirs = list_dir(path, self.extensions, self.ignored_dirs, _ignore_silently)
+        if found is not None:
+            found.extend(file_path for file_path, _ in files)
+        for subdir in subdirs:
+            self._watch_tree(subdir, found)
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for events and return the paths of candidate files."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        candidates = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\x00')
+                offset += EVENT_HEADER.size + length
+                self._handle(wd, mask, os.fsdecode(name), candidates)
+        return candidates
+
+    def _handle(self, wd, mask, name, candidates):
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped; look for anything written since we started
+            logging.warning("inotify queue overflowed, rescanning %s", self.folder_path)
+            for file_path, st in walk_files(self.folder_path, self.extensions, ignored_dirs=self.ignored_dirs,
+                                            on_ignore=_ignore_silently):
+                if st.st_mtime >= self.started - SETTLE_SECONDS:
+                    candidates.append(file_path)
+            return
+        if mask & IN_IGNORED:
+            self.directories.pop(wd, None)
+            return
+        directory = self.directories.get(wd)
+        if directory is None or not name:
+            return
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO) and name not in self.ignored_dirs:
+                try:
+                    self._watch_tree(path, candidates)
+                except OSError as e:
+                    logging.warning("New files in %s will be missed: %s", path, e)
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            if self.extensions is None or name.lower().endswith(self.extensions):
+                candidates.append(path)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingSource:
+    """Candidate files from re-listing directories whose mtime changed."""
+
+    def __init__(self, folder_path, extensions, ignored_dirs, poll_interval=POLL_INTERVAL):
+        self.extensions = extensions
+        self.ignored_dirs = ignored_dirs
+        self.poll_interval = poll_interval
+        self.next_poll = time.monotonic() + poll_interval
+        # directory -> (mtime_ns, {file path: (size, mtime_ns)}, [subdirectories])
+        self.directories = {}
+        self._list(folder_path)
+
+    def _list(self, path, found=None):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget(path)
+            return
+        files, subdirs = list_dir(path, self.extensions, self.ignored_dirs, _ignore_silently)
+        files = {file_path: (st.st_size, st.st_mtime_ns) for file_path, st in files}
+        old = self.directories.get(path)
+        self.directories[path] = (mtime_ns, files, subdirs)
+        if found is not None:
+            old_files = old[1] if old else {}
+            found.extend(file_path for file_path, signature in files.items() if old_files.get(file_path) != signature)
+        old_subdirs = set(old[2]) if old else set()
+        for subdir in subdirs:
+            if subdir not in self.directories:
+                self._list(subdir, found)
+        for subdir in old_subdirs.difference(subdirs):
+            self._forget(subdir)
+
+    def _forget(self, path):
+        entry = self.directories.pop(path, None)
+        if entry is not None:
+            for subdir in entry[2]:
+                self._forget(subdir)
+
+    def wait(self, timeout):
+        """Sleep until the next poll (at most timeout seconds) and return the paths of candidate files."""
+        delay = self.next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(delay, 0))
+        self.next_poll = time.monotonic() + self.poll_interval
+        candidates = []
+        for path, (mtime_ns, _, _) in list(self.directories.items()):
+            if path not in self.directories:
+                continue  # Forgotten along with its parent in this pass
+            try:
+                changed = os.stat(path).st_mtime_ns != mtime_ns
+            except OSError:
+                changed = True
+            if changed:
+                self._list(path, candidates)
+        return candidates
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """Report new or rewritten files below a folder once they have settled.
+
+    The watch starts when the object is created, so files that arrive while
+    the caller runs its initial scan are reported too (possibly twice; the
+    scripts skip files they already have).
+    """
+
+    def __init__(self, folder_path, extensions=None, settle=SETTLE_SECONDS, poll_interval=POLL_INTERVAL,
+                 backend=DEFAULT_BACKEND, ignored_dirs=IGNORED_DIRS):
+        self.extensions = extensions
+        self.settle = settle
+        self.source = None
+        if backend != 'poll':
+            try:
+                self.source = InotifySource(folder_path, extensions, ignored_dirs)
+            except OSError as e:
+                if backend == 'inotify':
+                    raise
+                logging.info("Falling back to polling every %.1f s: %s", poll_interval, e)
+        if self.source is None:
+            self.source = PollingSource(folder_path, extensions, ignored_dirs, poll_interval)
+        self.backend = 'inotify' if isinstance(self.source, InotifySource) else 'poll'
+        # path -> ((size, mtime_ns), time of the last change)
+        self.pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.source.close()
+
+    def _settled(self, now):
+        """Return [(path, stat)] of pending files that haven't changed for the settle time."""
+        ready = []
+        for path, (signature, changed_at) in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.pending[path]  # Renamed or deleted before it settled
+                continue
+            if (st.st_size, st.st_mtime_ns) != signature:
+                self.pending[path] = ((st.st_size, st.st_mtime_ns), now)
+            elif now - changed_at >= self.settle:
+                del self.pending[path]
+                ready.append((path, st))
+        return sorted(ready)
+
+    def batches(self, stop=None):
+        """Yield lists of (path, stat) of settled files until stop (a threading.Event) is set."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            candidates = self.source.wait(TICK_SECONDS)
+            now = time.monotonic()
+            for path in candidates:
+                # Every new event restarts the settle time
+                self.pending[path] = ((None, None), now)
+            ready = self._settled(now)
+            if ready:
+                yield ready
@@ -0,0 +1,11 @@
+# The scripts add the repository root to sys.path themselves; do the same
+# for the tests, plus the script folders so they can be imported by name.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'adjust_capture_times'), os.path.join(ROOT, 'calculate_photo_time'),
+             os.path.join(ROOT, 'count_silent_shutter')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
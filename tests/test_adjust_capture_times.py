@@ -0,0 +1,275 @@
+import os
+import json
+import shutil
+import subprocess
+
+import pytest
+
+import adjust_capture_times
+from photo_common import exif_reader, exiftool_client
+from tiff_samples import UNDEFINED, XMP_PACKET, XMP_TAG, build_jpeg, build_tiff, camera_tags
+
+
+def test_walks_every_supported_file_type(tmp_path):
+    tiff = build_tiff(*camera_tags())
+    for name in ('a.jpg', 'b.JPEG', 'c.tiff', 'd.nef', 'e.dng', 'f.CR2'):
+        (tmp_path / name).write_bytes(build_jpeg(tiff) if name.lower().endswith(('jpg', 'jpeg')) else tiff)
+    (tmp_path / 'notes.txt').write_text('not a photo')
+    (tmp_path / '_ignore').mkdir()
+    (tmp_path / '_ignore' / 'g.nef').write_bytes(tiff)
+
+    found = sorted(os.path.basename(path) for path, _ in adjust_capture_times.list_images(str(tmp_path)))
+    assert found == ['a.jpg', 'b.JPEG', 'c.tiff', 'd.nef', 'e.dng', 'f.CR2']
+
+
+# In-place patching. Shifting fixed-length dates must give exactly the file
+# that would have been written with the shifted dates in the first place.
+
+SHIFT = 86400 + 3600 + 5  # One day, one hour and five seconds
+
+
+def shifted_pair(endian='<', jpeg=False, **kwargs):
+    """Return the bytes of a file before and after shifting its dates by SHIFT."""
+    def build(date):
+        tiff = build_tiff(*camera_tags(date=date), endian=endian, **kwargs)
+        return build_jpeg(tiff) if jpeg else tiff
+    return build('2024:01:06 08:00:00'), build('2024:01:07 09:00:05')
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+@pytest.mark.parametrize('jpeg', [False, True])
+def test_patch_matches_shifted_file(tmp_path, endian, jpeg):
+    before, after = shifted_pair(endian, jpeg)
+    path = tmp_path / ('DSC_0001.jpg' if jpeg else 'DSC_0001.nef')
+    path.write_bytes(before)
+    undo_path = str(tmp_path / 'undo.jsonl')
+
+    assert adjust_capture_times.patch_in_place(str(path), SHIFT, undo_path)
+    assert path.read_bytes() == after
+    assert len((tmp_path / 'undo.jsonl').read_text().splitlines()) == 3
+
+
+def test_undo_restores_original_bytes(tmp_path):
+    before, _ = shifted_pair('>')
+    path = tmp_path / 'DSC_0001.nef'
+    path.write_bytes(before)
+    undo_path = str(tmp_path / 'undo.jsonl')
+    assert adjust_capture_times.patch_in_place(str(path), SHIFT, undo_path)
+    assert adjust_capture_times.patch_in_place(str(path), -600, undo_path)
+
+    assert adjust_capture_times.undo_in_place_patches(undo_path) == 6
+    assert path.read_bytes() == before
+
+
+def test_undo_leaves_dates_changed_since(tmp_path):
+    before, after = shifted_pair()
+    path = tmp_path / 'DSC_0001.nef'
+    path.write_bytes(before)
+    undo_path = str(tmp_path / 'undo.jsonl')
+    assert adjust_capture_times.patch_in_place(str(path), SHIFT, undo_path)
+    rewritten = after.replace(b'2024:01:07 09:00:05', b'2030:01:01 00:00:00')
+    path.write_bytes(rewritten)
+
+    assert adjust_capture_times.undo_in_place_patches(undo_path) == 0
+    assert path.read_bytes() == rewritten
+
+
+def test_no_undo_record_for_bytes_that_changed(tmp_path, monkeypatch):
+    before, _ = shifted_pair()
+    path = tmp_path / 'DSC_0001.nef'
+    path.write_bytes(before)
+    plan = adjust_capture_times.plan_in_place_patch
+
+    def plan_then_change(image_path, offset_seconds):
+        patches = plan(image_path, offset_seconds)
+        path.write_bytes(before.replace(b'2024:01:06 08:00:00', b'2024:01:06 08:30:00'))
+        return patches
+
+    monkeypatch.setattr(adjust_capture_times, 'plan_in_place_patch', plan_then_change)
+    assert not adjust_capture_times.patch_in_place(str(path), SHIFT, str(tmp_path / 'undo.jsonl'))
+    assert not (tmp_path / 'undo.jsonl').exists()
+
+
+def test_xmp_in_ifd0_is_left_to_exiftool(tmp_path):
+    ifd0, exif = camera_tags()
+    # The packet lies beyond the mapped header, as it can in a NEF; the tag gives it away
+    xmp_offset = exif_reader.HEADER_BYTES + 4096
+    ifd0[XMP_TAG] = (UNDEFINED, len(XMP_PACKET), xmp_offset)
+    tiff = build_tiff(ifd0, exif)
+    contents = tiff + bytes(xmp_offset - len(tiff)) + XMP_PACKET
+    path = tmp_path / 'DSC_0001.nef'
+    path.write_bytes(contents)
+
+    assert adjust_capture_times.plan_in_place_patch(str(path), SHIFT) is None
+    assert not adjust_capture_times.patch_in_place(str(path), SHIFT, str(tmp_path / 'undo.jsonl'))
+    assert path.read_bytes() == contents
+
+
+def test_xmp_segment_in_jpeg_is_left_to_exiftool(tmp_path):
+    path = tmp_path / 'DSC_0001.jpg'
+    path.write_bytes(build_jpeg(build_tiff(*camera_tags()), xmp=XMP_PACKET))
+    assert adjust_capture_times.plan_in_place_patch(str(path), SHIFT) is None
+
+
+def test_unexpected_date_length_is_left_to_exiftool(tmp_path):
+    ifd0, exif = camera_tags()
+    exif[0x9003] = '2024:01:06 08:00:00.50'
+    path = tmp_path / 'DSC_0001.nef'
+    path.write_bytes(build_tiff(ifd0, exif))
+    assert adjust_capture_times.plan_in_place_patch(str(path), SHIFT) is None
+
+
+@pytest.mark.skipif(shutil.which('exiftool') is None, reason="exiftool is not installed")
+@pytest.mark.parametrize('jpeg', [False, True])
+def test_patch_agrees_with_exiftool(tmp_path, jpeg):
+    before, _ = shifted_pair(jpeg=jpeg)
+    name = 'DSC_0001.jpg' if jpeg else 'DSC_0001.nef'
+    patched, shifted = tmp_path / 'patched', tmp_path / 'shifted'
+    for folder in (patched, shifted):
+        folder.mkdir()
+        (folder / name).write_bytes(before)
+
+    assert adjust_capture_times.patch_in_place(str(patched / name), SHIFT, str(tmp_path / 'undo.jsonl'))
+    operator, shift = adjust_capture_times.format_shift(SHIFT)
+    subprocess.run(['exiftool', '-q', '-overwrite_original', f'-AllDates{operator}{shift}', str(shifted / name)],
+                   check=True)
+
+    def dates(path):
+        output = subprocess.run(['exiftool', '-j', '-AllDates', str(path)], check=True, capture_output=True).stdout
+        return {tag: value for tag, value in json.loads(output)[0].items() if tag != 'SourceFile'}
+    assert dates(patched / name) == dates(shifted / name)
+
+
+# Plan and apply through the journal
+
+def read_date(path):
+    return exif_reader.read_tags(str(path), ('DateTimeOriginal',))['DateTimeOriginal']
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Two bodies' files in a folder, with the catalog off and the journal in memory."""
+    monkeypatch.setenv('PHOTO_CATALOG_DB', 'off')
+    folder = tmp_path / 'photos'
+    folder.mkdir()
+    for i, serial in enumerate(('3012345', '3012345', '3099999')):
+        (folder / f"DSC_{i:04d}.nef").write_bytes(build_tiff(*camera_tags(serial=serial)))
+    with adjust_capture_times.open_journal(':memory:') as conn:
+        yield folder, conn
+
+
+def test_replanning_replaces_pending_changes(library, capsys, caplog):
+    folder, conn = library
+    assert adjust_capture_times.plan_changes(conn, str(folder), {'3012345': 3600, '3099999': 60}, workers=1) == 3
+
+    # Wrong offsets: plan again before applying
+    caplog.set_level('WARNING')
+    assert adjust_capture_times.plan_changes(conn, str(folder), {'3012345': 7200}, workers=1) == 2
+    out = capsys.readouterr().out
+    assert "Replaced 2 and dropped 1 pending changes" in out
+    assert "Not planned: no offset for 3099999 (1 images)" in out
+    # Skipped images are summed up in one line, not logged one by one
+    assert [record.getMessage() for record in caplog.records if 'DSC_0002' in record.getMessage()] == []
+    assert conn.execute("SELECT file_path, new_time FROM change_plan ORDER BY file_path").fetchall() == [
+        (str(folder / 'DSC_0000.nef'), '2024-01-06 10:00:00'), (str(folder / 'DSC_0001.nef'), '2024-01-06 10:00:00')]
+
+    assert adjust_capture_times.apply_plan(conn, workers=1, in_place=True, undo_path=str(folder.parent / 'undo.jsonl')) == 2
+    assert [read_date(folder / f"DSC_{i:04d}.nef") for i in range(3)] == [
+        '2024:01:06 10:00:00', '2024:01:06 10:00:00', '2024:01:06 08:00:00']
+
+    # Files already changed are not planned again, whatever the offsets
+    assert adjust_capture_times.plan_changes(conn, str(folder), {'3012345': 60, '3099999': 60}, workers=1) == 1
+    assert "Examined 1 files, planned 1 changes, skipped 2 already handled" in capsys.readouterr().out
+    assert adjust_capture_times.apply_plan(conn, workers=1, in_place=True, undo_path=str(folder.parent / 'undo.jsonl')) == 1
+    assert [read_date(folder / f"DSC_{i:04d}.nef") for i in range(3)] == [
+        '2024:01:06 10:00:00', '2024:01:06 10:00:00', '2024:01:06 08:01:00']
+
+
+# Grouped shifts and crash recovery. exiftool is replaced by a function that
+# rewrites the files it is asked to shift and answers like exiftool would.
+
+ORIGINAL = '2024:01:06 08:00:00'
+NEW = '2024-01-06 09:00:00'
+
+
+def journal_rows(folder, count, date=ORIGINAL):
+    rows = []
+    for i in range(count):
+        path = folder / f"DSC_{i:04d}.nef"
+        path.write_bytes(build_tiff(*camera_tags(date=date)))
+        rows.append((i + 1, str(path), ORIGINAL, NEW))
+    return rows
+
+
+@pytest.fixture
+def fake_exiftool(monkeypatch):
+    """Install a fake exiftool_client.execute; returns a function to set what it does."""
+    behaviour = {}
+
+    def execute(*args, timeout=None):
+        paths = [arg for arg in args if not arg.startswith('-')]
+        for path in paths:
+            if os.path.basename(path) not in behaviour.get('skip', ()):
+                with open(path, 'wb') as f:
+                    f.write(build_tiff(*camera_tags(date='2024:01:06 09:00:00')))
+            if behaviour.get('raise_after') == os.path.basename(path):
+                raise exiftool_client.ExifToolTimeout("exiftool did not answer within 60 seconds")
+        return behaviour.get('stdout', b''), behaviour.get('stderr', b'')
+
+    monkeypatch.setenv('PHOTO_CATALOG_DB', 'off')
+    monkeypatch.setattr(exiftool_client, 'execute', execute)
+    return behaviour.update
+
+
+def test_group_with_one_failing_file(tmp_path, fake_exiftool):
+    rows = journal_rows(tmp_path, 3)
+    fake_exiftool(skip={'DSC_0001.nef'},
+                  stdout=b"    2 image files updated\n    1 files weren't updated due to errors\n",
+                  stderr=f"Error: Not a valid NEF (looks more like a JPEG) - {rows[1][1]}\n".encode())
+    assert [result[4] for result in adjust_capture_times.shift_with_exiftool(3600, rows)] == [True, False, True]
+
+
+def test_group_count_is_checked_against_the_files(tmp_path, fake_exiftool):
+    rows = journal_rows(tmp_path, 3)
+    # One file left unchanged without an error: the count doesn't add up, so each file is looked at
+    fake_exiftool(skip={'DSC_0002.nef'}, stdout=b"    2 image files updated\n    1 image files unchanged\n")
+    assert [result[4] for result in adjust_capture_times.shift_with_exiftool(3600, rows)] == [True, True, False]
+
+    fake_exiftool(skip=(), stdout=b"    3 image files updated\n")
+    assert [result[4] for result in adjust_capture_times.shift_with_exiftool(3600, rows)] == [True, True, True]
+
+
+def test_group_timeout_keeps_files_already_written(tmp_path, fake_exiftool):
+    rows = journal_rows(tmp_path, 3)
+    fake_exiftool(skip={'DSC_0001.nef', 'DSC_0002.nef'}, raise_after='DSC_0000.nef')
+    assert [result[4] for result in adjust_capture_times.shift_with_exiftool(3600, rows)] == [True, False, False]
+
+
+def test_interrupted_changes_are_settled_from_the_files(tmp_path, fake_exiftool):
+    rows = journal_rows(tmp_path, 3)
+    # Shifted before the crash, untouched, and changed by something else
+    (tmp_path / 'DSC_0000.nef').write_bytes(build_tiff(*camera_tags(date='2024:01:06 09:00:00')))
+    (tmp_path / 'DSC_0002.nef').write_bytes(build_tiff(*camera_tags(date='2024:01:06 12:34:56')))
+    with adjust_capture_times.open_journal(':memory:') as conn:
+        conn.executemany("INSERT INTO change_plan (id, file_path, original_time, new_time, status) "
+                         "VALUES (?, ?, ?, ?, 'applying')", rows)
+        adjust_capture_times.recover_interrupted(conn)
+        assert conn.execute("SELECT id, status FROM change_plan ORDER BY id").fetchall() == [
+            (1, 'done'), (2, 'pending'), (3, 'failed')]
+
+        # Later applies shift the pending file but never log the failure again
+        fake_exiftool(stdout=b"    1 image files updated\n")
+        adjust_capture_times.apply_plan(conn, workers=1)
+        adjust_capture_times.apply_plan(conn, workers=1)
+        assert conn.execute("SELECT id, status FROM change_plan ORDER BY id").fetchall() == [
+            (1, 'done'), (2, 'done'), (3, 'failed')]
+        assert conn.execute("SELECT file_name, status FROM file_updates ORDER BY id").fetchall() == [
+            ('DSC_0000.nef', 'changed'), ('DSC_0002.nef', 'failed'), ('DSC_0001.nef', 'changed')]
+    assert read_date(tmp_path / 'DSC_0002.nef') == '2024:01:06 12:34:56'
+
+
+def test_in_place_needs_grouped_shifts(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        adjust_capture_times.main(['apply', '--in-place', '--per-file', '--logs-dir', str(tmp_path / 'logs')])
+    assert "cannot be combined with --per-file" in capsys.readouterr().err
+    assert not (tmp_path / 'logs').exists()
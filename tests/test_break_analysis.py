@@ -0,0 +1,87 @@
+import datetime
+import random
+
+import pytest
+
+from photo_common.break_analysis import EPOCH, StreamingBreakAnalysis, calculate_photographing_time
+
+START = datetime.datetime(2024, 1, 6, 8, 0, 0)
+THRESHOLDS = (1, 2, 5, 10, 30, 60)
+
+
+def to_epoch(timestamps):
+    return sorted((timestamp - EPOCH) // datetime.timedelta(seconds=1) for timestamp in timestamps)
+
+
+def random_timestamps(rng, count):
+    """Bursts a few seconds apart with pauses around the thresholds, including duplicates."""
+    current = START
+    timestamps = []
+    for _ in range(count):
+        timestamps.append(current)
+        current += datetime.timedelta(seconds=rng.choice(
+            (0, 0, 1, 2, 3, 59, 60, 61, 119, 120, 121, 600, 601, 1800, rng.randint(0, 7200))))
+    rng.shuffle(timestamps)
+    return timestamps
+
+
+def stream(timestamps, break_duration_minutes, rng=None):
+    """Feed the timestamps in random chunks; returns the analysis and the breaks it handed out."""
+    epochs = to_epoch(timestamps)
+    analysis = StreamingBreakAnalysis(break_duration_minutes, THRESHOLDS)
+    breaks = []
+    position = 0
+    while position < len(epochs):
+        size = rng.randint(1, 50) if rng else len(epochs)
+        breaks.extend(analysis.feed(epochs[position:position + size]))
+        position += size
+    return analysis, breaks
+
+
+def assert_matches_reference(timestamps, break_duration_minutes, rng=None):
+    analysis, breaks = stream(timestamps, break_duration_minutes, rng)
+    total_duration, photographing_time, expected_breaks = calculate_photographing_time(
+        list(timestamps), break_duration_minutes)
+    assert analysis.total_duration() == total_duration
+    assert datetime.timedelta(seconds=analysis.photographing_seconds) == photographing_time
+    assert breaks == expected_breaks
+    for threshold, threshold_time, break_count in analysis.sweep():
+        _, expected_time, expected_breaks = calculate_photographing_time(list(timestamps), threshold)
+        assert (threshold_time, break_count) == (expected_time, len(expected_breaks)), threshold
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_timestamps_match_the_reference(seed):
+    rng = random.Random(seed)
+    timestamps = random_timestamps(rng, rng.randint(2, 400))
+    assert_matches_reference(timestamps, rng.choice(THRESHOLDS), rng)
+
+
+@pytest.mark.parametrize('break_duration_minutes', [1, 10])
+def test_gap_exactly_at_the_threshold_is_no_break(break_duration_minutes):
+    limit = datetime.timedelta(minutes=break_duration_minutes)
+    timestamps = [START, START + limit, START + 2 * limit + datetime.timedelta(seconds=1)]
+    assert_matches_reference(timestamps, break_duration_minutes)
+    analysis, breaks = stream(timestamps, break_duration_minutes)
+    assert analysis.photographing_seconds == limit.total_seconds()
+    assert breaks == [(START + limit, timestamps[2])]
+
+
+def test_single_photo():
+    assert_matches_reference([START], 10)
+    analysis, _ = stream([START], 10)
+    assert analysis.num_photos == 1
+    assert analysis.sweep() == [(threshold, datetime.timedelta(), 0) for threshold in THRESHOLDS]
+
+
+def test_duplicate_timestamps():
+    timestamps = [START, START, START + datetime.timedelta(minutes=20), START + datetime.timedelta(minutes=20)]
+    assert_matches_reference(timestamps, 10)
+    analysis, breaks = stream(timestamps, 10)
+    assert analysis.num_photos == 4
+    assert len(breaks) == 1
+
+
+def test_no_photos():
+    analysis, breaks = stream([], 10)
+    assert (analysis.num_photos, analysis.total_duration(), breaks) == (0, None, [])
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from photo_common import bulk_extract, exiftool_client
+from tiff_samples import build_tiff, camera_tags
+
+FAKE_EXIFTOOL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fake_exiftool.py')
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Point the shared pool at benchmarks/fake_exiftool.py."""
+    pool = exiftool_client.ExifToolPool(size=2, executable=FAKE_EXIFTOOL)
+    monkeypatch.setattr(exiftool_client, '_default_pool', pool)
+    yield pool
+    pool.close()
+
+
+def test_batches_share_the_pool_processes(tmp_path, pool):
+    paths = []
+    for i in range(25):
+        path = tmp_path / f"DSC_{i:04d}.nef"
+        path.write_bytes(build_tiff(*camera_tags(serial=str(3000000 + i))))
+        paths.append(str(path))
+
+    results = list(bulk_extract.iter_exif(paths, ['DateTimeOriginal', 'SerialNumber'], batch_size=10))
+    assert [result['SourceFile'] for result in results] == paths
+    assert [result['SerialNumber'] for result in results] == [3000000 + i for i in range(25)]
+    assert results[0]['DateTimeOriginal'] == '2024:01:06 08:00:00'
+    pids = {process.process.pid for process in pool._processes if process.running}
+
+    list(bulk_extract.iter_exif(paths, ['SerialNumber'], batch_size=10))
+    assert {process.process.pid for process in pool._processes if process.running} == pids
+
+
+def test_failed_batch_is_retried(tmp_path, monkeypatch):
+    calls = []
+
+    def execute_json(*args, timeout=None):
+        calls.append(args)
+        if len(calls) == 1:
+            raise exiftool_client.ExifToolTimeout("exiftool did not answer within 60 seconds")
+        return [{'SourceFile': args[-1], 'SerialNumber': 3012345}]
+
+    monkeypatch.setattr(exiftool_client, 'execute_json', execute_json)
+    assert list(bulk_extract.iter_exif(['a.nef'], ['SerialNumber'])) == [{'SourceFile': 'a.nef', 'SerialNumber': 3012345}]
+    assert calls == [('-SerialNumber', 'a.nef')] * 2
@@ -0,0 +1,124 @@
+import datetime
+import os
+import random
+import sqlite3
+
+import pytest
+
+import calculate_photo_time
+from photo_common.break_analysis import DEFAULT_SWEEP_MINUTES, EPOCH, calculate_photographing_time
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """Replace exiftool: each file holds "<DateTimeOriginal>|<SerialNumber>"; returns the paths asked for."""
+    calls = []
+
+    def iter_exif(paths, tags, batch_size=None):
+        for path in paths:
+            calls.append(os.path.basename(path))
+            with open(path) as f:
+                date, serial = f.read().split('|')
+            yield {'SourceFile': path, 'DateTimeOriginal': date, 'SerialNumber': serial}
+
+    monkeypatch.setenv('PHOTO_CATALOG_DB', 'off')
+    monkeypatch.setattr(calculate_photo_time, 'iter_exif', iter_exif)
+    return calls
+
+
+def add_photo(folder, name, when, serial='3012345'):
+    path = folder / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"{when:%Y:%m:%d %H:%M:%S}|{serial}")
+    return path
+
+
+def test_analyze_folder(tmp_path, extracted):
+    start = datetime.datetime(2024, 1, 6, 8, 0, 0)
+    for i, minutes in enumerate((0, 1, 2, 30, 31)):
+        add_photo(tmp_path, f"shoot/DSC_{i:04d}.nef", start + datetime.timedelta(minutes=minutes))
+
+    with sqlite3.connect(':memory:', check_same_thread=False) as conn:
+        calculate_photo_time.initialize_database(conn)
+        photographing_time = calculate_photo_time.analyze_folder(str(tmp_path), 10, ['folder'], conn, workers=1)
+        assert photographing_time == datetime.timedelta(minutes=3)
+        assert len(extracted) == 5
+
+        extracted.clear()
+        assert calculate_photo_time.analyze_folder(str(tmp_path), 10, (), conn, workers=1) == photographing_time
+        assert extracted == []
+
+    report = (tmp_path / '_photographing_time_report_10min.txt').read_text()
+    assert "Number of photos processed: 5" in report
+    assert "Break from 2024-01-06 08:02:00 to 2024-01-06 08:30:00" in report
+    assert "shoot: 5 photos" in (tmp_path / '_photographing_time_by_folder_10min.txt').read_text()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_stream_report_matches_the_reference(tmp_path, seed):
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 6, 8, 0, 0)
+    timestamps, current = [], start
+    for _ in range(rng.randint(1, 300)):
+        timestamps.append(current)
+        current += datetime.timedelta(seconds=rng.choice((0, 1, 5, 599, 600, 601, 3600)))
+    break_minutes = 10
+
+    with sqlite3.connect(':memory:') as conn:
+        calculate_photo_time.initialize_database(conn)
+        conn.executemany("INSERT INTO image_timestamps (filename, epoch) VALUES (?, ?)",
+                         [(f"{i}.nef", (timestamp - EPOCH) // datetime.timedelta(seconds=1))
+                          for i, timestamp in enumerate(timestamps)])
+        photographing_time = calculate_photo_time.stream_report(str(tmp_path), conn, break_minutes, chunk_size=7)
+
+    total_duration, expected_time, expected_breaks = calculate_photographing_time(list(timestamps), break_minutes)
+    assert photographing_time == expected_time
+    report = (tmp_path / f"_photographing_time_report_{break_minutes}min.txt").read_text()
+    assert f"Number of photos processed: {len(timestamps)}\n" in report
+    assert f"Total duration (first to last photo): {total_duration}\n" in report
+    breaks = report.split("List of breaks:\n")[1].split("\nPhotographing time by break duration:")[0]
+    assert breaks == ''.join(f"Break from {begin} to {end}, duration: {end - begin}\n" for begin, end in expected_breaks)
+    for threshold in DEFAULT_SWEEP_MINUTES:
+        _, threshold_time, threshold_breaks = calculate_photographing_time(list(timestamps), threshold)
+        assert f"{threshold:>4} minutes: {threshold_time} ({len(threshold_breaks)} breaks)\n" in report
+
+
+def test_read_ahead_gets_the_walker_stats(tmp_path, extracted, monkeypatch):
+    start = datetime.datetime(2024, 1, 6, 8, 0, 0)
+    for i in range(3):
+        add_photo(tmp_path, f"DSC_{i:04d}.nef", start)
+    hinted = []
+
+    def read_ahead(items, metrics=None):
+        for file_path, st in items:
+            hinted.append((os.path.basename(file_path), st.st_ino))
+            yield file_path, st
+
+    monkeypatch.setattr(calculate_photo_time, 'read_ahead', read_ahead)
+    with sqlite3.connect(':memory:', check_same_thread=False) as conn:
+        calculate_photo_time.initialize_database(conn)
+        calculate_photo_time.populate_database(str(tmp_path), conn, workers=1)
+    assert hinted == [(f"DSC_{i:04d}.nef", os.stat(tmp_path / f"DSC_{i:04d}.nef").st_ino) for i in range(3)]
+
+
+def test_rows_from_before_the_group_columns_are_not_extracted_again(tmp_path, extracted):
+    start = datetime.datetime(2024, 1, 6, 8, 0, 0)
+    for i, minutes in enumerate((0, 1, 2, 30, 31)):
+        add_photo(tmp_path, f"shoot/DSC_{i:04d}.nef", start + datetime.timedelta(minutes=minutes))
+
+    with sqlite3.connect(':memory:', check_same_thread=False) as conn:
+        calculate_photo_time.initialize_database(conn)
+        calculate_photo_time.populate_database(str(tmp_path), conn, workers=1)
+        # As stored by a version without the group columns
+        conn.execute("UPDATE image_timestamps SET day = NULL, shoot = NULL, serial = NULL")
+        conn.execute("DELETE FROM group_totals")
+        conn.execute("DELETE FROM group_gaps")
+        conn.commit()
+        extracted.clear()
+
+        calculate_photo_time.populate_database(str(tmp_path), conn, workers=1)
+        assert extracted == []
+        assert conn.execute("SELECT DISTINCT day, shoot, serial FROM image_timestamps").fetchall() == [
+            ('2024-01-06', 'shoot', '')]
+        assert calculate_photo_time.group_report(conn.cursor(), 'folder', 10) == [
+            ('shoot', 5, 1704528000, 1704529860, 180, 1)]
@@ -0,0 +1,50 @@
+from photo_common.catalog import MetadataCatalog
+
+TAGS = ['DateTimeOriginal', 'SerialNumber']
+
+
+class Extractor:
+    """Stands in for exiftool; answers with the next of the given results and records the paths asked for."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def __call__(self, paths):
+        self.calls.append(list(paths))
+        answer = self.answers.pop(0)
+        return [dict(answer, SourceFile=path) for path in paths]
+
+
+def test_complete_results_are_cached_across_paths(tmp_path):
+    photo = tmp_path / 'DSC_0001.nef'
+    photo.write_bytes(b'raw data')
+    copy = tmp_path / 'copy.nef'
+    copy.write_bytes(b'raw data')
+    catalog = MetadataCatalog(str(tmp_path / 'catalog.db'))
+    extract = Extractor({'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': 3012345})
+
+    assert catalog.read_through([str(photo)], TAGS, extract) == [
+        {'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': 3012345, 'SourceFile': str(photo)}]
+    assert catalog.read_through([str(photo), str(copy)], TAGS, extract)[1]['SerialNumber'] == 3012345
+    assert extract.calls == [[str(photo)]]
+
+
+def test_errors_and_empty_results_are_not_cached(tmp_path):
+    photo = tmp_path / 'DSC_0001.nef'
+    photo.write_bytes(b'raw data')
+    catalog = MetadataCatalog(str(tmp_path / 'catalog.db'))
+    extract = Extractor({'Error': 'File is empty'}, {}, {'DateTimeOriginal': '2024:01:06 08:00:00'},
+                        {'DateTimeOriginal': 'never asked for'})
+
+    assert catalog.read_through([str(photo)], TAGS, extract) == [{'Error': 'File is empty', 'SourceFile': str(photo)}]
+    assert catalog.read_through([str(photo)], TAGS, extract) == [{'SourceFile': str(photo)}]
+    for _ in range(2):
+        assert catalog.read_through([str(photo)], TAGS, extract) == [
+            {'DateTimeOriginal': '2024:01:06 08:00:00', 'SourceFile': str(photo)}]
+    assert len(extract.calls) == 3
+
+    # Also after reopening, nothing of the failed attempts was stored
+    reopened = MetadataCatalog(str(tmp_path / 'catalog.db'))
+    assert reopened.read_through([str(photo)], TAGS, Extractor()) == [
+        {'DateTimeOriginal': '2024:01:06 08:00:00', 'SourceFile': str(photo)}]
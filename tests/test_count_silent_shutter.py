@@ -0,0 +1,110 @@
+import os
+import json
+import sqlite3
+
+import pytest
+
+import count_silent_shutter
+
+COMPLETE = b'complete'
+TAGS = {'SerialNumber': '3012345', 'SilentPhotography': 'On', 'DateTimeOriginal': '2024:01:06 08:00:00'}
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """Replace exiftool: files starting with COMPLETE have tags, others only an error; returns the paths asked for."""
+    calls = []
+
+    def extract_batch(file_paths):
+        calls.extend(os.path.basename(file_path) for file_path in file_paths)
+        results = []
+        for file_path in file_paths:
+            with open(file_path, 'rb') as f:
+                complete = f.read().startswith(COMPLETE)
+            results.append(dict(TAGS, SourceFile=file_path) if complete else {'SourceFile': file_path})
+        return results
+
+    monkeypatch.setattr(count_silent_shutter, 'extract_batch', extract_batch)
+    return calls
+
+
+def scan(db, folder):
+    count_silent_shutter.scan_folder(db, str(folder), workers=1, metrics_path=None)
+
+
+def test_unreadable_file_is_retried_once_it_changes(tmp_path, extracted):
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    (photos / 'a.nef').write_bytes(b'half')
+    (photos / 'b.nef').write_bytes(COMPLETE)
+
+    with count_silent_shutter.ExifDatabase(str(tmp_path / 'exif.db')) as db:
+        scan(db, photos)
+        assert sorted(extracted) == ['a.nef', 'b.nef']
+        assert db.analyze_data() == [('3012345', 1, 1, 0)]
+
+        extracted.clear()
+        scan(db, photos)
+        assert extracted == []
+
+        (photos / 'a.nef').write_bytes(COMPLETE + b' after the copy finished')
+        scan(db, photos)
+        assert extracted == ['a.nef']
+        assert db.analyze_data() == [('3012345', 2, 2, 0)]
+
+        extracted.clear()
+        scan(db, photos)
+        assert extracted == []
+
+
+def test_readable_rows_are_never_replaced(tmp_path, extracted):
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    (photos / 'a.nef').write_bytes(COMPLETE)
+
+    with count_silent_shutter.ExifDatabase(str(tmp_path / 'exif.db')) as db:
+        scan(db, photos)
+        db.insert_exif_data(str(photos / 'a.nef'), None, os.stat(photos / 'a.nef'))
+        db.flush_pending()
+        assert db.analyze_data() == [('3012345', 1, 1, 0)]
+
+
+def test_unreadable_rows_from_older_databases_are_retried(tmp_path, extracted):
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    (photos / 'a.nef').write_bytes(COMPLETE)
+    db_path = str(tmp_path / 'exif.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE exif_data (file_path TEXT PRIMARY KEY, serial TEXT, SilentPhotography TEXT,
+                                            DateTimeOriginal TEXT, tags TEXT, readable INTEGER NOT NULL DEFAULT 1)''')
+    conn.execute("INSERT INTO exif_data (file_path, readable) VALUES (?, 0)", (str(photos / 'a.nef'),))
+    conn.commit()
+    conn.close()
+
+    with count_silent_shutter.ExifDatabase(db_path) as db:
+        scan(db, photos)
+        assert extracted == ['a.nef']
+        assert db.analyze_data() == [('3012345', 1, 1, 0)]
+
+
+def test_dynamic_columns_are_kept_in_tags(tmp_path):
+    db_path = str(tmp_path / 'exif.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE exif_data (file_path TEXT UNIQUE, "SerialNumber" TEXT, "SilentPhotography" TEXT,
+                                            "DateTimeOriginal" TEXT, "LensModel" TEXT, "Shutter_Count" TEXT)''')
+    conn.execute('''INSERT INTO exif_data VALUES ('/photos/a.nef', '3012345', 'On', '2024:01:06 08:00:00',
+                                                  'NIKKOR Z 24-120mm f/4 S', '12345')''')
+    conn.execute("INSERT INTO exif_data (file_path, SerialNumber) VALUES ('/photos/b.nef', '3012345')")
+    conn.commit()
+    conn.close()
+
+    with count_silent_shutter.ExifDatabase(db_path) as db:
+        rows = db.conn.execute("SELECT file_path, serial, SilentPhotography, DateTimeOriginal, tags, readable "
+                               "FROM exif_data ORDER BY file_path").fetchall()
+        assert db.analyze_data() == [('3012345', 2, 1, 0)]
+    assert rows[0][:4] == ('/photos/a.nef', '3012345', 'On', '2024:01:06 08:00:00')
+    assert json.loads(rows[0][4]) == {'SerialNumber': '3012345', 'SilentPhotography': 'On',
+                                      'DateTimeOriginal': '2024:01:06 08:00:00',
+                                      'LensModel': 'NIKKOR Z 24-120mm f/4 S', 'Shutter_Count': '12345'}
+    assert json.loads(rows[1][4]) == {'SerialNumber': '3012345'}
+    assert rows[0][5] == rows[1][5] == 1
@@ -0,0 +1,150 @@
+import pytest
+
+import adjust_capture_times
+from photo_common import exif_reader, exiftool_client
+from tiff_samples import build_jpeg, build_tiff, camera_tags
+
+ALL_TAGS = ('Make', 'Model', 'ModifyDate', 'DateTimeOriginal', 'CreateDate', 'SerialNumber')
+EXPECTED = {
+    'Make': 'NIKON CORPORATION',
+    'Model': 'NIKON Z 8',
+    'ModifyDate': '2024:01:06 08:00:00',
+    'DateTimeOriginal': '2024:01:06 08:00:00',
+    'CreateDate': '2024:01:06 08:00:00',
+    'SerialNumber': '3012345',
+}
+
+
+def write(tmp_path, name, contents):
+    path = tmp_path / name
+    path.write_bytes(contents)
+    return str(path)
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_reads_tiff(tmp_path, endian):
+    path = write(tmp_path, 'DSC_0001.nef', build_tiff(*camera_tags(), endian=endian))
+    assert exif_reader.read_tags(path, ALL_TAGS) == EXPECTED
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_reads_jpeg_app1(tmp_path, endian):
+    path = write(tmp_path, 'DSC_0001.jpg', build_jpeg(build_tiff(*camera_tags(), endian=endian)))
+    assert exif_reader.read_tags(path, ALL_TAGS) == EXPECTED
+
+
+def test_returns_only_requested_tags(tmp_path):
+    path = write(tmp_path, 'DSC_0001.nef', build_tiff(*camera_tags()))
+    assert exif_reader.read_tags(path) == {'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': '3012345'}
+
+
+def test_missing_tags_are_left_out(tmp_path):
+    path = write(tmp_path, 'DSC_0001.nef', build_tiff(*camera_tags(serial=None)))
+    tags = exif_reader.read_tags(path, ('DateTimeOriginal', 'SerialNumber', 'SilentPhotography'))
+    assert tags == {'DateTimeOriginal': '2024:01:06 08:00:00'}
+
+
+def test_file_without_exif_ifd(tmp_path):
+    ifd0, _ = camera_tags()
+    path = write(tmp_path, 'DSC_0001.tiff', build_tiff(ifd0))
+    assert exif_reader.read_tags(path, ALL_TAGS) == {
+        'Make': 'NIKON CORPORATION', 'Model': 'NIKON Z 8', 'ModifyDate': '2024:01:06 08:00:00'}
+
+
+def test_exif_ifd_beyond_header(tmp_path):
+    tiff = build_tiff(*camera_tags(), exif_offset=exif_reader.HEADER_BYTES + 4096)
+    path = write(tmp_path, 'DSC_0001.nef', tiff)
+    assert exif_reader.read_tags(path, ALL_TAGS) is None
+    # Mapping enough of the file finds it again
+    assert exif_reader.read_tags(path, ALL_TAGS, header_bytes=len(tiff)) == EXPECTED
+
+
+def test_value_beyond_header(tmp_path):
+    tiff = build_tiff(*camera_tags())
+    path = write(tmp_path, 'DSC_0001.nef', tiff)
+    # The serial number is the last out-of-line value in the file
+    assert exif_reader.read_tags(path, ALL_TAGS, header_bytes=len(tiff) - 4) is None
+
+
+@pytest.mark.parametrize('contents', [
+    b'',
+    b'\x89PNG\r\n\x1a\n' + bytes(64),
+    b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xd9',  # JPEG without Exif
+    b'II*\x00\x08\x00',  # Truncated TIFF header
+])
+def test_unknown_or_broken_files(tmp_path, contents):
+    path = write(tmp_path, 'broken.jpg', contents)
+    assert exif_reader.read_tags(path, ALL_TAGS) is None
+
+
+def test_missing_file(tmp_path):
+    assert exif_reader.read_tags(str(tmp_path / 'missing.nef'), ALL_TAGS) is None
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_reads_pillow_jpeg(tmp_path, endian):
+    Image = pytest.importorskip('PIL.Image')
+    exif = Image.Exif()
+    exif.endian = endian
+    exif[0x010F] = 'NIKON CORPORATION'
+    exif[0x0110] = 'NIKON Z 8'
+    exif[0x8769] = {0x9003: '2024:01:06 08:00:00', 0xA431: '3012345'}
+    path = str(tmp_path / 'pillow.jpg')
+    Image.new('RGB', (16, 16)).save(path, exif=exif)
+    assert exif_reader.read_tags(path, ('Make', 'Model', 'DateTimeOriginal', 'SerialNumber')) == {
+        'Make': 'NIKON CORPORATION', 'Model': 'NIKON Z 8',
+        'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': '3012345'}
+
+
+class FakeExifTool:
+    """Stands in for exiftool_client.execute_json and records the files it was asked about."""
+
+    def __init__(self, tags=None, error=None):
+        self.tags = tags or {}
+        self.error = error
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args[-1])
+        if self.error is not None:
+            raise self.error
+        return [dict(self.tags, SourceFile=args[-1])]
+
+
+@pytest.fixture
+def fake_exiftool(monkeypatch):
+    def install(**kwargs):
+        fake = FakeExifTool(**kwargs)
+        monkeypatch.setattr(exiftool_client, 'execute_json', fake)
+        return fake
+    return install
+
+
+def test_complete_header_skips_exiftool(tmp_path, fake_exiftool):
+    fake = fake_exiftool()
+    path = write(tmp_path, 'DSC_0001.jpg', build_jpeg(build_tiff(*camera_tags())))
+    assert adjust_capture_times.get_exif(path, use_catalog=False) == {
+        'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': '3012345'}
+    assert fake.calls == []
+
+
+def test_serial_in_maker_notes_falls_back_to_exiftool(tmp_path, fake_exiftool):
+    fake = fake_exiftool(tags={'SerialNumber': 3099999})
+    path = write(tmp_path, 'DSC_0001.nef', build_tiff(*camera_tags(serial=None)))
+    assert adjust_capture_times.get_exif(path, use_catalog=False) == {
+        'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': 3099999}
+    assert fake.calls == [path]
+
+
+def test_unknown_format_falls_back_to_exiftool(tmp_path, fake_exiftool):
+    fake = fake_exiftool(tags={'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': '3012345'})
+    path = write(tmp_path, 'DSC_0001.jpg', b'\x89PNG\r\n\x1a\n' + bytes(64))
+    assert adjust_capture_times.get_exif(path, use_catalog=False) == {
+        'DateTimeOriginal': '2024:01:06 08:00:00', 'SerialNumber': '3012345'}
+    assert fake.calls == [path]
+
+
+def test_exiftool_error_keeps_native_tags(tmp_path, fake_exiftool):
+    fake_exiftool(error=exiftool_client.ExifToolError("exiftool process died"))
+    path = write(tmp_path, 'DSC_0001.nef', build_tiff(*camera_tags(serial=None)))
+    assert adjust_capture_times.get_exif(path, use_catalog=False) == {'DateTimeOriginal': '2024:01:06 08:00:00'}
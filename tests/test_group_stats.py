@@ -0,0 +1,50 @@
+import os
+import random
+import sqlite3
+
+import pytest
+
+import calculate_photo_time
+from photo_common import group_stats
+from photo_common.break_analysis import from_epoch_seconds
+
+
+def aggregates(conn):
+    return (conn.execute("SELECT * FROM group_totals ORDER BY grouping, group_key").fetchall(),
+            conn.execute("SELECT * FROM group_gaps ORDER BY grouping, group_key, gap").fetchall())
+
+
+@pytest.mark.parametrize('window_functions', [True, False])
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_updates_match_a_rebuild(monkeypatch, seed, window_functions):
+    monkeypatch.setattr(group_stats, 'WINDOW_FUNCTIONS', window_functions and group_stats.WINDOW_FUNCTIONS)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(':memory:')
+    calculate_photo_time.initialize_database(conn)
+    cursor = conn.cursor()
+
+    stored = set()
+    for _ in range(300):
+        filename = os.path.join(rng.choice(('a', 'b', 'c')), f"{rng.randrange(80):04d}.nef")
+        if filename in stored and rng.random() < 0.4:
+            calculate_photo_time.delete_row(cursor, filename)
+            stored.discard(filename)
+            continue
+        # Few distinct epochs, so photos share timestamps and gaps repeat
+        epoch = 1704528000 + rng.randrange(200) * rng.choice((1, 60, 3600))
+        timestamp = from_epoch_seconds(epoch).strftime('%Y-%m-%d %H:%M:%S')
+        keys = calculate_photo_time.group_columns(filename, timestamp, rng.choice(('301', '302', None)))
+        calculate_photo_time.delete_row(cursor, filename)
+        calculate_photo_time.insert_row(cursor, (filename, timestamp, epoch) + keys + (0, 0, 0))
+        stored.add(filename)
+
+    incremental = aggregates(conn)
+    group_stats.rebuild_group_stats(cursor)
+    assert aggregates(conn) == incremental
+    assert incremental[0]
+
+    # Aggregates emptied by an interrupted bulk load are rebuilt on the next open
+    conn.execute("DELETE FROM group_totals")
+    conn.execute("DELETE FROM group_gaps")
+    calculate_photo_time.initialize_database(conn)
+    assert aggregates(conn) == incremental
@@ -0,0 +1,48 @@
+import time
+import random
+
+import pytest
+
+from photo_common.pipeline import run_pipeline
+
+
+def slow_square(item):
+    time.sleep(random.random() / 1000)
+    return item * item
+
+
+def test_results_reach_the_writer_in_order():
+    written = []
+    processed = run_pipeline(range(200), slow_square, written.append, workers=8, batch_size=7)
+    assert processed == 200
+    assert all(len(batch) <= 7 for batch in written)
+    assert [result for batch in written for result in batch] == [i * i for i in range(200)]
+
+
+def test_none_results_are_dropped():
+    written = []
+    run_pipeline(range(10), lambda item: item if item % 2 else None, written.append, workers=3, batch_size=100)
+    assert written == [[1, 3, 5, 7, 9]]
+
+
+def test_worker_error_stops_the_run_after_the_results_before_it():
+    def extract(item):
+        if item == 50:
+            raise ValueError("unreadable")
+        return slow_square(item)
+
+    written = []
+    with pytest.raises(ValueError, match="unreadable"):
+        run_pipeline(range(200), extract, written.append, workers=8, batch_size=10)
+    results = [result for batch in written for result in batch]
+    # Whatever was written is an in-order prefix that stops before the failed item
+    assert results == [i * i for i in range(len(results))]
+    assert len(results) <= 50
+
+
+def test_writer_error_is_raised():
+    def write_batch(batch):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError, match="disk full"):
+        run_pipeline(range(1000), slow_square, write_batch, workers=4, batch_size=10)
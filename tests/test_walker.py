@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from photo_common.walker import walk_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in ('b.NEF', 'a.jpg', 'notes.txt', 'shoot2/c.nef', 'shoot1/d.JPG', 'shoot1/deep/e.nef',
+                 'shoot1/_ignore/f.nef', '_ignore/g.jpg', '_edits/h.jpg'):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * len(name))
+    return tmp_path
+
+
+def relative(tree, walk):
+    return [os.path.relpath(path, tree) for path, _ in walk]
+
+
+def test_sorted_files_before_subdirectories(tree):
+    assert relative(tree, walk_files(str(tree), ('.jpg', '.nef'))) == [
+        'a.jpg', 'b.NEF', os.path.join('_edits', 'h.jpg'), os.path.join('shoot1', 'd.JPG'),
+        os.path.join('shoot1', 'deep', 'e.nef'), os.path.join('shoot2', 'c.nef')]
+
+
+def test_ignore_folders_are_pruned(tree):
+    ignored = []
+    walked = relative(tree, walk_files(str(tree), on_ignore=ignored.append))
+    assert not any('_ignore' in path for path in walked)
+    assert sorted(ignored) == [str(tree / '_ignore'), str(tree / 'shoot1' / '_ignore')]
+    # Only _ignore itself is special, not every folder starting with an underscore
+    assert os.path.join('_edits', 'h.jpg') in walked
+
+
+def test_no_extensions_keeps_every_file(tree):
+    assert 'notes.txt' in relative(tree, walk_files(str(tree), on_ignore=lambda path: None))
+
+
+def test_stat_comes_with_every_file(tree):
+    for path, st in walk_files(str(tree), ('.jpg',)):
+        assert st.st_size == os.stat(path).st_size
+
+
+@pytest.mark.parametrize('workers', [2, 8])
+def test_parallel_walk_keeps_the_order(tree, workers):
+    sequential = relative(tree, walk_files(str(tree), ('.jpg', '.nef'), workers=1))
+    assert relative(tree, walk_files(str(tree), ('.jpg', '.nef'), workers=workers)) == sequential
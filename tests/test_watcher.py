@@ -0,0 +1,46 @@
+import threading
+import time
+
+from photo_common.watcher import FolderWatcher
+
+
+def collect(watcher, stop, found):
+    for batch in watcher.batches(stop):
+        found.extend((path, st.st_size) for path, st in batch)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_poll_backend_reports_settled_files(tmp_path):
+    (tmp_path / 'old.nef').write_bytes(b'already there')
+    watcher = FolderWatcher(str(tmp_path), ('.nef',), settle=0.3, poll_interval=0.1, backend='poll')
+    assert watcher.backend == 'poll'
+    stop = threading.Event()
+    found = []
+    thread = threading.Thread(target=collect, args=(watcher, stop, found))
+    thread.start()
+    try:
+        shoot = tmp_path / 'shoot'
+        shoot.mkdir()
+        (shoot / 'notes.txt').write_text('not a photo')
+        (tmp_path / '_ignore').mkdir()
+        (tmp_path / '_ignore' / 'skipped.nef').write_bytes(b'ignored')
+        growing = shoot / 'DSC_0001.nef'
+        # Written in pieces, faster than the settle time
+        for _ in range(5):
+            with open(growing, 'ab') as f:
+                f.write(b'x' * 1000)
+            time.sleep(0.1)
+        assert wait_for(lambda: found)
+        time.sleep(0.5)
+    finally:
+        stop.set()
+        thread.join()
+        watcher.close()
+    # Reported once, complete, and nothing else
+    assert found == [(str(growing), 5000)]
@@ -0,0 +1,97 @@
+# Byte-level builders for the synthetic files the tests read and patch.
+#
+# Unlike benchmarks/synthetic_library.py these give full control over the
+# layout: byte order, where the Exif IFD lands, and extra IFD0 tags such as
+# an XMP packet.
+
+import struct
+
+EXIF_IFD_POINTER = 0x8769
+XMP_TAG = 0x02BC
+XMP_PACKET = (b'<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>'
+              b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF><rdf:Description '
+              b'xmlns:xmp="http://ns.adobe.com/xap/1.0/" xmp:CreateDate="2024-01-06T08:00:00"/>'
+              b'</rdf:RDF></x:xmpmeta><?xpacket end="w"?>')
+
+ASCII = 2
+LONG = 4
+UNDEFINED = 7
+
+
+def _field(value, endian):
+    """Return (type, count, raw bytes) for a str (ASCII), bytes (UNDEFINED) or int (LONG) value."""
+    if isinstance(value, str):
+        raw = value.encode('ascii') + b'\x00'
+        return ASCII, len(raw), raw
+    if isinstance(value, bytes):
+        return UNDEFINED, len(value), value
+    return LONG, 1, struct.pack(endian + 'I', value)
+
+
+def pack_ifd(tags, endian, offset):
+    """Return an IFD placed at offset, followed by its out-of-line values.
+
+    A value can also be a (type, count, offset) tuple pointing elsewhere.
+    """
+    entries = sorted(tags.items())
+    values_offset = offset + 2 + 12 * len(entries) + 4
+    packed = struct.pack(endian + 'H', len(entries))
+    data = bytearray()
+    for tag, value in entries:
+        if isinstance(value, tuple):
+            # (type, count, offset) of a value the caller places in the file itself
+            packed += struct.pack(endian + 'HHII', tag, *value)
+            continue
+        field_type, count, raw = _field(value, endian)
+        if len(raw) <= 4:
+            packed += struct.pack(endian + 'HHI', tag, field_type, count) + raw.ljust(4, b'\x00')
+        else:
+            packed += struct.pack(endian + 'HHII', tag, field_type, count, values_offset + len(data))
+            data.extend(raw)
+            if len(data) % 2:
+                data.append(0)  # Values start on word boundaries
+    return packed + struct.pack(endian + 'I', 0) + bytes(data)
+
+
+def build_tiff(ifd0, exif=None, endian='<', exif_offset=None):
+    """Return a TIFF structure with the given IFD0 tags and, if exif is given, an Exif IFD.
+
+    exif_offset places the Exif IFD at that offset (zero-padded), e.g.
+    beyond the reader's mapped header; by default it follows IFD0.
+    """
+    ifd0 = dict(ifd0)
+    if exif is not None:
+        ifd0[EXIF_IFD_POINTER] = 0  # Same size as the real pointer
+    ifd0_bytes = pack_ifd(ifd0, endian, 8)
+    header = (b'II*\x00' if endian == '<' else b'MM\x00*') + struct.pack(endian + 'I', 8)
+    if exif is None:
+        return header + ifd0_bytes
+
+    if exif_offset is None:
+        exif_offset = 8 + len(ifd0_bytes)
+    ifd0[EXIF_IFD_POINTER] = exif_offset
+    ifd0_bytes = pack_ifd(ifd0, endian, 8)
+    padding = bytes(exif_offset - 8 - len(ifd0_bytes))
+    return header + ifd0_bytes + padding + pack_ifd(exif, endian, exif_offset)
+
+
+def build_jpeg(tiff, xmp=None):
+    """Wrap a TIFF structure in a minimal JPEG with an APP1 Exif segment and optionally an XMP one."""
+    app1 = b'Exif\x00\x00' + tiff
+    segments = b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1
+    if xmp is not None:
+        xmp_app1 = b'http://ns.adobe.com/xap/1.0/\x00' + xmp
+        segments += b'\xff\xe1' + struct.pack('>H', len(xmp_app1) + 2) + xmp_app1
+    return (b'\xff\xd8'
+            + b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+            + segments
+            + b'\xff\xda' + struct.pack('>H', 8) + bytes(6) + b'\x00\xff\xd9')
+
+
+def camera_tags(date='2024:01:06 08:00:00', serial='3012345'):
+    """Return (ifd0, exif) tags of a typical camera file."""
+    ifd0 = {0x010F: 'NIKON CORPORATION', 0x0110: 'NIKON Z 8', 0x0132: date}
+    exif = {0x9003: date, 0x9004: date}
+    if serial is not None:
+        exif[0xA431] = serial
+    return ifd0, exif